@@ -0,0 +1,13 @@
+"""Benchmarks for the backend operations.
+
+Run from the backend folder:
+
+    python -m bench run [--scale N] [--repeat N] [--cases a,b] [--output results.json]
+    python -m bench compare old.json new.json [--threshold 0.15]
+    python -m bench corpus [--scale N]
+    python -m bench large [--max-rss-mb 512]    (writes a 4.5 GiB file to the cache)
+    python -m bench load [--url URL] [--clients N] [--jobs N] [--op compress]
+
+The corpus of synthetic PDFs is generated from a fixed seed and cached, so
+results from different versions of the app are measured on identical inputs.
+"""
@@ -0,0 +1,277 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+from datetime import datetime, timezone
+
+import fitz
+
+import instrument
+import progress
+from bench import corpus
+from bench.cases import CASES, LARGE_CASES
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+RESULTS_SCHEMA = 1
+
+
+def _peak_rss_bytes(who):
+    if resource is None:
+        return None
+    peak = resource.getrusage(who).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _folder_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total
+
+
+def _run_case_here(name, out_dir, inputs):
+    """Child side: run one case once and print its measurements as JSON."""
+    _, fn = CASES[name] if name in CASES else LARGE_CASES[name]
+    baseline_rss = _peak_rss_bytes(resource.RUSAGE_SELF) if resource else None
+    before = os.times()
+    start = time.perf_counter()
+    mode = instrument.requested()
+    if mode:
+        # Phase timings (and profiles) land in the results as "diagnostics"
+        result = instrument.run(progress.Job(lambda event: None), fn, inputs, out_dir, name=name, mode=mode)
+    else:
+        result = fn(inputs, out_dir)
+    wall = time.perf_counter() - start
+    after = os.times()
+    # Includes worker processes the operation started and waited for
+    cpu = (after.user + after.system + after.children_user + after.children_system) - \
+          (before.user + before.system + before.children_user + before.children_system)
+    peaks = [_peak_rss_bytes(resource.RUSAGE_SELF), _peak_rss_bytes(resource.RUSAGE_CHILDREN)] if resource else []
+    print(json.dumps({
+        "success": bool(result.get("success")),
+        "message": result.get("message"),
+        "wall_seconds": wall,
+        "cpu_seconds": cpu,
+        "peak_rss_bytes": max(peaks) if peaks else None,
+        "baseline_rss_bytes": baseline_rss,
+        "output_bytes": _folder_size(out_dir),
+        "diagnostics": result.get("diagnostics"),
+    }))
+
+
+def _run_case(name, inputs, timeout):
+    """Run one case in a fresh interpreter, with its own empty caches."""
+    scratch = tempfile.mkdtemp(prefix=f"forgepdf_bench_{name}_")
+    out_dir = os.path.join(scratch, "out")
+    os.makedirs(out_dir)
+    env = {**os.environ, "FORGEPDF_CACHE_DIR": os.path.join(scratch, "cache"), "FORGEPDF_EVENTS": "0"}
+    try:
+        proc = subprocess.run(
+            [sys.executable, "-m", "bench", "_case", name, out_dir, *inputs],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            env=env, capture_output=True, text=True, timeout=timeout,
+        )
+        lines = proc.stdout.strip().splitlines()
+        if proc.returncode != 0 or not lines:
+            return {"success": False, "message": (proc.stderr.strip().splitlines() or ["no output"])[-1]}
+        return json.loads(lines[-1])
+    except subprocess.TimeoutExpired:
+        return {"success": False, "message": f"Timed out after {timeout} s"}
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+def _app_version():
+    package_json = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "package.json")
+    try:
+        with open(package_json, encoding="utf-8") as f:
+            return json.load(f).get("version")
+    except (OSError, ValueError):
+        return None
+
+
+def run(args):
+    names = args.cases.split(",") if args.cases else list(CASES)
+    unknown = [name for name in names if name not in CASES]
+    if unknown:
+        sys.exit(f"Unknown case(s): {', '.join(unknown)}. Available: {', '.join(CASES)}")
+
+    results = []
+    for name in names:
+        kinds, _ = CASES[name]
+        inputs = [corpus.corpus_path(kind, args.scale) for kind in kinds]
+        runs = [_run_case(name, inputs, args.timeout) for _ in range(args.repeat)]
+        ok = [r for r in runs if r["success"]]
+        entry = {"case": name, "inputs": kinds, "success": len(ok) == len(runs), "message": runs[-1].get("message")}
+        if ok:
+            entry.update({
+                "wall_seconds": statistics.median(r["wall_seconds"] for r in ok),
+                "cpu_seconds": statistics.median(r["cpu_seconds"] for r in ok),
+                "peak_rss_bytes": max((r["peak_rss_bytes"] or 0) for r in ok) or None,
+                "baseline_rss_bytes": ok[-1]["baseline_rss_bytes"],
+                "output_bytes": ok[-1]["output_bytes"],
+                "diagnostics": ok[-1].get("diagnostics"),
+                "runs": [{"wall_seconds": r["wall_seconds"], "cpu_seconds": r["cpu_seconds"]} for r in ok],
+            })
+        results.append(entry)
+        status = f"{entry['wall_seconds']:8.3f} s" if ok else "  FAILED  "
+        print(f"{name:<24}{status}  {entry['message'] or ''}", file=sys.stderr)
+
+    report = {
+        "schema": RESULTS_SCHEMA,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "app_version": _app_version(),
+        "python": platform.python_version(),
+        "pymupdf": fitz.VersionBind,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "corpus_version": corpus.CORPUS_VERSION,
+        "scale": args.scale,
+        "repeat": args.repeat,
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0 if all(entry["success"] for entry in results) else 1
+
+
+def compare(args):
+    """Print old vs new per case; exit non-zero if any case got slower or bigger than the threshold."""
+    with open(args.old, encoding="utf-8") as f:
+        old = json.load(f)
+    with open(args.new, encoding="utf-8") as f:
+        new = json.load(f)
+    if (old.get("corpus_version"), old.get("scale")) != (new.get("corpus_version"), new.get("scale")):
+        print("Warning: the two runs used different corpora; ratios are not comparable.", file=sys.stderr)
+
+    old_results = {entry["case"]: entry for entry in old["results"]}
+    metrics = ("wall_seconds", "cpu_seconds", "peak_rss_bytes", "output_bytes")
+    regressions = []
+    print(f"{'case':<24}" + "".join(f"{metric:>18}" for metric in metrics))
+    for entry in new["results"]:
+        before = old_results.get(entry["case"])
+        if not before or not before["success"] or not entry["success"]:
+            state = "new case" if not before else "failed"
+            print(f"{entry['case']:<24}{state:>18}")
+            if before and before["success"] and not entry["success"]:
+                regressions.append(f"{entry['case']}: now fails ({entry['message']})")
+            continue
+        cells = []
+        for metric in metrics:
+            if not before.get(metric) or entry.get(metric) is None:
+                cells.append(f"{'-':>18}")
+                continue
+            ratio = entry[metric] / before[metric]
+            cells.append(f"{ratio:>17.2f}x")
+            # Wall time below a few milliseconds is mostly noise
+            noisy = metric.endswith("seconds") and before[metric] < 0.005
+            if ratio > 1 + args.threshold and not noisy:
+                regressions.append(f"{entry['case']}: {metric} {before[metric]:.4g} -> {entry[metric]:.4g}")
+        print(f"{entry['case']:<24}" + "".join(cells))
+
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    return 1 if regressions else 0
+
+
+def large(args):
+    """Run the large-file cases once each; fail if one fails or exceeds the memory ceiling."""
+    names = args.cases.split(",") if args.cases else list(LARGE_CASES)
+    unknown = [name for name in names if name not in LARGE_CASES]
+    if unknown:
+        sys.exit(f"Unknown case(s): {', '.join(unknown)}. Available: {', '.join(LARGE_CASES)}")
+    source = corpus.corpus_path("huge", args.scale)
+    print(f"{source}: {os.path.getsize(source) / 2**30:.2f} GiB", file=sys.stderr)
+    ceiling = args.max_rss_mb * 1024 * 1024
+    failures = 0
+    for name in names:
+        kinds, _ = LARGE_CASES[name]
+        result = _run_case(name, [corpus.corpus_path(kind, args.scale) for kind in kinds], args.timeout)
+        peak = result.get("peak_rss_bytes")
+        ok = result["success"] and (peak is None or peak <= ceiling)
+        failures += not ok
+        status = f"{result['wall_seconds']:8.1f} s {(peak or 0) / 2**20:8.0f} MiB" if result["success"] else "  FAILED"
+        print(f"{name:<24}{status}  {'ok' if ok else 'OVER LIMIT' if result['success'] else result['message']}")
+    return 1 if failures else 0
+
+
+def load(args):
+    from bench.load import run_load
+
+    source = args.input or corpus.corpus_path("text", args.scale)
+    result = run_load(args.url, source, args.op, json.loads(args.options), args.clients, args.jobs)
+    print(json.dumps(result, indent=2))
+    return 0 if result["failures"] == 0 else 1
+
+
+def build_corpus(args):
+    for kind, path in corpus.build(args.scale).items():
+        print(f"{kind:<8}{path}")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench", description="Benchmark the ForgePDF backend.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run benchmark cases and write JSON results")
+    run_parser.add_argument("--scale", type=float, default=1, help="corpus size multiplier (default 1)")
+    run_parser.add_argument("--repeat", type=int, default=3, help="runs per case; medians are reported (default 3)")
+    run_parser.add_argument("--cases", help=f"comma-separated subset of: {', '.join(CASES)}")
+    run_parser.add_argument("--timeout", type=float, default=1800, help="seconds allowed per run")
+    run_parser.add_argument("--output", help="write results here instead of stdout")
+    run_parser.set_defaults(func=run)
+
+    compare_parser = commands.add_parser("compare", help="compare two result files")
+    compare_parser.add_argument("old")
+    compare_parser.add_argument("new")
+    compare_parser.add_argument("--threshold", type=float, default=0.15,
+                                help="relative increase reported as a regression (default 0.15)")
+    compare_parser.set_defaults(func=compare)
+
+    large_parser = commands.add_parser("large", help="check that a >4 GiB PDF is processed within a memory ceiling")
+    large_parser.add_argument("--scale", type=float, default=1, help="file size multiplier (1 = 4.5 GiB)")
+    large_parser.add_argument("--max-rss-mb", type=int, default=512, help="peak RSS allowed per case (default 512)")
+    large_parser.add_argument("--cases", help=f"comma-separated subset of: {', '.join(LARGE_CASES)}")
+    large_parser.add_argument("--timeout", type=float, default=1800, help="seconds allowed per case")
+    large_parser.set_defaults(func=large)
+
+    load_parser = commands.add_parser("load", help="load-test a running server.py with concurrent clients")
+    load_parser.add_argument("--url", default="http://127.0.0.1:8765")
+    load_parser.add_argument("--op", default="compress")
+    load_parser.add_argument("--options", default="{}", help="extra job fields as JSON")
+    load_parser.add_argument("--input", help="PDF to send (default: the text corpus file)")
+    load_parser.add_argument("--scale", type=float, default=1)
+    load_parser.add_argument("--clients", type=int, default=8)
+    load_parser.add_argument("--jobs", type=int, default=100)
+    load_parser.set_defaults(func=load)
+
+    corpus_parser = commands.add_parser("corpus", help="generate the corpus and print its paths")
+    corpus_parser.add_argument("--scale", type=float, default=1)
+    corpus_parser.set_defaults(func=build_corpus)
+
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["_case"]:
+        _run_case_here(argv[1], argv[2], argv[3:])
+        return 0
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
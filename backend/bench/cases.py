@@ -0,0 +1,154 @@
+"""The benchmarked operations.
+
+Each case takes the corpus paths it needs and a scratch output folder, and
+returns the operation's own result dict. Everything written to the folder
+counts towards the case's output size.
+"""
+import os
+import json
+
+import compare
+import compress
+import edit_text
+import image_to_pdf
+import merge
+import organize_pdf
+import page_analysis
+import pdf_to_image
+import preview
+import protect
+import rotate
+import search
+import split
+import watermark
+import inspect_pdf
+from sessions import document
+
+
+def _page_count(path):
+    with document(path) as doc:
+        return len(doc)
+
+
+def _compress(inputs, out_dir):
+    return compress.compress_pdf(inputs[0], os.path.join(out_dir, "out.pdf"))
+
+
+def _merge(inputs, out_dir):
+    return merge.merge_pdfs(",".join(inputs), os.path.join(out_dir, "out.pdf"))
+
+
+def _split(inputs, out_dir):
+    pages = ",".join(str(n) for n in range(1, _page_count(inputs[0]) + 1, 2))
+    return split.split_pdf(inputs[0], pages, os.path.join(out_dir, "out.pdf"))
+
+
+def _organize(inputs, out_dir):
+    count = _page_count(inputs[0])
+    order = ",".join(str(n) for n in range(count, 0, -1))
+    deleted = ",".join(str(n) for n in range(10, count + 1, 10))
+    return organize_pdf.organize_pdf(inputs[0], order, deleted, os.path.join(out_dir, "out.pdf"))
+
+
+def _rotate(inputs, out_dir):
+    rotations = {str(n): 90 for n in range(1, _page_count(inputs[0]) + 1)}
+    return rotate.rotate_pdf(inputs[0], json.dumps(rotations), os.path.join(out_dir, "out.pdf"))
+
+
+def _protect(inputs, out_dir):
+    return protect.protect_pdf(inputs[0], os.path.join(out_dir, "out.pdf"), "benchmark")
+
+
+def _watermark(inputs, out_dir):
+    options = {"text": "CONFIDENTIAL", "orientation": "diagonal", "size": "large"}
+    return watermark.add_watermark(inputs[0], os.path.join(out_dir, "out.pdf"), json.dumps(options))
+
+
+def _preview_page(inputs, out_dir):
+    return preview.get_preview(inputs[0], "0", out_dir)
+
+
+def _preview_thumbnails(inputs, out_dir):
+    return preview.get_preview(inputs[0], "-1", out_dir)
+
+
+def _pdf_to_image(inputs, out_dir):
+    return pdf_to_image.pdf_to_image(inputs[0], out_dir)
+
+
+def _extract_text(inputs, out_dir):
+    result = edit_text.extract_text_with_positions(inputs[0])
+    # Keep the span count rather than the whole payload
+    if result.get("success"):
+        return {"success": True, "message": f"{len(result['text_blocks'])} spans"}
+    return result
+
+
+def _find_replace(inputs, out_dir):
+    return edit_text.find_and_replace(json.dumps({
+        "files": inputs, "find": "payment", "replace": "settlement", "outputDir": out_dir,
+    }))
+
+
+def _image_to_pdf(inputs, out_dir):
+    return image_to_pdf.image_to_pdf(inputs[0], os.path.join(out_dir, "out.pdf"))
+
+
+def _inspect(inputs, out_dir):
+    result = inspect_pdf.inspect_pdf(inputs[0])
+    if result.get("success"):
+        return {"success": True, "message": f"{result['pageCount']} pages, {result['kind']}"}
+    return result
+
+
+def _search_index(inputs, out_dir):
+    return search.index_library(inputs, db_path=os.path.join(out_dir, "library.sqlite"))
+
+
+def _compare(inputs, out_dir):
+    # Different documents, so every page is rendered and measured and gets a diff image
+    result = compare.compare_pdfs(inputs[0], inputs[1], out_dir)
+    return {"success": result["success"], "message": result["message"]}
+
+
+def _analyze_pages(inputs, out_dir):
+    result = page_analysis.analyze_pages(",".join(inputs))
+    return {"success": result["success"], "message": result["message"]}
+
+
+# Case name -> (corpus kinds passed as inputs, function)
+CASES = {
+    "compress_text": (["text"], _compress),
+    "compress_scan": (["scan"], _compress),
+    "compress_tagged": (["tagged"], _compress),
+    "compress_fonts": (["fonts"], _compress),
+    "merge": (["text", "scan", "tagged"], _merge),
+    "split_pages": (["pages"], _split),
+    "organize_pages": (["pages"], _organize),
+    "rotate_text": (["text"], _rotate),
+    "protect_text": (["text"], _protect),
+    "watermark_text": (["text"], _watermark),
+    "preview_page": (["text"], _preview_page),
+    "preview_thumbnails": (["text"], _preview_thumbnails),
+    "pdf_to_image_scan": (["scan"], _pdf_to_image),
+    "extract_text": (["text"], _extract_text),
+    "extract_text_tagged": (["tagged"], _extract_text),
+    "find_replace": (["text", "tagged"], _find_replace),
+    "image_to_pdf": (["images"], _image_to_pdf),
+    "search_index": (["text", "tagged", "pages"], _search_index),
+    "inspect_pages": (["pages"], _inspect),
+    "compare_text": (["text", "tagged"], _compare),
+    "analyze_pages": (["scan", "pages"], _analyze_pages),
+}
+
+# Run by `python -m bench large` on a file over 4 GiB, each under a memory ceiling
+LARGE_CASES = {
+    "large_inspect": (["huge"], _inspect),
+    "large_preview_page": (["huge"], _preview_page),
+    "large_split": (["huge"], _split),
+    "large_organize": (["huge"], _organize),
+    "large_rotate": (["huge"], _rotate),
+    "large_compress": (["huge"], _compress),
+    "large_watermark": (["huge"], _watermark),
+    "large_merge": (["huge", "text"], _merge),
+}
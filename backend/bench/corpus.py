@@ -0,0 +1,242 @@
+"""Reproducible synthetic inputs for the benchmarks.
+
+Every generator is seeded and writes fixed metadata, so the same corpus
+version and scale always produce byte-identical files.
+"""
+import os
+import random
+
+import fitz
+
+from cache import cache_dir
+
+# Bump when a generator changes, so stale cached files are not reused
+CORPUS_VERSION = 1
+SEED = 20250817
+
+_WORDS = (
+    "invoice agreement schedule party clause payment delivery section annex "
+    "warranty notice period term liability amount total balance account date "
+    "signature witness report quarter revenue expense margin forecast budget "
+    "the of and to in for on with by as at from that this is are be was"
+).split()
+_METADATA = {"producer": "forgepdf-bench", "creator": "forgepdf-bench", "creationDate": "", "modDate": ""}
+
+
+def _sentence(rng, words=12):
+    text = " ".join(rng.choice(_WORDS) for _ in range(words))
+    return text[0].upper() + text[1:] + "."
+
+
+def _paragraph(rng):
+    return " ".join(_sentence(rng, rng.randint(8, 18)) for _ in range(rng.randint(3, 6)))
+
+
+def _save(doc, path):
+    doc.set_metadata(_METADATA)
+    tmp_path = path + ".part"
+    doc.save(tmp_path, garbage=3, deflate=True, no_new_id=True)
+    doc.close()
+    os.replace(tmp_path, path)
+
+
+def text_heavy(path, pages):
+    """Dense multi-paragraph text pages with headings, like a contract or report."""
+    rng = random.Random(SEED)
+    doc = fitz.open()
+    for number in range(pages):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"Section {number + 1}: {_sentence(rng, 4)}", fontname="hebo", fontsize=14)
+        body = "\n\n".join(_paragraph(rng) for _ in range(6))
+        page.insert_textbox(fitz.Rect(72, 90, page.rect.width - 72, page.rect.height - 72),
+                            body, fontname="tiro", fontsize=10)
+    _save(doc, path)
+
+
+def _scan_pixmap(rng, dpi):
+    """A rendered text page with speckles, standing in for a scanner image."""
+    sheet = fitz.open()
+    page = sheet.new_page()
+    page.insert_textbox(fitz.Rect(60, 60, page.rect.width - 60, page.rect.height - 60),
+                        "\n\n".join(_paragraph(rng) for _ in range(7)), fontname="cour", fontsize=10)
+    shape = page.new_shape()
+    for _ in range(400):
+        x, y = rng.uniform(0, page.rect.width), rng.uniform(0, page.rect.height)
+        shape.draw_circle((x, y), rng.uniform(0.2, 1.0))
+    shape.finish(color=None, fill=(0.3, 0.3, 0.3))
+    shape.commit()
+    pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY)
+    sheet.close()
+    return pix
+
+
+def scanned(path, pages, dpi=150):
+    """One full-page grayscale JPEG per page and no text layer."""
+    rng = random.Random(SEED)
+    doc = fitz.open()
+    for _ in range(pages):
+        pix = _scan_pixmap(rng, dpi)
+        page = doc.new_page()
+        page.insert_image(page.rect, stream=pix.tobytes("jpeg", jpg_quality=75))
+    _save(doc, path)
+
+
+def tagged(path, pages):
+    """Tagged pages made of many small objects: short spans, annotations and structure elements."""
+    rng = random.Random(SEED)
+    doc = fitz.open()
+    elements = []
+    for _ in range(pages):
+        page = doc.new_page()
+        for row in range(45):
+            y = 60 + row * 16
+            page.insert_text((60, y), _sentence(rng, 3), fontname="helv", fontsize=9)
+            page.insert_text((320, y), f"{rng.randint(1, 99999):>7}.{rng.randint(0, 99):02d}", fontname="cour", fontsize=9)
+            page.draw_rect(fitz.Rect(56, y - 11, page.rect.width - 56, y + 4), color=(0.8, 0.8, 0.8), width=0.3)
+        for index in range(30):
+            x, y = 60 + (index % 10) * 48, 800 + (index // 10) * 12
+            page.add_rect_annot(fitz.Rect(x, y - 8, x + 40, y + 2)).set_info(content=_sentence(rng, 2))
+        elements.append((page.xref, 45 * 2))
+
+    # One structure element per text run, all under a single document element
+    root_xref, doc_elem_xref = doc.get_new_xref(), doc.get_new_xref()
+    kids = []
+    for page_xref, runs in elements:
+        for mcid in range(runs):
+            xref = doc.get_new_xref()
+            doc.update_object(xref, f"<< /Type /StructElem /S /P /P {doc_elem_xref} 0 R /Pg {page_xref} 0 R /K {mcid} >>")
+            kids.append(f"{xref} 0 R")
+    doc.update_object(doc_elem_xref, f"<< /Type /StructElem /S /Document /P {root_xref} 0 R /K [{' '.join(kids)}] >>")
+    doc.update_object(root_xref, f"<< /Type /StructTreeRoot /K {doc_elem_xref} 0 R >>")
+    catalog = doc.pdf_catalog()
+    doc.xref_set_key(catalog, "StructTreeRoot", f"{root_xref} 0 R")
+    doc.xref_set_key(catalog, "MarkInfo", "<< /Marked true >>")
+    _save(doc, path)
+
+
+def many_pages(path, pages):
+    """A very long document with a single line per page."""
+    doc = fitz.open()
+    for number in range(pages):
+        doc.new_page(width=612, height=792).insert_text((72, 72), f"Page {number + 1}", fontsize=12)
+    _save(doc, path)
+
+
+def embedded_fonts(path, pages):
+    """Pages set in fully embedded fonts: a 3.5 MB CJK font and a CFF text font.
+
+    Made of two parts that each carry their own copy of the fonts, like
+    documents assembled from separately produced files.
+    """
+    rng = random.Random(SEED)
+    cjk, serif = fitz.Font("cjk").buffer, fitz.Font("tiro").buffer
+    han = "报告书年月日第页中文测试合同条款金额说明"
+    doc = fitz.open()
+    for part_pages in (pages // 2, pages - pages // 2):
+        # A font buffer is embedded once per document, so each part is its own document
+        part = fitz.open()
+        for _ in range(part_pages):
+            page = part.new_page()
+            page.insert_font(fontname="CJK", fontbuffer=cjk)
+            page.insert_font(fontname="Serif", fontbuffer=serif)
+            page.insert_text((72, 72), "".join(rng.choice(han) for _ in range(16)), fontname="CJK", fontsize=14)
+            page.insert_textbox(fitz.Rect(72, 100, page.rect.width - 72, page.rect.height - 72),
+                                _paragraph(rng), fontname="Serif", fontsize=10)
+        doc.insert_pdf(part)
+        part.close()
+    _save(doc, path)
+
+
+def image_folder(path, images, dpi=150):
+    """A folder of scanner-style JPEG and PNG files for image_to_pdf."""
+    rng = random.Random(SEED)
+    tmp_path = path + ".part"
+    os.makedirs(tmp_path, exist_ok=True)
+    for number in range(images):
+        pix = _scan_pixmap(rng, dpi)
+        pix.set_dpi(dpi, dpi)
+        if number % 2:
+            pix.save(os.path.join(tmp_path, f"scan_{number + 1}.png"))
+        else:
+            pix.save(os.path.join(tmp_path, f"scan_{number + 1}.jpg"), jpg_quality=75)
+    os.replace(tmp_path, path)
+
+
+def huge(path, pages, side=4096):
+    """Pages that each draw one uncompressed RGB image of side x side pixels (48 MiB at 4096).
+
+    Meant for large-file checks: at scale 1 the file is over 4 GiB. The
+    image data is one seeded random block repeated, written in chunks, so
+    generating it needs no more memory than the block.
+    """
+    rng = random.Random(SEED)
+    block = rng.randbytes(1 << 20)
+    image_bytes = side * side * 3
+    tmp_path = path + ".part"
+    offsets = [0, 0, 0]  # Object 0 is unused; 1 = catalog, 2 = page tree
+    kids = []
+    with open(tmp_path, "wb") as f:
+        def begin():
+            offsets.append(f.tell())
+            f.write(b"%d 0 obj\n" % (len(offsets) - 1))
+            return len(offsets) - 1
+
+        f.write(b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n")
+        for _ in range(pages):
+            image = begin()
+            f.write(b"<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceRGB"
+                    b" /BitsPerComponent 8 /Length %d >>\nstream\n" % (side, side, image_bytes))
+            remaining = image_bytes
+            while remaining:
+                chunk = block[:min(remaining, len(block))]
+                f.write(chunk)
+                remaining -= len(chunk)
+            f.write(b"\nendstream\nendobj\n")
+            content = b"q 595 0 0 595 0 123 cm /Im0 Do Q"
+            begin()
+            f.write(b"<< /Length %d >>\nstream\n%s\nendstream\nendobj\n" % (len(content), content))
+            kids.append(begin())
+            f.write(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Resources << /XObject << /Im0 %d 0 R >> >>"
+                    b" /Contents %d 0 R >>\nendobj\n" % (image, image + 1))
+        offsets[2] = f.tell()
+        f.write(b"2 0 obj\n<< /Type /Pages /Count %d /Kids [%s] >>\nendobj\n"
+                % (len(kids), b" ".join(b"%d 0 R" % kid for kid in kids)))
+        offsets[1] = f.tell()
+        f.write(b"1 0 obj\n<< /Type /Catalog /Pages 2 0 R >>\nendobj\n")
+        xref_offset = f.tell()
+        f.write(b"xref\n0 %d\n0000000000 65535 f \n" % len(offsets))
+        for offset in offsets[1:]:
+            f.write(b"%010d 00000 n \n" % offset)
+        f.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(offsets), xref_offset))
+    os.replace(tmp_path, path)
+
+
+# Corpus name -> (generator, item count at scale 1)
+KINDS = {
+    "text": (text_heavy, 40),
+    "scan": (scanned, 10),
+    "tagged": (tagged, 8),
+    "pages": (many_pages, 2000),
+    "images": (image_folder, 10),
+    "fonts": (embedded_fonts, 200),
+}
+# Only generated on demand (python -m bench large), not by build()
+LARGE_KINDS = {
+    "huge": (huge, 96),
+}
+
+
+def corpus_path(kind, scale=1, directory=None):
+    """Path of one corpus file (or folder), generating it on first use."""
+    generator, count = KINDS[kind] if kind in KINDS else LARGE_KINDS[kind]
+    directory = directory or cache_dir(os.path.join("bench", f"v{CORPUS_VERSION}"))
+    name = f"{kind}_x{scale}" + ("" if kind == "images" else ".pdf")
+    path = os.path.join(directory, name)
+    if not os.path.exists(path):
+        generator(path, max(1, int(count * scale)))
+    return path
+
+
+def build(scale=1, directory=None):
+    """Generate the whole corpus and return {kind: path}."""
+    return {kind: corpus_path(kind, scale, directory) for kind in KINDS}
@@ -0,0 +1,112 @@
+"""Concurrent-client load test for the HTTP service (server.py).
+
+Each client repeatedly uploads the input, submits a job, polls it and
+downloads the result, over one keep-alive connection. Reports throughput
+and latency percentiles as JSON.
+"""
+import time
+import json
+import threading
+import statistics
+import http.client
+from urllib.parse import urlsplit
+
+POLL_INTERVAL = 0.02
+
+
+class _Client:
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.conn = http.client.HTTPConnection(self.host, self.port, timeout=300)
+
+    def request(self, method, path, body=None, headers=None):
+        self.conn.request(method, path, body=body, headers=headers or {})
+        response = self.conn.getresponse()
+        data = response.read()
+        if response.getheader("Connection", "").lower() == "close":
+            self.conn.close()
+            self.conn = http.client.HTTPConnection(self.host, self.port, timeout=300)
+        return response.status, data
+
+    def json(self, method, path, payload=None):
+        body = json.dumps(payload).encode("utf-8") if payload is not None else None
+        status, data = self.request(method, path, body, {"Content-Type": "application/json"} if body else None)
+        return status, json.loads(data) if data else None
+
+
+def _one_job(client, data, op, options):
+    """Upload, submit (backing off while the queue is full), wait and download. Returns (ok, rejections)."""
+    status, body = client.request("PUT", "/files", data, {"Content-Type": "application/pdf"})
+    if status != 201:
+        return False, 0
+    uploaded = json.loads(body)
+    rejected = 0
+    while True:
+        status, job = client.json("POST", "/jobs", {"op": op, "input": uploaded["id"], **options})
+        if status != 503:
+            break
+        rejected += 1
+        time.sleep(0.05 * min(rejected, 20))
+    if status != 202:
+        return False, rejected
+    while True:
+        status, state = client.json("GET", f"/jobs/{job['id']}")
+        if state["state"] in ("done", "failed"):
+            break
+        time.sleep(POLL_INTERVAL)
+    ok = state["state"] == "done"
+    if ok:
+        status, _ = client.request("GET", f"/jobs/{job['id']}/result")
+        ok = status == 200
+    client.request("DELETE", f"/jobs/{job['id']}")
+    client.request("DELETE", f"/files/{uploaded['id']}")
+    return ok, rejected
+
+
+def run_load(url, input_path, op="compress", options=None, clients=8, jobs=100):
+    with open(input_path, "rb") as f:
+        data = f.read()
+    latencies, failures, rejections = [], [0], [0]
+    lock = threading.Lock()
+    remaining = [jobs]
+
+    def client_loop():
+        client = _Client(url)
+        while True:
+            with lock:
+                if not remaining[0]:
+                    return
+                remaining[0] -= 1
+            start = time.perf_counter()
+            try:
+                ok, rejected = _one_job(client, data, op, options or {})
+            except (OSError, http.client.HTTPException, ValueError):
+                ok, rejected = False, 0
+                client = _Client(url)
+            with lock:
+                latencies.append(time.perf_counter() - start)
+                failures[0] += not ok
+                rejections[0] += rejected
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client_loop) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "op": op,
+        "clients": clients,
+        "jobs": jobs,
+        "failures": failures[0],
+        "queue_full_rejections": rejections[0],
+        "seconds": round(elapsed, 3),
+        "jobs_per_second": round(jobs / elapsed, 3),
+        "latency_p50": round(statistics.median(latencies), 4),
+        "latency_p95": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 4),
+        "latency_max": round(latencies[-1], 4),
+    }
@@ -0,0 +1,23 @@
+import os
+import hashlib
+import tempfile
+
+
+def cache_dir(name):
+    """Return (and create) the on-disk cache directory for one backend feature."""
+    root = os.getenv("FORGEPDF_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "forgepdf_cache")
+    path = os.path.join(root, name)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def path_key(path):
+    """Stable key for a file location, independent of its contents."""
+    return hashlib.sha1(os.path.realpath(path).encode("utf-8")).hexdigest()
+
+
+def file_fingerprint(path):
+    """Cheap identity of a file's current contents: location, size and mtime."""
+    st = os.stat(path)
+    key = f"{os.path.realpath(path)}|{st.st_size}|{st.st_mtime_ns}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
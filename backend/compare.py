@@ -0,0 +1,236 @@
+"""Visual comparison of two PDFs, e.g. a document and its compressed or
+watermarked version.
+
+Corresponding pages are rendered at the same resolution and compared on
+their raw RGB samples with NumPy:
+
+    changedRatio  share of pixels where a channel differs by more than `tolerance`
+    psnr          peak signal-to-noise ratio in dB (null for identical pages)
+    ssim          structural similarity of the luminance, averaged over 8x8 blocks
+
+A page whose changed ratio is above `threshold` fails; with an output
+folder, it gets a diff_<page>.png showing the second document faded with
+the changed pixels in red.
+
+Identical documents are confirmed quickly: files with the same content
+are not rendered at all, and pages whose renderings are byte-identical
+skip the metrics. Pages are compared in a process pool; `failFast`
+stops at the first failing page.
+"""
+import os
+import sys
+import json
+import math
+import itertools
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import fitz
+import numpy as np
+
+import memo
+import progress
+import sessions
+
+DEFAULT_DPI = 72
+# Per-channel difference below which a pixel counts as unchanged: absorbs
+# anti-aliasing and JPEG recompression noise
+DEFAULT_TOLERANCE = 16
+DEFAULT_THRESHOLD = 0.001
+# Documents this short are compared in-process; a pool costs more than it saves
+INLINE_PAGES = 4
+SSIM_BLOCK = 8
+_SSIM_C1 = (0.01 * 255) ** 2
+_SSIM_C2 = (0.03 * 255) ** 2
+
+_docs = None  # (first, second) documents opened by each pool process
+
+
+def _samples(pix, data):
+    return np.frombuffer(data, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
+
+
+def _padded(pixels, height, width):
+    """`pixels` on a white canvas of the given size, for pages whose sizes differ."""
+    if pixels.shape[:2] == (height, width):
+        return pixels
+    canvas = np.full((height, width, 3), 255, dtype=np.uint8)
+    canvas[:pixels.shape[0], :pixels.shape[1]] = pixels
+    return canvas
+
+
+def _block_means(values, rows, columns):
+    # Summing the rows of each block first, over whole image rows, is several
+    # times faster than one reduction over both block axes
+    row_sums = values.reshape(rows, SSIM_BLOCK, columns * SSIM_BLOCK).sum(axis=1)
+    return row_sums.reshape(rows, columns, SSIM_BLOCK).sum(axis=2) / SSIM_BLOCK ** 2
+
+
+def _ssim(a, b):
+    """Mean SSIM of the luminance of two RGB images over non-overlapping blocks."""
+    weights = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    rows, columns = a.shape[0] // SSIM_BLOCK, a.shape[1] // SSIM_BLOCK
+    if not rows or not columns:
+        return 1.0 if np.array_equal(a, b) else 0.0
+    height, width = rows * SSIM_BLOCK, columns * SSIM_BLOCK
+    x = a[:height, :width] @ weights
+    y = b[:height, :width] @ weights
+    mean_x, mean_y = _block_means(x, rows, columns), _block_means(y, rows, columns)
+    var_x = _block_means(x * x, rows, columns) - mean_x ** 2
+    var_y = _block_means(y * y, rows, columns) - mean_y ** 2
+    covariance = _block_means(x * y, rows, columns) - mean_x * mean_y
+    ssim = ((2 * mean_x * mean_y + _SSIM_C1) * (2 * covariance + _SSIM_C2)) / \
+           ((mean_x ** 2 + mean_y ** 2 + _SSIM_C1) * (var_x + var_y + _SSIM_C2))
+    return float(ssim.mean())
+
+
+def _highlight(b, changed):
+    """The second rendering faded towards white, with changed pixels (slightly grown) in red."""
+    grown = changed.copy()
+    grown[1:] |= changed[:-1]
+    grown[:-1] |= changed[1:]
+    grown[:, 1:] |= grown[:, :-1].copy()
+    grown[:, :-1] |= grown[:, 1:].copy()
+    image = (b // 4 + 191).astype(np.uint8)
+    image[grown] = (255, 0, 0)
+    return image
+
+
+def _render(doc, index, dpi):
+    # Each page is rendered once, so not through the display list cache
+    return doc.load_page(index).get_pixmap(matrix=fitz.Matrix(dpi / 72, dpi / 72), colorspace=fitz.csRGB)
+
+
+def _compare_page(doc_a, doc_b, index, dpi, tolerance, threshold, output_dir):
+    """Render page `index` of both documents and measure how much it changed."""
+    pix_a = _render(doc_a, index, dpi)
+    pix_b = _render(doc_b, index, dpi)
+    entry = {"page": index + 1}
+    # Pixmap.samples copies the pixels on every access
+    data_a, data_b = pix_a.samples, pix_b.samples
+    if (pix_a.width, pix_a.height) == (pix_b.width, pix_b.height) and data_a == data_b:
+        return {**entry, "identical": True, "changedRatio": 0.0, "psnr": None, "ssim": 1.0, "passed": True}
+
+    height, width = max(pix_a.height, pix_b.height), max(pix_a.width, pix_b.width)
+    a = _padded(_samples(pix_a, data_a), height, width)
+    b = _padded(_samples(pix_b, data_b), height, width)
+    difference = np.abs(a.astype(np.int16) - b)
+    # Element-wise over the channels: a reduction along the short last axis is far slower
+    changed = np.maximum(np.maximum(difference[..., 0], difference[..., 1]), difference[..., 2]) > tolerance
+    changed_ratio = int(np.count_nonzero(changed)) / changed.size
+    mse = float(np.mean(np.square(difference, dtype=np.float32)))
+    entry.update({
+        "identical": False,
+        "changedRatio": round(changed_ratio, 6),
+        "psnr": round(10 * math.log10(255 ** 2 / mse), 2) if mse else None,
+        "ssim": round(_ssim(a, b), 4),
+        "passed": changed_ratio <= threshold,
+    })
+    if (pix_a.width, pix_a.height) != (pix_b.width, pix_b.height):
+        entry["sizeChanged"] = True
+    if not entry["passed"] and output_dir:
+        image = _highlight(b, changed)
+        path = os.path.join(output_dir, f"diff_{index + 1}.png")
+        fitz.Pixmap(fitz.csRGB, width, height, image.tobytes(), False).save(path)
+        entry["diffImage"] = path
+    return entry
+
+
+def _open_worker(path_a, path_b):
+    global _docs
+    _docs = (fitz.open(path_a), fitz.open(path_b))
+
+
+def _compare_in_worker(task):
+    return _compare_page(*_docs, *task)
+
+
+def _page_results(path_a, path_b, tasks, workers):
+    """Compare pages in a process pool, in order, keeping only a small window in flight."""
+    window = max(2, (workers or os.cpu_count() or 1) * 2)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_open_worker, initargs=(path_a, path_b)) as pool:
+        pending = deque(pool.submit(_compare_in_worker, task) for task in itertools.islice(tasks, window))
+        try:
+            while pending:
+                future = pending.popleft()
+                for next_task in itertools.islice(tasks, 1):
+                    pending.append(pool.submit(_compare_in_worker, next_task))
+                yield future.result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def compare_pdfs(first_path, second_path, output_dir=None, options_json="{}", workers=None):
+    try:
+        if not os.path.exists(first_path) or not os.path.exists(second_path):
+            return {"success": False, "message": "PDF file does not exist."}
+        try:
+            options = json.loads(options_json or "{}")
+            dpi = int(options.get("dpi", DEFAULT_DPI))
+            tolerance = int(options.get("tolerance", DEFAULT_TOLERANCE))
+            threshold = float(options.get("threshold", DEFAULT_THRESHOLD))
+            fail_fast = bool(options.get("failFast", False))
+        except (ValueError, TypeError, AttributeError) as e:
+            return {"success": False, "message": f"Invalid options: {e}"}
+
+        with sessions.document(first_path) as doc_a, sessions.document(second_path) as doc_b:
+            if doc_a.needs_pass or doc_b.needs_pass:
+                return {"success": False, "message": "Password-protected documents can't be compared."}
+            counts = (doc_a.page_count, doc_b.page_count)
+            total = min(counts)
+            progress.count(pages=max(counts))
+
+            if os.path.getsize(first_path) == os.path.getsize(second_path) and \
+                    memo.content_hash(first_path) == memo.content_hash(second_path):
+                return {"success": True, "identical": True, "passed": True, "pageCount": total,
+                        "pages": [], "message": f"The documents are identical ({total} pages)."}
+
+            if output_dir:
+                os.makedirs(output_dir, exist_ok=True)
+            progress.phase("compare")
+            tasks = ((index, dpi, tolerance, threshold, output_dir) for index in range(total))
+            if total <= INLINE_PAGES or workers == 1:
+                results = (_compare_page(doc_a, doc_b, *task) for task in tasks)
+            else:
+                results = _page_results(first_path, second_path, tasks, workers)
+            pages = []
+            for entry in results:
+                progress.check_cancelled()
+                pages.append(entry)
+                progress.advance(len(pages), total)
+                if fail_fast and not entry["passed"]:
+                    break
+            results.close()
+
+        failed = [entry["page"] for entry in pages if not entry["passed"]]
+        changed = sum(not entry["identical"] for entry in pages)
+        passed = not failed and counts[0] == counts[1]
+        if counts[0] != counts[1]:
+            message = f"The documents have different page counts ({counts[0]} and {counts[1]})."
+        elif failed:
+            message = f"{len(failed)} page(s) changed visibly: {', '.join(map(str, failed[:20]))}" + \
+                      ("..." if len(failed) > 20 else ".")
+        else:
+            message = f"No visible changes in {total} pages ({changed} with minor differences)."
+        return {
+            "success": True,
+            "identical": changed == 0 and counts[0] == counts[1] and len(pages) == total,
+            "passed": passed,
+            "pageCount": total,
+            "pageCounts": list(counts),
+            "failedPages": failed,
+            "pages": pages,
+            "message": message,
+        }
+    except Exception as e:
+        return {"success": False, "message": f"An unexpected error occurred: {str(e)}"}
+
+
+if __name__ == "__main__":
+    first_path = sys.argv[1]
+    second_path = sys.argv[2]
+    output_dir = sys.argv[3] if len(sys.argv) > 3 and sys.argv[3] else None
+    options_json = sys.argv[4] if len(sys.argv) > 4 else "{}"
+    result = compare_pdfs(first_path, second_path, output_dir, options_json)
+    print(json.dumps(result))
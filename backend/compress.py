@@ -1,17 +1,186 @@
-import sys, json, fitz, os, logging
+import sys, json, fitz, os, re, logging, hashlib
+import memo
+import progress
 
+_FONT_FILE_KEYS = ("FontFile", "FontFile2", "FontFile3")
+_REF_RE = re.compile(r"/([^\s/<>\[\]()]+)\s+(\d+)\s+0\s+R")
+_OBJECT_REF_RE = re.compile(r"\b(\d+)\s+0\s+R\b")
+_TF_RE = re.compile(rb"/([^\s/<>\[\]()%{}]+)\s+[-+]?[\d.]+\s+Tf\b")
+_SUBSET_PREFIX_RE = re.compile(r"^[A-Z]{6}\+")
 
+
+# --- Fonts ---
+
+def _font_programs(doc):
+    """Embedded font programs: {font file xref: (font name, [(descriptor xref, key)])}."""
+    programs = {}
+    for xref in range(1, doc.xref_length()):
+        if doc.xref_get_key(xref, "Type") != ("name", "/FontDescriptor"):
+            continue
+        name = _SUBSET_PREFIX_RE.sub("", doc.xref_get_key(xref, "FontName")[1].lstrip("/"))
+        for key in _FONT_FILE_KEYS:
+            kind, value = doc.xref_get_key(xref, key)
+            if kind == "xref":
+                program = int(value.split()[0])
+                programs.setdefault(program, (name, []))[1].append((xref, key))
+    return programs
+
+
+def _font_sizes(doc):
+    """Stored bytes of each embedded font program, by font name."""
+    sizes = {}
+    for program, (name, _) in _font_programs(doc).items():
+        sizes[name] = sizes.get(name, 0) + len(doc.xref_stream_raw(program))
+    return sizes
+
+
+def _merge_font_programs(doc, programs):
+    """Point descriptors that embed the same font program at one copy of it; returns copies dropped per font."""
+    first = {}
+    merged = {}
+    for program, (name, users) in programs.items():
+        digest = hashlib.sha256(doc.xref_stream(program)).digest()
+        if digest not in first:
+            first[digest] = program
+            continue
+        for descriptor, key in users:
+            doc.xref_set_key(descriptor, key, f"{first[digest]} 0 R")
+        merged[name] = merged.get(name, 0) + 1
+    return merged
+
+
+def _font_resources(doc, page_xref):
+    """Where the font dictionary a page uses is, or None when it is inherited.
+
+    Returns (owner xref, key path, indirect objects on the way): the
+    resources and font dictionaries that other objects could reference too.
+    """
+    kind, value = doc.xref_get_key(page_xref, "Resources")
+    if kind == "xref":
+        owner, path = int(value.split()[0]), "Font"
+        shared = (owner,)
+    elif kind == "dict":
+        owner, path = page_xref, "Resources/Font"
+        shared = ()
+    else:
+        return None
+    kind, value = doc.xref_get_key(owner, path)
+    if kind == "xref":
+        return int(value.split()[0]), "", shared + (int(value.split()[0]),)
+    return (owner, path, shared) if kind == "dict" else None
+
+
+def _scan_references(doc, targets):
+    """Which objects reference each of `targets`, and whether any form XObject lacks /Resources."""
+    referrers = {xref: set() for xref in targets}
+    inheriting_form = False
+    for xref in range(1, doc.xref_length()):
+        source = doc.xref_object(xref, compressed=True)
+        if "/Subtype/Form" in source and "/Resources" not in source:
+            inheriting_form = True
+        for ref in _OBJECT_REF_RE.findall(source):
+            if int(ref) in referrers:
+                referrers[int(ref)].add(xref)
+    return referrers, inheriting_form
+
+
+def _drop_unused_fonts(doc):
+    """Remove font resources no page's content selects; returns the number removed.
+
+    Only content streams of pages are scanned, so a font dictionary is only
+    pruned when nothing but pages can reach it: one that a form XObject, an
+    annotation appearance or the form defaults (/DR) also reference, directly
+    or through a shared resources dictionary, is left alone. So are all of
+    them if any form XObject takes its resources from the page it is drawn on.
+    A font dictionary reached from several pages, by whatever path, loses a
+    name only if none of them uses it.
+    """
+    used = {}  # (owner xref, key path) of a font dictionary -> names the pages select
+    shared = {}  # the same -> indirect objects through which pages reach it
+    pages = set()
+    for page in doc:
+        progress.check_cancelled()
+        pages.add(page.xref)
+        location = _font_resources(doc, page.xref)
+        if location is None:
+            continue
+        owner, path, through = location
+        shared.setdefault((owner, path), set()).update(through)
+        # A content array is one stream split in pieces; an operator may straddle two of them
+        contents = b"\n".join(doc.xref_stream(content) or b"" for content in page.get_contents())
+        used.setdefault((owner, path), set()).update(name.decode("latin-1") for name in _TF_RE.findall(contents))
+
+    referrers, inheriting_form = _scan_references(doc, set().union(*shared.values()))
+    if inheriting_form:
+        return 0
+    removed = 0
+    for (owner, path), names in used.items():
+        through = shared[(owner, path)]
+        if any(referrers[xref] - pages - through for xref in through):
+            continue
+        declared = doc.xref_object(owner, compressed=True) if not path else doc.xref_get_key(owner, path)[1]
+        for name, _ in _REF_RE.findall(declared):
+            if name not in names:
+                doc.xref_set_key(owner, f"{path}/{name}" if path else name, "null")
+                removed += 1
+    return removed
+
+
+def _optimize_fonts(doc):
+    """Drop unused font resources, merge identical font programs and subset the rest to the glyphs used.
+
+    Returns the stored size of every embedded font before the pass and how
+    many duplicate copies of each were merged.
+    """
+    programs = _font_programs(doc)
+    if not programs:
+        return {}, {}
+    before = _font_sizes(doc)
+    _drop_unused_fonts(doc)
+    merged = _merge_font_programs(doc, programs)
+    try:
+        # MuPDF's own subsetter (TrueType and CFF); leaves fonts it can't handle as they are
+        doc.subset_fonts()
+    except Exception:
+        logging.warning("Font subsetting failed; fonts are kept whole", exc_info=True)
+    return before, merged
+
+
+def _font_report(before, merged, out_path):
+    with fitz.open(out_path) as result:
+        after = _font_sizes(result)
+    fonts = [{"font": name, "before": size, "after": after.get(name, 0), "saved": size - after.get(name, 0),
+              "mergedCopies": merged.get(name, 0)} for name, size in before.items()]
+    return sorted(fonts, key=lambda font: -font["saved"])
+
+
+@memo.memoize(inputs="in_path", output="out_path")
 def compress_pdf(in_path, out_path):
     try:
         initial = os.path.getsize(in_path)
+        progress.phase("open")
         with fitz.open(in_path) as doc:
+            progress.count(pages=len(doc), objects=doc.xref_length() - 1, bytes=initial)
+            before, merged = {}, {}
+            if not doc.is_encrypted:
+                progress.phase("fonts")
+                before, merged = _optimize_fonts(doc)
+            # The save below can't be interrupted; this is the last cancellation point
+            progress.check_cancelled()
+            progress.phase("save")
             doc.save(out_path, garbage=4, deflate=True, clean=True)
         final = os.path.getsize(out_path)
         reduction = (initial - final) / initial * 100 if initial > 0 else 0
-        return {
+        result = {
             "success": True,
             "message": f"Compressed by {reduction:.1f}%. New size: {final/1024:.1f} KB",
         }
+        if before:
+            result["fonts"] = _font_report(before, merged, out_path)
+            saved = sum(font["saved"] for font in result["fonts"])
+            if saved > 0:
+                result["message"] += f" ({saved/1024:.1f} KB from fonts)"
+        return result
     except FileNotFoundError:
         logging.exception("Input file not found: %s", in_path)
         return {"success": False, "message": "Input file not found."}
@@ -1,75 +1,271 @@
-import sys, json, fitz, pikepdf
+import sys, os, re, json, tempfile, fitz, pikepdf
+from concurrent.futures import ProcessPoolExecutor
 from pikepdf import Pdf, PdfImage
+from text_index import open_index
 
-def extract_text_with_positions(pdf_path):
-    """Extract text with positions for editing"""
+def extract_text_with_positions(pdf_path, page=None, region=None):
+    """Extract text with positions for editing, served from the cached text index"""
     try:
-        doc = fitz.open(pdf_path)
-        text_blocks = []
-        
-        for page_num in range(len(doc)):
-            page = doc[page_num]
-            blocks = page.get_text("dict")["blocks"]
-            
-            for block in blocks:
-                if "lines" in block:  # Text block
-                    for line in block["lines"]:
-                        for span in line["spans"]:
-                            text_blocks.append({
-                                "page": page_num + 1,
-                                "text": span["text"],
-                                "bbox": span["bbox"],  # [x0, y0, x1, y1]
-                                "font": span["font"],
-                                "size": span["size"],
-                                "color": span["color"]
-                            })
-        
-        doc.close()
-        return {"success": True, "text_blocks": text_blocks}
+        with open_index(pdf_path) as index:
+            text_blocks = index.spans(page=page, region=region)
+            page_count = index.page_count
+        return {"success": True, "text_blocks": text_blocks, "pageCount": page_count}
     except Exception as e:
         return {"success": False, "message": f"Error extracting text: {e}"}
 
-def replace_text_in_pdf(pdf_path, replacements_json, output_path):
-    """Replace text in PDF using redaction and overlay"""
+# Documents with at least this many edited pages are split across worker processes
+PARALLEL_MIN_PAGES = 64
+
+
+def _group_by_page(replacements, page_count):
+    """Group replacements by 0-based page index, dropping out-of-range pages."""
+    by_page = {}
+    for replacement in replacements:
+        page_num = replacement["page"] - 1
+        if 0 <= page_num < page_count:
+            by_page.setdefault(page_num, []).append(replacement)
+    return by_page
+
+
+def _text_color(color):
+    # Extracted spans carry colours as sRGB integers; insert calls want RGB floats
+    if isinstance(color, int):
+        return fitz.sRGB_to_pdf(color)
+    return tuple(color)
+
+
+def _apply_page_replacements(page, replacements, fonts):
+    """Redact every old text box on the page at once, then write all new text."""
+    for replacement in replacements:
+        page.add_redact_annot(replacement["bbox"])
+    page.apply_redactions()
+
+    # One TextWriter per colour: a writer paints all of its text in one colour
+    writers = {}
+    for replacement in replacements:
+        bbox = replacement["bbox"]
+        color = _text_color(replacement.get("color", (0, 0, 0)))
+        fontname = replacement.get("fontname", "helv")
+        if fontname not in fonts:
+            fonts[fontname] = fitz.Font(fontname)
+        tw = writers.setdefault(color, fitz.TextWriter(page.rect, color=color))
+        tw.append(
+            replacement.get("origin", (bbox[0], bbox[3])),  # Default: bottom-left of the old box
+            replacement["new_text"],
+            font=fonts[fontname],
+            fontsize=replacement.get("size", 12),
+        )
+    for tw in writers.values():
+        tw.write_text(page)
+
+
+def _replace_page_chunk(pdf_path, chunk, chunk_path):
+    """Worker: apply one chunk of page edits and save just those pages.
+
+    Also returns, per page, the object numbers of the annotations the
+    redactions removed (such as links over the replaced text).
+    """
+    fonts = {}
+    removed = {}
+    with fitz.open(pdf_path) as doc:
+        for page_num, replacements in chunk:
+            page = doc[page_num]
+            before = {xref for xref, *_ in page.annot_xrefs()}
+            _apply_page_replacements(page, replacements, fonts)
+            removed[page_num] = before - {xref for xref, *_ in page.annot_xrefs()}
+        doc.select([page_num for page_num, _ in chunk])
+        doc.save(chunk_path, garbage=1)
+    return chunk_path, removed
+
+
+def _replace_in_parallel(pdf_path, by_page, output_path, workers):
+    """Edit page chunks in worker processes and write `pdf_path` with their content to `output_path`.
+
+    Only the edited pages' content streams and resources are copied back,
+    and the annotations the redactions removed are dropped from /Annots;
+    the original page objects stay, so links, destinations, outline entries,
+    form fields and the structure tree that point at them keep working.
+    """
+    items = sorted(by_page.items())
+    workers = min(workers or os.cpu_count() or 1, len(items))
+    size = -(-len(items) // workers)
+    chunks = [items[i:i + size] for i in range(0, len(items), size)]
+
+    with tempfile.TemporaryDirectory() as tmp, ProcessPoolExecutor(max_workers=workers) as pool, \
+            Pdf.open(pdf_path) as pdf:
+        futures = [
+            pool.submit(_replace_page_chunk, pdf_path, chunk, os.path.join(tmp, f"chunk_{i}.pdf"))
+            for i, chunk in enumerate(chunks)
+        ]
+        for chunk, future in zip(chunks, futures):
+            chunk_path, removed = future.result()
+            with Pdf.open(chunk_path) as edited:
+                for j, (page_num, _) in enumerate(chunk):
+                    source, target = edited.pages[j].obj, pdf.pages[page_num].obj
+                    # Objects shared between pages of a chunk are copied once; only indirect ones can be
+                    for key in ("/Contents", "/Resources"):
+                        target[key] = pdf.copy_foreign(edited.make_indirect(source[key]))
+                    if removed[page_num]:
+                        target.Annots = pikepdf.Array([
+                            annot for annot in target.Annots
+                            if not (annot.is_indirect and annot.objgen[0] in removed[page_num])
+                        ])
+        pdf.save(output_path)
+
+
+def replace_text_in_pdf(pdf_path, replacements_json, output_path, workers=None):
+    """Replace text in PDF using redaction and overlay, one redaction pass per page"""
     try:
         replacements = json.loads(replacements_json)
-        doc = fitz.open(pdf_path)
-        
-        for replacement in replacements:
-            page_num = replacement["page"] - 1
-            old_text = replacement["old_text"]
-            new_text = replacement["new_text"]
-            bbox = replacement["bbox"]
-            
-            if 0 <= page_num < len(doc):
-                page = doc[page_num]
-                
-                # Create redaction annotation to hide old text
-                redact_annot = page.add_redact_annot(bbox)
-                page.apply_redactions()
-                
-                # Add new text at the same position
-                page.insert_text(
-                    (bbox[0], bbox[1] + bbox[3] - bbox[1]),  # Position text
-                    new_text,
-                    fontsize=replacement.get("size", 12),
-                    color=replacement.get("color", (0, 0, 0))
-                )
-        
-        doc.save(output_path)
-        doc.close()
-        return {"success": True, "message": "Text replaced successfully"}
+        with fitz.open(pdf_path) as doc:
+            by_page = _group_by_page(replacements, len(doc))
+            parallel = len(by_page) >= PARALLEL_MIN_PAGES and workers != 1
+            if not parallel:
+                fonts = {}
+                for page_num, page_replacements in sorted(by_page.items()):
+                    _apply_page_replacements(doc[page_num], page_replacements, fonts)
+                doc.save(output_path, garbage=1)
+        if parallel:
+            _replace_in_parallel(pdf_path, by_page, output_path, workers)
+        return {"success": True, "message": f"Replaced text on {len(by_page)} page(s)."}
     except Exception as e:
         return {"success": False, "message": f"Error replacing text: {e}"}
 
+def _base14_font(font, flags):
+    """Pick the closest built-in font for a span, from its flags and font name."""
+    name = font.lower()
+    bold = bool(flags & fitz.TEXT_FONT_BOLD) or "bold" in name or "black" in name
+    italic = bool(flags & fitz.TEXT_FONT_ITALIC) or "italic" in name or "oblique" in name
+    if flags & fitz.TEXT_FONT_MONOSPACED or "courier" in name or "mono" in name:
+        family = ("cour", "cobo", "coit", "cobi")
+    elif flags & fitz.TEXT_FONT_SERIFED or "times" in name or ("serif" in name and "sans" not in name):
+        family = ("tiro", "tibo", "tiit", "tibi")
+    else:
+        family = ("helv", "hebo", "heit", "hebi")
+    return family[bold + 2 * italic]
+
+
+def _find_matches(page, pattern, replacement, is_regex):
+    """Build replace_text_in_pdf-style entries for every match inside a single span."""
+    found = []
+    for block in page.get_text("rawdict")["blocks"]:
+        for line in block.get("lines", []):
+            for span in line["spans"]:
+                chars = span["chars"]
+                text = "".join(c["c"] for c in chars)
+                for match in pattern.finditer(text):
+                    if match.end() == match.start():
+                        continue
+                    matched = chars[match.start():match.end()]
+                    bbox = fitz.Rect(matched[0]["bbox"])
+                    for c in matched[1:]:
+                        bbox |= c["bbox"]
+                    found.append({
+                        "page": page.number + 1,
+                        "old_text": match.group(0),
+                        "new_text": match.expand(replacement) if is_regex else replacement,
+                        "bbox": list(bbox),
+                        "origin": matched[0]["origin"],
+                        "fontname": _base14_font(span["font"], span["flags"]),
+                        "size": span["size"],
+                        "color": span["color"],
+                    })
+    return found
+
+
+def _find_replace_file(pdf_path, pattern, replacement, is_regex, output_path):
+    """Worker: find and replace in one file. Matches are applied per page in one redaction pass."""
+    try:
+        fonts = {}
+        matches = 0
+        with fitz.open(pdf_path) as doc:
+            for page in doc:
+                found = _find_matches(page, pattern, replacement, is_regex)
+                if found:
+                    _apply_page_replacements(page, found, fonts)
+                    matches += len(found)
+            if matches:
+                doc.save(output_path, garbage=1)
+        return {"file": pdf_path, "output": output_path if matches else None, "matches": matches}
+    except Exception as e:
+        return {"file": pdf_path, "output": None, "matches": 0, "error": str(e)}
+
+
+def _output_paths(files, output_dir):
+    """An output path in `output_dir` per file, numbered when names repeat ("a.pdf", "a (2).pdf")."""
+    taken = set()
+    outputs = []
+    for path in files:
+        stem, ext = os.path.splitext(os.path.basename(path))
+        candidate, number = stem + ext, 1
+        while os.path.normcase(candidate) in taken:
+            number += 1
+            candidate = f"{stem} ({number}){ext}"
+        taken.add(os.path.normcase(candidate))
+        outputs.append(os.path.join(output_dir, candidate))
+    return outputs
+
+
+def find_and_replace(options_json):
+    """Find text by literal or regex pattern across many PDFs and replace it in a matching font.
+
+    Matches are looked for within single text spans. Files without matches are
+    not written. Each file's match count is reported. Files with the same name
+    get numbered outputs; an output folder where an output would replace one
+    of the inputs is refused.
+    """
+    try:
+        options = json.loads(options_json)
+        files = options.get("files", [])
+        find = options.get("find", "")
+        output_dir = options.get("outputDir")
+        if not files or not find or not output_dir:
+            return {"success": False, "message": "Files, search text and output folder are required."}
+        is_regex = bool(options.get("regex", False))
+        flags = 0 if options.get("matchCase", True) else re.IGNORECASE
+        pattern = re.compile(find if is_regex else re.escape(find), flags)
+        replacement = options.get("replace", "")
+        outputs = _output_paths(files, output_dir)
+        inputs = {os.path.normcase(os.path.realpath(path)) for path in files}
+        clashes = [path for path in outputs if os.path.normcase(os.path.realpath(path)) in inputs]
+        if clashes:
+            return {"success": False, "message": f"The output folder contains the input file "
+                                                  f"{os.path.basename(clashes[0])}; choose another folder."}
+        os.makedirs(output_dir, exist_ok=True)
+
+        with ProcessPoolExecutor(max_workers=options.get("workers")) as pool:
+            futures = [
+                pool.submit(_find_replace_file, path, pattern, replacement, is_regex, output_path)
+                for path, output_path in zip(files, outputs)
+            ]
+            results = [future.result() for future in futures]
+
+        total = sum(r["matches"] for r in results)
+        changed = sum(1 for r in results if r["matches"])
+        return {
+            "success": True,
+            "message": f"Replaced {total} match(es) in {changed} of {len(files)} file(s).",
+            "files": results,
+        }
+    except re.error as e:
+        return {"success": False, "message": f"Invalid search pattern: {e}"}
+    except Exception as e:
+        return {"success": False, "message": f"Error in find and replace: {e}"}
+
 if __name__ == "__main__":
     if len(sys.argv) < 3:
         print(json.dumps({"success": False, "message": "Insufficient arguments"}))
     elif sys.argv[1] == "extract":
-        result = extract_text_with_positions(sys.argv[2])
+        # Optional: page number (1-based) and region "x0,y0,x1,y1"
+        page = int(sys.argv[3]) if len(sys.argv) > 3 and sys.argv[3] else None
+        region = [float(v) for v in sys.argv[4].split(',')] if len(sys.argv) > 4 else None
+        result = extract_text_with_positions(sys.argv[2], page, region)
         print(json.dumps(result))
     elif sys.argv[1] == "replace":
         result = replace_text_in_pdf(sys.argv[2], sys.argv[3], sys.argv[4])
         print(json.dumps(result))
+    elif sys.argv[1] == "findreplace":
+        result = find_and_replace(sys.argv[2])
+        print(json.dumps(result))
     else:
         print(json.dumps({"success": False, "message": "Invalid operation"}))
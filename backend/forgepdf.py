@@ -0,0 +1,405 @@
+"""Command-line entry point for running ForgePDF operations without the app.
+
+    python forgepdf.py batch jobs.jsonl [--results jobs.results.jsonl] [--workers N]
+    python forgepdf.py watch in/ out/ [--steps compress,watermark,protect] ...  (see watch.py)
+    python forgepdf.py queue add|run|status|retry ...  (durable job queue, see jobqueue.py)
+
+Each line of the manifest is one job naming an operation and its options:
+
+    {"id": "inv-1", "op": "compress", "input": "in/a.pdf", "output": "out/a.pdf"}
+    {"op": "merge", "inputs": ["a.pdf", "b.pdf"], "output": "ab.pdf"}
+    {"op": "split", "input": "a.pdf", "pages": [1, 3, 5], "output": "odd.pdf"}
+    {"op": "protect", "input": "a.pdf", "password": "s3cret", "output": "locked.pdf"}
+    {"op": "watermark", "input": "a.pdf", "options": {"text": "DRAFT"}, "output": "draft.pdf"}
+    {"op": "rotate", "input": "a.pdf", "rotations": {"1": 90}, "output": "rotated.pdf"}
+    {"op": "organize", "input": "a.pdf", "order": [3, 1, 2], "delete": [2], "output": "reordered.pdf"}
+    {"op": "convert", "images": "scans/", "output": "scans.pdf"}
+    {"op": "convert", "input": "a.pdf", "outputDir": "pages/"}
+    {"op": "preview", "input": "a.pdf", "page": 1, "outputDir": "previews/"}  (no page: all thumbnails)
+    {"op": "analyze", "input": "scans.pdf", "output": "clean.pdf"}  (drops blank and duplicate pages)
+    {"op": "analyze", "inputs": ["a.pdf", "b.pdf"]}  (only reports them, duplicates across files too)
+    {"op": "compare", "inputs": ["a.pdf", "out/a.pdf"], "outputDir": "diffs/", "options": {"dpi": 100}}
+
+Relative paths are resolved against the manifest's folder. Jobs without
+an "id" are identified by their line number, so don't reorder a
+manifest between a run and its resume.
+
+Every finished job is appended to the results file as one JSON line. This
+file is also the checkpoint: running the same command again skips jobs
+that already have a result, so an interrupted run resumes where it
+stopped. Pass --retry-failed to run failed jobs again. A job that kills
+its process (a crash in native code, an OOM kill) is recorded as failed
+and the batch carries on.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import signal
+import logging
+import itertools
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import compare
+import compress
+import image_to_pdf
+import jobqueue
+import limits
+import merge
+import metrics
+import organize_pdf
+import page_analysis
+import pdf_to_image
+import preview
+import progress
+import protect
+import rotate
+import sessions
+import split
+import watch
+import watermark
+
+# Results are flushed after every job but fsynced at most this often
+FSYNC_INTERVAL = 1.0
+
+
+def _pages(value):
+    return ",".join(str(p) for p in value) if isinstance(value, list) else str(value)
+
+
+def _convert(job):
+    if "images" in job:
+        images = job["images"]
+        spec = ",".join(images) if isinstance(images, list) else images
+        return image_to_pdf.image_to_pdf(spec, job["output"])
+    return pdf_to_image.pdf_to_image(job["input"], job["outputDir"])
+
+
+def _compare(job):
+    result = compare.compare_pdfs(job["inputs"][0], job["inputs"][1], job.get("outputDir"),
+                                  json.dumps(job.get("options", {})))
+    # In a batch, a comparison is a check: visible changes fail the job
+    return {**result, "success": result["success"] and result.get("passed", False)}
+
+
+def _analyze(job):
+    options = json.dumps(job.get("options", {}))
+    if job.get("output"):
+        return page_analysis.clean_pdf(job["input"], job["output"], options)
+    return page_analysis.analyze_pages(",".join(job.get("inputs") or [job["input"]]), options)
+
+
+# Operation name -> handler taking the job object
+OPERATIONS = {
+    "analyze": _analyze,
+    "compare": _compare,
+    "compress": lambda job: compress.compress_pdf(job["input"], job["output"]),
+    "convert": _convert,
+    "merge": lambda job: merge.merge_pdfs(",".join(job["inputs"]), job["output"]),
+    "organize": lambda job: organize_pdf.organize_pdf(
+        job["input"], _pages(job["order"]), _pages(job.get("delete", [])), job["output"]),
+    "preview": lambda job: preview.get_preview(
+        job["input"], str(job["page"] - 1) if "page" in job else "-1", job["outputDir"]),
+    "protect": lambda job: protect.protect_pdf(job["input"], job["output"], job["password"]),
+    "rotate": lambda job: rotate.rotate_pdf(job["input"], json.dumps(job["rotations"]), job["output"]),
+    "split": lambda job: split.split_pdf(job["input"], _pages(job["pages"]), job["output"]),
+    "watermark": lambda job: watermark.add_watermark(job["input"], job["output"], json.dumps(job.get("options", {}))),
+}
+
+_PATH_FIELDS = ("input", "output", "outputDir", "images", "inputs")
+
+
+def _resolve_paths(job, base):
+    def resolve(path):
+        # "@manifest" image inputs keep their prefix; comma-joined lists resolve per entry
+        if "," in path:
+            return ",".join(resolve(part) for part in path.split(","))
+        prefix = "@" if path.startswith("@") else ""
+        path = path[len(prefix):]
+        return prefix + (path if os.path.isabs(path) else os.path.join(base, path))
+
+    for field in _PATH_FIELDS:
+        value = job.get(field)
+        if isinstance(value, str):
+            job[field] = resolve(value)
+        elif isinstance(value, list):
+            job[field] = [resolve(v) for v in value]
+    return job
+
+
+def init_worker():
+    # Each batch job reads its inputs once; keeping documents open only costs memory
+    sessions.CACHE_LIMIT_BYTES = 0
+    limits.limit_address_space()
+
+
+def run_job(job, details=False):
+    """Run one manifest job in a pool process and return its result line.
+
+    With `details`, the line also carries everything else the operation
+    returned (the pages of a comparison, the pages found by analyze).
+    """
+    start = time.perf_counter()
+    handler = OPERATIONS.get(job.get("op"))
+    try:
+        if handler is None:
+            result = {"success": False, "message": f"Unknown operation: {job.get('op')}"}
+        else:
+            for field in ("output", "outputDir"):
+                if job.get(field):
+                    os.makedirs(os.path.dirname(job[field]) if field == "output" else job[field], exist_ok=True)
+            task = progress.Job(lambda event: None)
+            with limits.enforce(task):
+                result = progress.run(task, handler, job)
+    except limits.LimitExceeded as e:
+        result = limits.result(e)
+    except KeyError as e:
+        result = {"success": False, "message": f"Missing job field: {e.args[0]}"}
+    except Exception as e:
+        result = {"success": False, "message": f"An unexpected error occurred: {e}"}
+    line = {
+        "id": job["id"],
+        "op": job.get("op"),
+        "success": bool(result.get("success")),
+        "message": result.get("message"),
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+    if result.get("limit"):
+        line["limit"] = result["limit"]
+    return {**result, **line} if details else line
+
+
+def _read_checkpoint(results_path, retry_failed):
+    """Ids already finished according to the results file, which is made safe to append to."""
+    done = set()
+    if not os.path.exists(results_path):
+        return done
+    with open(results_path, "rb+") as f:
+        data = f.read()
+        # A crash can leave half a line at the end; drop it before appending
+        complete = data.rfind(b"\n") + 1
+        if complete < len(data):
+            f.truncate(complete)
+    for line in data[:complete].splitlines():
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            continue
+        if entry.get("success") or not retry_failed:
+            done.add(entry["id"])
+        else:
+            done.discard(entry["id"])
+    return done
+
+
+def _iter_jobs(manifest_path, done, skipped, errors):
+    """Yield unfinished jobs from the manifest, streaming it line by line."""
+    base = os.path.dirname(os.path.abspath(manifest_path))
+    with open(manifest_path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                job = json.loads(line)
+            except ValueError as e:
+                if f"line-{line_number}" in done:
+                    skipped[0] += 1
+                    continue
+                errors.append({"id": f"line-{line_number}", "op": None, "success": False,
+                               "message": f"Invalid JSON on line {line_number}: {e}", "seconds": 0})
+                continue
+            job["id"] = str(job.get("id", f"line-{line_number}"))
+            if job["id"] in done:
+                skipped[0] += 1
+                continue
+            yield _resolve_paths(job, base)
+
+
+def _crashed(job):
+    return {"id": job["id"], "op": job.get("op"), "success": False,
+            "message": "The process running this job died (a crash or an out-of-memory kill).", "seconds": 0}
+
+
+def _run_alone(job):
+    """Run `job` in a pool of its own, so if its process dies no other job goes with it."""
+    with ProcessPoolExecutor(max_workers=1, initializer=init_worker) as pool:
+        try:
+            return pool.submit(run_job, job).result()
+        except BrokenProcessPool:
+            return _crashed(job)
+
+
+def run_batch(manifest_path, results_path=None, workers=None, retry_failed=False):
+    results_path = results_path or os.path.splitext(manifest_path)[0] + ".results.jsonl"
+    done = _read_checkpoint(results_path, retry_failed)
+    skipped, errors = [0], []
+    jobs = _iter_jobs(manifest_path, done, skipped, errors)
+    counts = {"succeeded": 0, "failed": 0}
+    window = max(2, (workers or os.cpu_count() or 1) * 4)
+    last_sync = time.monotonic()
+
+    progress.phase("run")
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=init_worker)
+    with open(results_path, "a", encoding="utf-8") as results:
+
+        def record(entry):
+            nonlocal last_sync
+            results.write(json.dumps(entry) + "\n")
+            results.flush()
+            if time.monotonic() - last_sync >= FSYNC_INTERVAL:
+                os.fsync(results.fileno())
+                last_sync = time.monotonic()
+            counts["succeeded" if entry["success"] else "failed"] += 1
+            metrics.observe_result(entry.get("op") or "invalid", entry)
+            progress.advance(counts["succeeded"] + counts["failed"], unit="job")
+
+        def collect(futures):
+            """Record finished jobs; returns the jobs lost with a broken pool."""
+            lost = []
+            for future in futures:
+                job = pending.pop(future)
+                try:
+                    record(future.result())
+                except BrokenProcessPool:
+                    lost.append(job)
+            return lost
+
+        pending = {pool.submit(run_job, job): job for job in itertools.islice(jobs, window)}
+        try:
+            while pending:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                lost = collect(finished)
+                if lost:
+                    # A pool process died (a crash in native code, an OOM kill) and took every
+                    # job in flight with it. Which one killed it is unknown, so they are run again
+                    # one at a time: only the job that dies alone is recorded as failed.
+                    lost += collect(list(pending))
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    for job in lost:
+                        record(_run_alone(job))
+                        progress.check_cancelled()
+                    pool = ProcessPoolExecutor(max_workers=workers, initializer=init_worker)
+                while errors:
+                    record(errors.pop())
+                pending.update({pool.submit(run_job, job): job
+                                for job in itertools.islice(jobs, window - len(pending))})
+                progress.check_cancelled()
+            while errors:
+                record(errors.pop())
+        except BaseException:
+            # Finished jobs are already checkpointed; queued ones run on the next attempt
+            for future in pending:
+                future.cancel()
+            raise
+        finally:
+            pool.shutdown(wait=True)
+            results.flush()
+            os.fsync(results.fileno())
+
+    total = counts["succeeded"] + counts["failed"]
+    return {
+        "success": counts["failed"] == 0,
+        "message": f"Ran {total} job(s): {counts['succeeded']} succeeded, {counts['failed']} failed, "
+                   f"{skipped[0]} already done.",
+        "results": results_path,
+        **counts,
+        "skipped": skipped[0],
+    }
+
+
+def run_queue(args):
+    if args.action == "add":
+        if not args.manifest:
+            return {"success": False, "message": "queue add needs a manifest."}
+        skipped, errors = [0], []
+        # Keyed by manifest and job id, so adding the same manifest twice enqueues nothing new
+        prefix = os.path.abspath(args.manifest)
+        jobs = ((job, f"{prefix}:{job['id']}") for job in _iter_jobs(args.manifest, set(), skipped, errors))
+        queue = jobqueue.JobQueue(args.db)
+        try:
+            added = queue.enqueue_many(jobs)
+        finally:
+            queue.close()
+        return {"success": not errors, "message": f"Queued {added} new job(s).", "added": added,
+                "errors": errors}
+    if args.action == "run":
+        counts = jobqueue.run(args.db, args.workers, stop_when_empty=not args.forever)
+        return {"success": True, "message": f"Finished {counts['done']} job(s), {counts['retried']} to retry, "
+                                            f"{counts['quarantined']} quarantined.", **counts}
+    queue = jobqueue.JobQueue(args.db)
+    try:
+        if args.action == "retry":
+            retried = queue.retry_quarantined()
+            return {"success": True, "message": f"Requeued {retried} quarantined job(s).", "requeued": retried}
+        return {"success": True, "message": "Queue status", "counts": queue.counts()}
+    finally:
+        queue.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="forgepdf", description="Run ForgePDF operations from the command line.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    batch = commands.add_parser("batch", help="run the jobs in a JSONL manifest in parallel, resuming if interrupted")
+    batch.add_argument("manifest")
+    batch.add_argument("--results", help="results JSONL, also used to resume (default: <manifest>.results.jsonl)")
+    batch.add_argument("--workers", type=int, help="worker processes (default: one per CPU)")
+    batch.add_argument("--retry-failed", action="store_true", help="run jobs that failed last time again")
+
+    watcher = commands.add_parser("watch", help="process PDFs dropped into a folder until interrupted")
+    watcher.add_argument("input_dir")
+    watcher.add_argument("output_dir")
+    watcher.add_argument("--steps", default="compress", help=f"comma-separated, from: {', '.join(watch.STEPS)}")
+    watcher.add_argument("--password", help="password for the protect step")
+    watcher.add_argument("--watermark", default="{}", help='watermark options as JSON, e.g. \'{"text": "DRAFT"}\'')
+    watcher.add_argument("--workers", type=int, help="worker processes (default: one per CPU)")
+    watcher.add_argument("--settle", type=float, default=2.0, help="seconds a file must stay unchanged (default 2)")
+    watcher.add_argument("--poll", action="store_true", help="poll the folder instead of using inotify")
+
+    queue = commands.add_parser("queue", help="durable job queue with retries, for very large batches")
+    queue.add_argument("action", choices=("add", "run", "status", "retry"))
+    queue.add_argument("manifest", nargs="?", help="JSONL manifest to enqueue (add)")
+    queue.add_argument("--db", help="queue database (default: in the ForgePDF cache folder)")
+    queue.add_argument("--workers", type=int, help="worker processes (default: one per CPU)")
+    queue.add_argument("--forever", action="store_true", help="keep waiting for new jobs when the queue is empty")
+
+    args = parser.parse_args(argv)
+    if args.command != "queue" or args.action == "run":
+        metrics.start(lane=args.command)
+    if args.command == "queue":
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        try:
+            result = run_queue(args)
+        except KeyboardInterrupt:
+            result = {"success": False, "message": "Interrupted; running jobs go back to the queue when their lease expires."}
+        except Exception as e:
+            result = {"success": False, "message": f"An unexpected error occurred: {e}"}
+        print(json.dumps(result))
+        return 0 if result["success"] else 1
+    if args.command == "watch":
+        logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+        # Service managers stop with SIGTERM; shut down as cleanly as on Ctrl+C
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        try:
+            watch.watch(args.input_dir, args.output_dir, args.steps.split(","),
+                        {"password": args.password, "watermark": json.loads(args.watermark)},
+                        workers=args.workers, settle=args.settle, poll=args.poll)
+        except ValueError as e:
+            print(json.dumps({"success": False, "message": str(e)}))
+            return 1
+        return 0
+    try:
+        result = run_batch(args.manifest, args.results, args.workers, args.retry_failed)
+    except KeyboardInterrupt:
+        result = {"success": False, "message": "Interrupted; run the same command again to resume."}
+    except Exception as e:
+        result = {"success": False, "message": f"An unexpected error occurred: {e}"}
+    print(json.dumps(result))
+    return 0 if result["success"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
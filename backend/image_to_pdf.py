@@ -1,41 +1,609 @@
 # image_to_pdf.py (FIXED)
 import sys
 import os
+import re
 import json
+import glob
+import zlib
+import struct
+import itertools
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
 import fitz
+import numpy as np
+
+import progress
+
+DEFAULT_DPI = 96  # MuPDF's assumption when an image carries no resolution
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.tif', '.tiff')
+COPY_CHUNK = 1 << 20
+# ICC profile colour space signatures, by the number of components they describe
+ICC_SPACES = {1: b"GRAY", 3: b"RGB ", 4: b"CMYK"}
+# TIFF field types read from IFD entries -> (struct format, size in bytes)
+TIFF_TYPES = {1: ("B", 1), 3: ("H", 2), 4: ("I", 4), 5: ("II", 8), 7: ("B", 1)}
+
+# Image space (the unit square) to page space for each EXIF orientation, given the page size
+_ORIENTATION_MATRICES = {
+    1: lambda w, h: (w, 0, 0, h, 0, 0),
+    2: lambda w, h: (-w, 0, 0, h, w, 0),   # Mirrored left to right
+    3: lambda w, h: (-w, 0, 0, -h, w, h),  # Upside down
+    4: lambda w, h: (w, 0, 0, -h, 0, h),   # Mirrored top to bottom
+    5: lambda w, h: (0, -h, -w, 0, w, h),  # Transposed
+    6: lambda w, h: (0, -h, w, 0, 0, h),   # Shown turned 90 degrees clockwise
+    7: lambda w, h: (0, h, w, 0, 0, 0),    # Transversed
+    8: lambda w, h: (0, h, -w, 0, w, 0),   # Shown turned 90 degrees anticlockwise
+}
+
+
+# --- Input resolution ---
+
+def _natural_key(path):
+    """Sort key that orders scan_2 before scan_10."""
+    return [int(part) if part.isdigit() else part for part in re.split(r"(\d+)", os.path.basename(path).lower())]
+
+
+def resolve_inputs(spec):
+    """Expand an input spec into an ordered list of image paths.
 
-def image_to_pdf(image_paths_str, output_path):
+    Accepts "@manifest.txt" (one path per line, relative to the manifest),
+    a directory or a glob pattern (both naturally sorted), or the original
+    comma-joined list of paths.
+    """
+    if spec.startswith("@"):
+        manifest = spec[1:]
+        base = os.path.dirname(os.path.abspath(manifest))
+        with open(manifest, encoding="utf-8") as f:
+            lines = (line.strip() for line in f)
+            return [os.path.join(base, line) for line in lines if line and not line.startswith("#")]
+    if os.path.isdir(spec):
+        names = [os.path.join(spec, n) for n in os.listdir(spec) if n.lower().endswith(IMAGE_EXTENSIONS)]
+        return sorted(names, key=_natural_key)
+    if any(c in spec for c in "*?["):
+        return sorted(glob.glob(spec), key=_natural_key)
+    return spec.split(',')
+
+
+# --- Header probing ---
+
+def _exif_orientation(tiff):
+    """The Orientation tag (1-8) of EXIF data in TIFF layout, 1 when it is missing or unreadable."""
+    order = {b"II": "<", b"MM": ">"}.get(tiff[:2])
     try:
-        image_paths = image_paths_str.split(',')
-        if not image_paths or not all(os.path.exists(p) for p in image_paths):
-            return {"success": False, "message": "One or more image paths are invalid or missing."}
+        offset = struct.unpack(order + "I", tiff[4:8])[0]
+        count = struct.unpack(order + "H", tiff[offset:offset + 2])[0]
+        for entry in range(offset + 2, offset + 2 + 12 * count, 12):
+            tag, kind = struct.unpack(order + "HH", tiff[entry:entry + 4])
+            if tag == 0x0112 and kind == 3:
+                orientation = struct.unpack(order + "H", tiff[entry + 8:entry + 10])[0]
+                return orientation if orientation in _ORIENTATION_MATRICES else 1
+    except (TypeError, struct.error):
+        pass
+    return 1
+
+
+def _jpeg_info(f):
+    """Read size, components and resolution from JPEG markers without decoding.
+
+    Returns None when the markers are truncated or malformed.
+    """
+    info = {"dpi": (DEFAULT_DPI, DEFAULT_DPI), "adobe": False, "orientation": 1, "icc": None}
+    icc_chunks = {}
+    if f.read(2) != b"\xff\xd8":
+        return None
+    while True:
+        head = f.read(2)
+        if len(head) < 2 or head[0] != 0xFF:
+            return None
+        marker = head[1]
+        if marker == 0xFF:  # Fill byte
+            f.seek(-1, os.SEEK_CUR)
+            continue
+        raw = f.read(2)
+        if len(raw) < 2:
+            return None
+        length = struct.unpack(">H", raw)[0]
+        if length < 2:
+            return None
+        if marker in (0xE0, 0xE1, 0xE2, 0xEE) or (0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC)):
+            segment = f.read(length - 2)
+            if len(segment) < length - 2:
+                return None  # Truncated
+        else:
+            f.seek(length - 2, os.SEEK_CUR)
+            continue
+        if marker == 0xE0 and segment[:5] == b"JFIF\x00" and len(segment) >= 12:
+            units, xd, yd = segment[7], *struct.unpack(">HH", segment[8:12])
+            if units in (1, 2) and xd and yd:
+                scale = 2.54 if units == 2 else 1  # dots per cm -> dpi
+                info["dpi"] = (xd * scale, yd * scale)
+        elif marker == 0xE1 and segment[:6] == b"Exif\x00\x00":
+            info["orientation"] = _exif_orientation(segment[6:])
+        elif marker == 0xE2 and segment[:12] == b"ICC_PROFILE\x00":
+            # A profile too big for one segment is split over several, numbered from 1
+            icc_chunks[segment[12]] = segment[14:]
+        elif marker == 0xEE and segment[:5] == b"Adobe":
+            info["adobe"] = True
+        elif 0xC0 <= marker <= 0xCF:
+            if len(segment) < 6:
+                return None
+            precision, height, width, components = struct.unpack(">BHHB", segment[:6])
+            # PDF only carries 8-bit DCT data
+            info.update(width=width, height=height, components=components, copyable=precision == 8)
+            if icc_chunks:
+                info["icc"] = b"".join(chunk for _, chunk in sorted(icc_chunks.items()))
+            return info
+
+
+def _png_info(f):
+    """Read the PNG header chunks and locate the IDAT data without reading it.
+
+    "copyable" is False for PNGs whose data cannot be stored as-is in a PDF
+    (interlaced, alpha channel or transparency key). Returns None when the
+    chunks are truncated or malformed.
+    """
+    if f.read(8) != PNG_SIGNATURE:
+        return None
+    info = {"dpi": (DEFAULT_DPI, DEFAULT_DPI), "palette": None, "segments": [], "orientation": 1, "icc": None}
+    while True:
+        head = f.read(8)
+        if len(head) < 8:
+            break
+        length, kind = struct.unpack(">I4s", head)
+        if kind == b"IDAT":
+            info["segments"].append((f.tell(), length))
+            f.seek(length + 4, os.SEEK_CUR)
+            continue
+        if kind == b"IEND":
+            break
+        chunk = f.read(length)
+        if len(chunk) < length:
+            return None
+        f.seek(4, os.SEEK_CUR)  # CRC
+        if kind == b"IHDR":
+            if length < 13:
+                return None
+            width, height, depth, color_type, _, _, interlace = struct.unpack(">IIBBBBB", chunk[:13])
+            info.update(width=width, height=height, depth=depth, color_type=color_type,
+                        copyable=not interlace and color_type in (0, 2, 3))
+        elif kind == b"PLTE":
+            info["palette"] = chunk
+        elif kind == b"tRNS":
+            info["copyable"] = False
+        elif kind == b"pHYs":
+            ppu_x, ppu_y, unit = struct.unpack(">IIB", chunk)
+            if unit == 1 and ppu_x and ppu_y:  # Pixels per metre
+                info["dpi"] = (round(ppu_x * 0.0254), round(ppu_y * 0.0254))
+        elif kind == b"iCCP":
+            # Profile name, a zero byte, the compression method (always zlib), the profile
+            name_end = chunk.find(b"\x00")
+            try:
+                info["icc"] = zlib.decompress(chunk[name_end + 2:])
+            except zlib.error:
+                pass
+        elif kind == b"eXIf":
+            info["orientation"] = _exif_orientation(chunk)
+    if "width" not in info or not info["segments"]:
+        return None
+    return info
+
+
+def _read_ifd(f, order):
+    """Read the TIFF IFD at the file position: ({tag: values}, next IFD offset).
+
+    Numeric values become tuples (rationals as floats). Byte and undefined
+    values are kept as (file offset, count), so their data can be copied
+    without reading it.
+    """
+    count = struct.unpack(order + "H", f.read(2))[0]
+    entries = []
+    for _ in range(count):
+        position = f.tell()
+        tag, kind, n, value = struct.unpack(order + "HHI4s", f.read(12))
+        if kind in TIFF_TYPES:
+            size = TIFF_TYPES[kind][1] * n
+            entries.append((tag, kind, n, position + 8 if size <= 4 else struct.unpack(order + "I", value)[0]))
+    next_offset = struct.unpack(order + "I", f.read(4))[0]
+
+    tags = {}
+    for tag, kind, n, where in entries:
+        if kind in (1, 7):
+            tags[tag] = (where, n)
+            continue
+        fmt, size = TIFF_TYPES[kind]
+        f.seek(where)
+        values = struct.unpack(order + fmt * n, f.read(size * n))
+        if kind == 5:
+            values = tuple(num / den if den else 0 for num, den in zip(values[::2], values[1::2]))
+        tags[tag] = values
+    return tags, next_offset
+
+
+def _tiff_frames(path):
+    """Describe every frame of a TIFF by walking its IFDs, without decoding any image data."""
+    frames = []
+    with open(path, "rb") as f:
+        order = {b"II": "<", b"MM": ">"}.get(f.read(2))
+        if order is None or struct.unpack(order + "H", f.read(2))[0] != 42:
+            raise ValueError(f"'{os.path.basename(path)}' is not a valid TIFF file.")
+        offset = struct.unpack(order + "I", f.read(4))[0]
+        while offset:
+            f.seek(offset)
+            tags, offset = _read_ifd(f, order)
+
+            def value(tag, default):
+                return tags[tag][0] if tag in tags else default
+
+            photometric = value(262, 2)
+            samples = value(277, 1)
+            if photometric == 5:
+                colorspace = "cmyk"
+            elif photometric in (0, 1) and samples <= 2:
+                colorspace = "gray"
+            else:
+                colorspace = "rgb"
+            unit = {2: 1, 3: 2.54}.get(value(296, 2))  # Resolution per inch or per centimetre
+            xres, yres = value(282, 0), value(283, 0)
+            orientation = value(274, 1)
+            frames.append({
+                "index": len(frames),
+                "width": value(256, 0),
+                "height": value(257, 0),
+                "colorspace": colorspace,
+                "bits": value(258, 1),
+                "samples": samples,
+                "photometric": photometric,
+                "compression": value(259, 1),
+                "fill_order": value(266, 1),
+                "planar": value(284, 1),
+                "strips": list(zip(tags.get(273, ()), tags.get(279, ()))),
+                "jpeg_tables": tags.get(347),
+                "dpi": (xres * unit, yres * unit) if unit and xres and yres else (DEFAULT_DPI, DEFAULT_DPI),
+                "orientation": orientation if orientation in _ORIENTATION_MATRICES else 1,
+            })
+    return frames
+
+
+def _image_orientation(path):
+    """The EXIF orientation of a JPEG or PNG, 1 for other or unreadable files."""
+    with open(path, "rb") as f:
+        probe = _jpeg_info if f.read(2) == b"\xff\xd8" else _png_info
+        f.seek(0)
+        info = probe(f)
+    return info["orientation"] if info else 1
+
+
+# --- Page image preparation (runs in worker processes) ---
+
+def _passthrough_image(path):
+    """Describe an image whose original compressed data can be copied into the PDF as-is.
+
+    JPEGs keep their DCT stream byte-for-byte. Plain PNGs keep their zlib
+    data, which PDF reads with the PNG predictors. An embedded ICC profile
+    becomes the image's colour space, and the EXIF orientation is applied
+    when the image is placed on its page.
+    """
+    with open(path, "rb") as f:
+        magic = f.read(2)
+        f.seek(0)
+        if magic == b"\xff\xd8":
+            info = _jpeg_info(f)
+            if info is None or not info["copyable"] or info["components"] not in (1, 3, 4):
+                return None
+            colors = info["components"]
+            colorspace = {1: "/DeviceGray", 3: "/DeviceRGB", 4: "/DeviceCMYK"}[colors]
+            palette = None
+            extra = " /Filter /DCTDecode"
+            if info["components"] == 4 and info["adobe"]:
+                extra += " /Decode [1 0 1 0 1 0 1 0]"  # Adobe-written CMYK JPEGs store inverted values
+            segments = [(0, os.fstat(f.fileno()).st_size)]
+            depth = 8
+        else:
+            info = _png_info(f)
+            if info is None or not info["copyable"]:
+                return None
+            palette = info["palette"] if info["color_type"] == 3 else None
+            if info["color_type"] == 3 and not palette:
+                return None
+            # Of the palette entries for indexed images; their samples are single indexes
+            colors = 3 if info["color_type"] in (2, 3) else 1
+            colorspace = "/DeviceRGB" if colors == 3 else "/DeviceGray"
+            depth = info["depth"]
+            extra = (f" /Filter /FlateDecode /DecodeParms << /Predictor 15 /Colors {1 if palette else colors}"
+                     f" /BitsPerComponent {depth} /Columns {info['width']} >>")
+            segments = info["segments"]
 
-        doc = fitz.open()
-        for image_path in image_paths:
-            if not image_path.lower().endswith(('.png', '.jpg', '.jpeg')):
-                continue
+    icc = info["icc"]
+    return {
+        "width": info["width"],
+        "height": info["height"],
+        "colorspace": colorspace,
+        # A profile for another colour space than the data's would be ignored by readers or break them
+        "icc": (colors, icc) if icc and icc[16:20] == ICC_SPACES[colors] else None,
+        "palette": palette,
+        "dict": f"/BitsPerComponent {depth}{extra}",
+        "source": path,
+        "segments": segments,
+        "page_size": _page_size(info["width"], info["height"], info["dpi"], info["orientation"]),
+        "orientation": info["orientation"],
+    }
+
+
+def _tiff_passthrough(path, frame):
+    """Describe a TIFF frame whose compressed strip can be copied into the PDF as-is.
+
+    A single-strip CCITT Group 4 frame becomes a CCITTFaxDecode image, and a
+    single-strip JPEG frame a DCTDecode image, with the frame's shared JPEG
+    tables spliced in front of its strip. Other frames return None.
+    """
+    if len(frame["strips"]) != 1 or frame["planar"] != 1:
+        return None
+    (offset, size), = frame["strips"]
+    width, height = frame["width"], frame["height"]
+    if frame["compression"] == 4 and frame["bits"] == 1 and frame["photometric"] in (0, 1) and frame["fill_order"] == 1:
+        colorspace = "/DeviceGray"
+        # Group 4 codes white runs as 0 bits; with BlackIsZero those pixels are black
+        decode = " /Decode [1 0]" if frame["photometric"] == 1 else ""
+        entries = (f"/BitsPerComponent 1 /Filter /CCITTFaxDecode"
+                   f" /DecodeParms << /K -1 /Columns {width} /Rows {height} >>{decode}")
+        segments = [(offset, size)]
+    elif frame["compression"] == 7 and frame["bits"] == 8 and frame["photometric"] in (1, 2, 6):
+        colorspace = "/DeviceGray" if frame["photometric"] == 1 else "/DeviceRGB"
+        # RGB strips are stored without the YCbCr transform DCTDecode applies by default
+        entries = "/BitsPerComponent 8 /Filter /DCTDecode"
+        if frame["photometric"] == 2:
+            entries += " /DecodeParms << /ColorTransform 0 >>"
+        segments = [(offset, size)]
+        if frame["jpeg_tables"]:
+            # The tables are a JPEG stream of their own: drop their EOI and the strip's SOI
+            tables_offset, tables_size = frame["jpeg_tables"]
+            segments = [(tables_offset, tables_size - 2), (offset + 2, size - 2)]
+    else:
+        return None
+    return {
+        "width": width,
+        "height": height,
+        "colorspace": colorspace,
+        "dict": entries,
+        "source": path,
+        "segments": segments,
+        "page_size": _page_size(width, height, frame["dpi"], frame["orientation"]),
+        "orientation": frame["orientation"],
+    }
+
+
+def _page_size(width, height, dpi, orientation):
+    """The page size in points for an image, turned on its side for orientations 5 to 8."""
+    xdpi, ydpi = dpi
+    page_size = (width * 72 / xdpi, height * 72 / ydpi)
+    return page_size[::-1] if orientation >= 5 else page_size
+
+
+def _pixmap_image(pix, page_size, orientation=1, bilevel=False):
+    """Flate-compress decoded pixmap samples, with any alpha as a soft mask.
+
+    A bilevel image keeps one bit per pixel instead of being stored as 8-bit gray.
+    """
+    smask = None
+    if pix.alpha:
+        alpha = fitz.Pixmap(None, pix)
+        smask = {
+            "width": alpha.width,
+            "height": alpha.height,
+            "colorspace": "/DeviceGray",
+            "dict": "/BitsPerComponent 8 /Filter /FlateDecode",
+            "stream": zlib.compress(alpha.samples_mv),
+        }
+        pix = fitz.Pixmap(pix, 0)
+    depth, samples = 8, pix.samples_mv
+    if bilevel and pix.n == 1:
+        gray = np.frombuffer(samples, dtype=np.uint8).reshape(pix.height, pix.stride)[:, :pix.width]
+        depth, samples = 1, np.packbits(gray >= 128, axis=1).tobytes()
+    return {
+        "width": pix.width,
+        "height": pix.height,
+        "colorspace": {1: "/DeviceGray", 3: "/DeviceRGB", 4: "/DeviceCMYK"}[pix.colorspace.n],
+        "dict": f"/BitsPerComponent {depth} /Filter /FlateDecode",
+        "stream": zlib.compress(samples),
+        "smask": smask,
+        "page_size": page_size,
+        "orientation": orientation,
+    }
+
+
+def _prepare_page(task):
+    """Worker: turn one input image (or TIFF frame) into a page image description."""
+    path, frame = task
+    if frame is None:
+        image = _passthrough_image(path)
+        if image is None:
+            # Formats PDF can't carry as-is are decoded and re-compressed; MuPDF ignores EXIF orientation
             try:
-                img = fitz.open(image_path)
-                rect = img[0].rect
-                pdf_bytes = img.convert_to_pdf()
-                img.close()
-                img_pdf = fitz.open("pdf", pdf_bytes)
-                page = doc.new_page(width=rect.width, height=rect.height)
-                page.show_pdf_page(rect, img_pdf, 0)
+                pix = fitz.Pixmap(path)
             except Exception as e:
-                return {"success": False, "message": f"Error processing image '{os.path.basename(image_path)}': {e}"}
-        
-        if len(doc) == 0:
+                # MuPDF's exceptions can't be pickled back to the parent process
+                raise ValueError(str(e) or "cannot decode the image") from None
+            orientation = _image_orientation(path)
+            dpi = (pix.xres or DEFAULT_DPI, pix.yres or DEFAULT_DPI)
+            image = _pixmap_image(pix, _page_size(pix.width, pix.height, dpi, orientation), orientation)
+        return image
+
+    image = _tiff_passthrough(path, frame)
+    if image is not None:
+        return image
+    width, height, orientation = frame["width"], frame["height"], frame["orientation"]
+    with fitz.open(path) as tiff:
+        page = tiff[frame["index"]]
+        rect = page.rect
+        cs = {"gray": fitz.csGRAY, "cmyk": fitz.csCMYK}.get(frame["colorspace"], fitz.csRGB)
+        # Render at exactly one device pixel per image pixel
+        pix = page.get_pixmap(matrix=fitz.Matrix(width / rect.width, height / rect.height), colorspace=cs)
+        return _pixmap_image(pix, _page_size(width, height, frame["dpi"], orientation), orientation,
+                             bilevel=frame["bits"] == 1 and frame["samples"] == 1)
+
+
+def _page_tasks(image_paths):
+    """Yield one task per output page, expanding multi-page TIFFs frame by frame."""
+    for path in image_paths:
+        lower = path.lower()
+        if not lower.endswith(IMAGE_EXTENSIONS):
+            continue
+        if lower.endswith(('.tif', '.tiff')):
+            for frame in _tiff_frames(path):
+                yield path, frame
+        else:
+            yield path, None
+
+
+def _prepared_pages(tasks, workers):
+    """Prepare pages in a process pool, in order, keeping only a small window in flight."""
+    window = max(2, (workers or os.cpu_count() or 1) * 2)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque((task, pool.submit(_prepare_page, task)) for task in itertools.islice(tasks, window))
+        while pending:
+            task, future = pending.popleft()
+            for next_task in itertools.islice(tasks, 1):
+                pending.append((next_task, pool.submit(_prepare_page, next_task)))
+            yield task, future
+
+
+# --- Output ---
+
+class _StreamingPdfWriter:
+    """Writes a PDF object by object, so only the current page is ever held in memory."""
+
+    def __init__(self, path):
+        self.file = open(path, "wb")
+        self.offsets = [None, None, None]  # Object 0 is unused; 1 = catalog, 2 = page tree
+        self.kids = []
+        self.profiles = {}  # ICC profile -> object number, so pages from one camera share it
+        self.file.write(b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n")
+
+    def _reserve(self):
+        self.offsets.append(None)
+        return len(self.offsets) - 1
+
+    def _begin(self, num):
+        self.offsets[num] = self.file.tell()
+        self.file.write(b"%d 0 obj\n" % num)
+
+    def _write_object(self, num, body):
+        self._begin(num)
+        self.file.write(body.encode("latin-1") + b"\nendobj\n")
+
+    def _write_stream(self, num, entries, data=None, source=None, segments=()):
+        length = len(data) if data is not None else sum(size for _, size in segments)
+        self._begin(num)
+        self.file.write(f"<< {entries} /Length {length} >>\nstream\n".encode("latin-1"))
+        if data is not None:
+            self.file.write(data)
+        else:
+            # Copy the image's compressed data straight from the source file
+            with open(source, "rb") as src:
+                for offset, size in segments:
+                    src.seek(offset)
+                    while size:
+                        chunk = src.read(min(size, COPY_CHUNK))
+                        if not chunk:
+                            raise ValueError(f"unexpected end of file in {os.path.basename(source)}")
+                        self.file.write(chunk)
+                        size -= len(chunk)
+        self.file.write(b"\nendstream\nendobj\n")
+
+    def _write_colorspace(self, image):
+        colorspace = image["colorspace"]
+        if image.get("icc"):
+            components, profile = image["icc"]
+            if profile not in self.profiles:
+                self.profiles[profile] = self._reserve()
+                entries = f"/N {components} /Alternate {colorspace} /Filter /FlateDecode"
+                self._write_stream(self.profiles[profile], entries, zlib.compress(profile))
+            colorspace = f"[/ICCBased {self.profiles[profile]} 0 R]"
+        if image.get("palette"):
+            colorspace = f"[/Indexed {colorspace} {len(image['palette']) // 3 - 1} <{image['palette'].hex()}>]"
+        return colorspace
+
+    def _write_image(self, image):
+        num = self._reserve()
+        entries = (f"/Type /XObject /Subtype /Image /Width {image['width']} /Height {image['height']}"
+                   f" /ColorSpace {self._write_colorspace(image)} {image['dict']}")
+        if image.get("smask"):
+            entries += f" /SMask {self._write_image(image['smask'])} 0 R"
+        self._write_stream(num, entries, image.get("stream"), image.get("source"), image.get("segments", ()))
+        return num
+
+    def add_image_page(self, image):
+        width, height = image["page_size"]
+        image_num = self._write_image(image)
+        content_num = self._reserve()
+        matrix = " ".join(f"{value:.4f}" for value in _ORIENTATION_MATRICES[image.get("orientation", 1)](width, height))
+        self._write_stream(content_num, "", f"q {matrix} cm /Im0 Do Q".encode("latin-1"))
+        page_num = self._reserve()
+        self._write_object(page_num, (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {width:.4f} {height:.4f}]"
+            f" /Resources << /XObject << /Im0 {image_num} 0 R >> >> /Contents {content_num} 0 R >>"
+        ))
+        self.kids.append(page_num)
+
+    def close(self):
+        kids = " ".join(f"{num} 0 R" for num in self.kids)
+        self._write_object(2, f"<< /Type /Pages /Count {len(self.kids)} /Kids [{kids}] >>")
+        self._write_object(1, "<< /Type /Catalog /Pages 2 0 R >>")
+        xref_offset = self.file.tell()
+        self.file.write(b"xref\n0 %d\n0000000000 65535 f \n" % len(self.offsets))
+        for offset in self.offsets[1:]:
+            self.file.write(b"%010d 00000 n \n" % offset)
+        self.file.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+                        % (len(self.offsets), xref_offset))
+        self.file.close()
+
+    def abort(self):
+        self.file.close()
+
+
+def image_to_pdf(image_paths_str, output_path, workers=None):
+    try:
+        image_paths = resolve_inputs(image_paths_str)
+        if not image_paths or not all(os.path.exists(p) for p in image_paths):
+            return {"success": False, "message": "One or more image paths are invalid or missing."}
+
+        part_path = output_path + ".part"
+        writer = _StreamingPdfWriter(part_path)
+        progress.phase("convert")
+        try:
+            for (image_path, _), future in _prepared_pages(_page_tasks(image_paths), workers):
+                progress.check_cancelled()
+                try:
+                    writer.add_image_page(future.result())
+                except Exception as e:
+                    raise ValueError(f"Error processing image '{os.path.basename(image_path)}': {e}") from e
+                progress.advance(len(writer.kids))
+        except BaseException:
+            writer.abort()
+            os.remove(part_path)
+            raise
+
+        page_count = len(writer.kids)
+        if page_count == 0:
+            writer.abort()
+            os.remove(part_path)
             return {"success": False, "message": "No valid image files were processed."}
 
-        doc.save(output_path)
-        doc.close()
-        return {"success": True, "message": f"Successfully converted {len(doc)} images to a PDF."}
+        progress.advance(page_count, page_count)
+        progress.count(pages=page_count, images=len(image_paths))
+        progress.phase("finish")
+        writer.close()
+        os.replace(part_path, output_path)
+        return {"success": True, "message": f"Successfully converted {page_count} images to a PDF."}
+    except ValueError as e:
+        return {"success": False, "message": str(e)}
     except Exception as e:
         return {"success": False, "message": f"An unexpected error occurred: {str(e)}"}
 
 if __name__ == "__main__":
+    # The first argument is a comma-joined list, "@manifest.txt", a directory or a glob
     image_paths_str = sys.argv[1]
     output_path = sys.argv[2]
     result = image_to_pdf(image_paths_str, output_path)
-    print(json.dumps(result))
\ No newline at end of file
+    print(json.dumps(result))
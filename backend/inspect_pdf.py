@@ -0,0 +1,172 @@
+"""Document structure without rendering: page count, page sizes, encryption,
+outline, forms, image and font counts, and a scanned/born-digital guess.
+
+Only the cross-reference table, the page tree and object dictionaries are
+read; no content stream is parsed. Results are cached on disk by file
+fingerprint, so inspecting the same file again costs a stat() and a small
+JSON read.
+"""
+import os
+import sys
+import json
+import logging
+
+import progress
+import sessions
+from cache import cache_dir, file_fingerprint
+
+CACHE_VERSION = "2"
+# Pages sampled for the scanned/born-digital guess, spread over the document
+SAMPLE_PAGES = 16
+_MAX_TREE_DEPTH = 64
+
+
+def _ref(value):
+    return int(value.split()[0])
+
+
+def _inherited(doc, xref, key):
+    """(xref of the page tree node that defines `key`, raw value), following /Parent links."""
+    for _ in range(_MAX_TREE_DEPTH):
+        kind, value = doc.xref_get_key(xref, key)
+        if kind != "null":
+            return xref, value
+        kind, parent = doc.xref_get_key(xref, "Parent")
+        if kind != "xref":
+            break
+        xref = _ref(parent)
+    return None, None
+
+
+def _box(value):
+    try:
+        x0, y0, x1, y1 = (float(v) for v in value.strip("[] ").split())
+    except (AttributeError, ValueError):
+        return 612.0, 792.0  # US Letter, the PDF default for a missing or broken MediaBox
+    return round(abs(x1 - x0), 2), round(abs(y1 - y0), 2)
+
+
+def _page_sizes(doc):
+    """Page sizes and rotations as runs of consecutive pages that share them."""
+    runs = []
+    for index in range(doc.page_count):
+        xref = doc.page_xref(index)
+        box = _inherited(doc, xref, "CropBox")[1] or _inherited(doc, xref, "MediaBox")[1]
+        width, height = _box(box)
+        rotation = _inherited(doc, xref, "Rotate")[1]
+        try:
+            rotation = int(float(rotation)) % 360 if rotation else 0
+        except ValueError:
+            rotation = 0
+        if runs and (runs[-1]["width"], runs[-1]["height"], runs[-1]["rotation"]) == (width, height, rotation):
+            runs[-1]["to"] = index + 1
+        else:
+            runs.append({"from": index + 1, "to": index + 1, "width": width, "height": height, "rotation": rotation})
+        if index % 500 == 0:
+            progress.check_cancelled()
+    return runs
+
+
+def _object_counts(doc):
+    """Image XObjects (soft masks excluded) and fonts (CID descendants excluded) in the file."""
+    images, masks, fonts = set(), set(), 0
+    for xref in range(1, doc.xref_length()):
+        kind, value = doc.xref_get_key(xref, "Subtype")
+        if value == "/Image":
+            images.add(xref)
+            kind, mask = doc.xref_get_key(xref, "SMask")
+            if kind == "xref":
+                masks.add(_ref(mask))
+        elif doc.xref_get_key(xref, "Type")[1] == "/Font" and value not in ("/CIDFontType0", "/CIDFontType2"):
+            fonts += 1
+        if xref % 5000 == 0:
+            progress.check_cancelled()
+    return len(images - masks), fonts
+
+
+def _page_kind(doc, index):
+    """'image' for a page that draws XObjects but uses no fonts, else 'text'.
+
+    Fonts are looked for in the resources of the page's form XObjects too,
+    recursively: born-digital pages placed as forms (N-up, stamped or
+    imposed output) have no fonts of their own.
+    """
+    holder, _ = _inherited(doc, doc.page_xref(index), "Resources")
+    if holder is None:
+        return "text"
+    xobjects = doc.xref_get_key(holder, "Resources/XObject")
+    has_xobjects = xobjects[0] != "null" and xobjects[1] not in ("<<>>", "")
+    if not has_xobjects:
+        return "text"
+    return "text" if doc.get_page_fonts(index) else "image"
+
+
+def _guess_kind(doc):
+    if not doc.page_count:
+        return "unknown"
+    step = max(1, doc.page_count // SAMPLE_PAGES)
+    sample = range(0, doc.page_count, step)
+    image_pages = sum(_page_kind(doc, index) == "image" for index in sample)
+    if image_pages == 0:
+        return "born-digital"
+    if image_pages >= 0.8 * len(sample):
+        return "scanned"
+    return "mixed"
+
+
+def _inspect(file_path):
+    progress.phase("read")
+    # Through the session cache, so a preview right after reuses the parsed document
+    with sessions.document(file_path) as doc:
+        encryption = doc.metadata.get("encryption") if doc.metadata else None
+        if doc.needs_pass:
+            return {"pageCount": None, "encrypted": True, "needsPassword": True, "encryption": encryption}
+        progress.count(pages=doc.page_count, objects=doc.xref_length() - 1)
+        page_sizes = _page_sizes(doc)
+        images, fonts = _object_counts(doc)
+        fields = doc.is_form_pdf
+        metadata = doc.metadata or {}
+        return {
+            "pageCount": doc.page_count,
+            "pageSizes": page_sizes,
+            "encrypted": bool(doc.is_encrypted or encryption),
+            "needsPassword": False,
+            "encryption": encryption,
+            "version": metadata.get("format"),
+            "title": metadata.get("title") or None,
+            "author": metadata.get("author") or None,
+            "outline": doc.get_toc(simple=True),
+            "hasForm": bool(fields),
+            "formFields": fields or 0,
+            "images": images,
+            "fonts": fonts,
+            "kind": _guess_kind(doc),
+        }
+
+
+def inspect_pdf(file_path):
+    try:
+        if not os.path.exists(file_path):
+            return {"success": False, "message": f"The file '{os.path.basename(file_path)}' was not found."}
+        cache_path = os.path.join(cache_dir(f"inspect/v{CACHE_VERSION}"), file_fingerprint(file_path) + ".json")
+        try:
+            with open(cache_path, encoding="utf-8") as f:
+                return {"success": True, **json.load(f), "cached": True}
+        except (OSError, ValueError):
+            pass
+        info = _inspect(file_path)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(info, f)
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            logging.warning("Could not cache the structure of %s", file_path, exc_info=True)
+        return {"success": True, **info}
+    except Exception as e:
+        logging.exception("Error inspecting PDF")
+        return {"success": False, "message": f"Error: {e}"}
+
+
+if __name__ == "__main__":
+    print(json.dumps(inspect_pdf(sys.argv[1])))
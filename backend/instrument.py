@@ -0,0 +1,194 @@
+"""Opt-in diagnostics for backend operations.
+
+Enabled with FORGEPDF_INSTRUMENT (or an "instrument" field on a worker
+request). The operation's result then carries a "diagnostics" entry with
+its wall and CPU time, how long each progress phase took and how many
+units it finished, the page/object counts it reported, and its peak RSS:
+
+    FORGEPDF_INSTRUMENT=1            timings only
+    FORGEPDF_INSTRUMENT=cprofile     also write a cProfile dump (.prof)
+    FORGEPDF_INSTRUMENT=pyinstrument also write a pyinstrument HTML report
+
+Profile dumps go to FORGEPDF_DIAGNOSTICS_DIR (default: a "diagnostics"
+folder in the cache directory). Profilers only see the calling thread,
+not the worker processes some operations start.
+"""
+import os
+import sys
+import time
+import logging
+import threading
+import cProfile
+import itertools
+
+import progress
+from cache import cache_dir
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+RSS_SAMPLE_INTERVAL = 0.05
+PROFILERS = ("cprofile", "pyinstrument")
+
+_profile_numbers = itertools.count(1)
+
+
+def requested(flag=None):
+    """The instrumentation mode asked for by a request flag or the environment, or None."""
+    value = flag if flag is not None else os.getenv("FORGEPDF_INSTRUMENT", "")
+    if value is True:
+        return "timings"
+    value = str(value).strip().lower()
+    if value in ("", "0", "false", "off"):
+        return None
+    return value if value in PROFILERS else "timings"
+
+
+def current_rss():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+class _RssSampler(threading.Thread):
+    """Tracks this process's peak resident memory while an operation runs.
+
+    ru_maxrss would be the peak over the process's whole life, which is
+    useless in the long-lived worker, so RSS is sampled where /proc allows.
+    """
+
+    def __init__(self):
+        super().__init__(name="rss-sampler", daemon=True)
+        self.start_rss = current_rss()
+        self.peak = self.start_rss
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(RSS_SAMPLE_INTERVAL):
+            self._sample()
+
+    def _sample(self):
+        rss = current_rss()
+        if rss is not None and (self.peak is None or rss > self.peak):
+            self.peak = rss
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        self._sample()
+        if self.peak is None and resource is not None:
+            # No /proc: fall back to the lifetime peak
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            self.peak = peak if sys.platform == "darwin" else peak * 1024
+        return self.peak
+
+
+class Recorder:
+    """Collects phase timings and counts from a job's progress events."""
+
+    def __init__(self):
+        self.phases = []
+        self.counts = {}
+        self._started = time.time()
+
+    def observe(self, event):
+        kind = event.get("type")
+        if kind == "phase":
+            self.phases.append({"phase": event["phase"], "start": event["time"]})
+        elif kind == "progress":
+            if not self.phases:
+                self.phases.append({"phase": "run", "start": self._started})
+            self.phases[-1].update(done=event["done"], unit=event["unit"])
+        elif kind == "counts":
+            self.counts.update({k: v for k, v in event.items() if k not in ("type", "time")})
+
+    def phase_timings(self, end):
+        timings = []
+        # Time before the first announced phase (argument parsing, opening files, ...)
+        if self.phases and self.phases[0]["start"] - self._started > 0.0005:
+            timings.append({"phase": "prepare", "seconds": round(self.phases[0]["start"] - self._started, 6)})
+        for current, following in zip(self.phases, self.phases[1:] + [{"start": end}]):
+            entry = {"phase": current["phase"], "seconds": round(following["start"] - current["start"], 6)}
+            if "done" in current:
+                entry.update(done=current["done"], unit=current["unit"])
+            timings.append(entry)
+        return timings
+
+
+def _profile_path(name, suffix):
+    directory = os.getenv("FORGEPDF_DIAGNOSTICS_DIR") or cache_dir("diagnostics")
+    os.makedirs(directory, exist_ok=True)
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    base = os.path.splitext(os.path.basename(name or "operation"))[0]
+    return os.path.join(directory, f"{stamp}_{base}_{os.getpid()}_{next(_profile_numbers)}{suffix}")
+
+
+def _start_profiler(mode):
+    if mode == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            logging.warning("pyinstrument is not installed; writing a cProfile dump instead")
+        else:
+            profiler = Profiler()
+            profiler.start()
+            return "pyinstrument", profiler
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return "cprofile", profiler
+
+
+def _stop_profiler(kind, profiler, name):
+    if kind == "pyinstrument":
+        profiler.stop()
+        path = _profile_path(name, ".html")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(profiler.output_html())
+    else:
+        profiler.disable()
+        path = _profile_path(name, ".prof")
+        profiler.dump_stats(path)
+    return path
+
+
+def run(job, fn, *args, name=None, mode="timings"):
+    """Run fn under `job` like progress.run and attach diagnostics to its result dict."""
+    recorder = Recorder()
+    job.watch(recorder.observe)
+    sampler = _RssSampler()
+    sampler.start()
+    profiler = _start_profiler(mode) if mode in PROFILERS else None
+    before = os.times()
+    start = time.perf_counter()
+    profile_path = None
+    try:
+        result = progress.run(job, fn, *args)
+    finally:
+        wall = time.perf_counter() - start
+        after = os.times()
+        end = time.time()
+        peak = sampler.stop()
+        if profiler:
+            try:
+                profile_path = _stop_profiler(*profiler, name)
+            except Exception:
+                logging.exception("Failed to write profile for %s", name)
+
+    if isinstance(result, dict):
+        cpu = (after.user + after.system + after.children_user + after.children_system) - \
+              (before.user + before.system + before.children_user + before.children_system)
+        result["diagnostics"] = {
+            "operation": name,
+            "wall_seconds": round(wall, 6),
+            "cpu_seconds": round(cpu, 6),
+            "phases": recorder.phase_timings(end),
+            "counts": recorder.counts,
+            "rss_start_bytes": sampler.start_rss,
+            "peak_rss_bytes": peak,
+            "profile": profile_path,
+        }
+    return result
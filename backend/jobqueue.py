@@ -0,0 +1,332 @@
+"""Durable job queue in SQLite, for large unattended batches.
+
+    python forgepdf.py queue add jobs.jsonl      enqueue manifest jobs (see forgepdf.py)
+    python forgepdf.py queue run [--workers N]   work until the queue is empty
+    python forgepdf.py queue status
+    python forgepdf.py queue retry               put quarantined jobs back in the queue
+
+A job moves queued -> running -> done. A runner claims a job by taking
+a lease on it, and renews the lease while the job runs. If the runner
+dies, the lease expires and another runner takes the job over. Results
+are only accepted from the lease holder, so a job is never recorded
+twice. Failed attempts are retried with exponential backoff; a job that
+fails max_attempts times is quarantined (poison job) until retried by
+hand. When a worker process dies, the jobs that were running beside it
+are not charged for it: they run again one at a time, and only a job
+that kills a process of its own uses up an attempt.
+"""
+import os
+import json
+import time
+import random
+import socket
+import sqlite3
+import logging
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import metrics
+from cache import cache_dir
+
+LEASE_SECONDS = 300
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = 2.0  # seconds before the first retry; doubles per attempt
+BACKOFF_MAX = 600.0
+IDLE_POLL = 1.0
+CRASHED = {"success": False, "message": "The worker process running this job died."}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    key TEXT UNIQUE,
+    op TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    not_before REAL NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires REAL,
+    last_error TEXT,
+    result TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (state, not_before);
+CREATE INDEX IF NOT EXISTS jobs_leases ON jobs (state, lease_expires);
+"""
+
+
+def default_path():
+    return os.path.join(cache_dir("jobqueue"), "queue.sqlite")
+
+
+def backoff_delay(attempts):
+    """Delay before the next try after `attempts` failed ones, with jitter so retries spread out."""
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempts - 1))
+    return delay * random.uniform(0.8, 1.2)
+
+
+class JobQueue:
+    def __init__(self, path=None):
+        self.path = path or default_path()
+        # Autocommit mode: transactions are opened explicitly where a read and write must be atomic
+        self.db = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def close(self):
+        self.db.close()
+
+    def _transaction(self):
+        return _Immediate(self.db, self._lock)
+
+    def enqueue(self, job, key=None, max_attempts=MAX_ATTEMPTS):
+        """Add a job. With a `key`, a job already queued under that key is kept instead. Returns its id."""
+        now = time.time()
+        with self._transaction():
+            cursor = self.db.execute(
+                "INSERT OR IGNORE INTO jobs (key, op, payload, max_attempts, created, updated) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, job.get("op", ""), json.dumps(job), max_attempts, now, now),
+            )
+            if cursor.rowcount:
+                return cursor.lastrowid
+            return self.db.execute("SELECT id FROM jobs WHERE key = ?", (key,)).fetchone()[0]
+
+    def enqueue_many(self, jobs):
+        """Add (job, key) pairs in one transaction. Returns how many were new."""
+        now = time.time()
+        with self._transaction():
+            before = self.db.total_changes
+            self.db.executemany(
+                "INSERT OR IGNORE INTO jobs (key, op, payload, max_attempts, created, updated) VALUES (?, ?, ?, ?, ?, ?)",
+                ((key, job.get("op", ""), json.dumps(job), MAX_ATTEMPTS, now, now) for job, key in jobs),
+            )
+            return self.db.total_changes - before
+
+    def claim(self, owner, lease_seconds=LEASE_SECONDS):
+        """Lease the next ready job to `owner`. Returns (id, job, attempt) or None.
+
+        Ready means queued and past its backoff, or running under a lease
+        that expired (its runner died). An expired job that has used up its
+        attempts is quarantined instead of being handed out again.
+        """
+        now = time.time()
+        with self._transaction():
+            while True:
+                row = self.db.execute(
+                    "SELECT id, payload, attempts, max_attempts, state FROM jobs"
+                    " WHERE (state = 'queued' AND not_before <= ?) OR (state = 'running' AND lease_expires < ?)"
+                    " ORDER BY not_before, id LIMIT 1",
+                    (now, now),
+                ).fetchone()
+                if row is None:
+                    return None
+                job_id, payload, attempts, max_attempts, state = row
+                if state == "running" and attempts >= max_attempts:
+                    self.db.execute(
+                        "UPDATE jobs SET state = 'quarantined', lease_owner = NULL, lease_expires = NULL,"
+                        " last_error = COALESCE(last_error, 'Lease expired'), updated = ? WHERE id = ?",
+                        (now, job_id),
+                    )
+                    continue
+                self.db.execute(
+                    "UPDATE jobs SET state = 'running', attempts = attempts + 1, lease_owner = ?,"
+                    " lease_expires = ?, updated = ? WHERE id = ?",
+                    (owner, now + lease_seconds, now, job_id),
+                )
+                return job_id, json.loads(payload), attempts + 1
+
+    def renew(self, job_id, owner, lease_seconds=LEASE_SECONDS):
+        """Extend a lease. False if the lease was lost (expired and taken over)."""
+        with self._lock:
+            cursor = self.db.execute(
+                "UPDATE jobs SET lease_expires = ?, updated = ? WHERE id = ? AND state = 'running' AND lease_owner = ?",
+                (time.time() + lease_seconds, time.time(), job_id, owner),
+            )
+        return cursor.rowcount == 1
+
+    def complete(self, job_id, owner, result):
+        """Record a successful result. Ignored (returns False) unless `owner` still holds the lease."""
+        with self._lock:
+            cursor = self.db.execute(
+                "UPDATE jobs SET state = 'done', result = ?, lease_owner = NULL, lease_expires = NULL, updated = ?"
+                " WHERE id = ? AND state = 'running' AND lease_owner = ?",
+                (json.dumps(result), time.time(), job_id, owner),
+            )
+        return cursor.rowcount == 1
+
+    def fail(self, job_id, owner, error):
+        """Record a failed attempt: schedule a retry with backoff, or quarantine the job."""
+        now = time.time()
+        with self._transaction():
+            row = self.db.execute(
+                "SELECT attempts, max_attempts FROM jobs WHERE id = ? AND state = 'running' AND lease_owner = ?",
+                (job_id, owner),
+            ).fetchone()
+            if row is None:
+                return None
+            attempts, max_attempts = row
+            if attempts >= max_attempts:
+                state, not_before = "quarantined", 0
+            else:
+                state, not_before = "queued", now + backoff_delay(attempts)
+            self.db.execute(
+                "UPDATE jobs SET state = ?, not_before = ?, last_error = ?, lease_owner = NULL,"
+                " lease_expires = NULL, updated = ? WHERE id = ?",
+                (state, not_before, error, now, job_id),
+            )
+            return state
+
+    def retry_quarantined(self):
+        """Give every quarantined job a fresh set of attempts. Returns how many."""
+        with self._lock:
+            cursor = self.db.execute(
+                "UPDATE jobs SET state = 'queued', attempts = 0, not_before = 0, updated = ? WHERE state = 'quarantined'",
+                (time.time(),),
+            )
+        return cursor.rowcount
+
+    def counts(self):
+        with self._lock:
+            return dict(self.db.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state"))
+
+    def next_ready_in(self):
+        """Seconds until a queued job's backoff ends (0 if one is ready, None if none are queued)."""
+        with self._lock:
+            row = self.db.execute(
+                "SELECT MIN(not_before) FROM jobs WHERE state = 'queued'"
+                " UNION ALL SELECT MIN(lease_expires) FROM jobs WHERE state = 'running'"
+            ).fetchall()
+        pending = [value for (value,) in row if value is not None]
+        return max(0.0, min(pending) - time.time()) if pending else None
+
+
+class _Immediate:
+    """BEGIN IMMEDIATE ... COMMIT: takes the write lock up front, so two runners can't claim one job."""
+
+    def __init__(self, db, lock):
+        self.db = db
+        self.lock = lock
+
+    def __enter__(self):
+        self.lock.acquire()
+        try:
+            self.db.execute("BEGIN IMMEDIATE")
+        except BaseException:
+            self.lock.release()
+            raise
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self.db.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            self.lock.release()
+
+
+def run(queue_path=None, workers=None, lease_seconds=LEASE_SECONDS, stop_when_empty=True):
+    """Work through the queue with a process pool until it is drained (or forever)."""
+    # Imported here: forgepdf imports this module for its CLI
+    import forgepdf
+
+    queue = JobQueue(queue_path)
+    workers = workers or os.cpu_count() or 1
+    owner_prefix = f"{socket.gethostname()}:{os.getpid()}"
+    in_flight = {}  # future -> (job id, owner, job, whether it runs alone)
+    suspects = deque()  # (job id, owner, job) in flight when a pool process died, to run alone
+    counts = {"done": 0, "retried": 0, "quarantined": 0}
+    stop_renewing = threading.Event()
+
+    def renew_leases():
+        while not stop_renewing.wait(lease_seconds / 3):
+            leased = [entry[:2] for entry in list(in_flight.values()) + list(suspects)]
+            for job_id, owner in leased:
+                if not queue.renew(job_id, owner, lease_seconds):
+                    logging.warning("Lost the lease on job %s; its result will be discarded", job_id)
+
+    def new_pool(size=workers):
+        return ProcessPoolExecutor(max_workers=size, initializer=forgepdf.init_worker)
+
+    def submit(executor, job_id, owner, job, alone=False):
+        in_flight[executor.submit(forgepdf.run_job, job)] = (job_id, owner, job, alone)
+
+    def record(job_id, owner, job, result):
+        metrics.observe_result(job.get("op"), result)
+        if result["success"]:
+            if queue.complete(job_id, owner, result):
+                counts["done"] += 1
+        else:
+            state = queue.fail(job_id, owner, result["message"])
+            if state:
+                counts["retried" if state == "queued" else "quarantined"] += 1
+
+    renewer = threading.Thread(target=renew_leases, name="lease-renewer", daemon=True)
+    renewer.start()
+    pool = new_pool()
+    isolation = None  # single-process pool for suspects
+    try:
+        slot = 0
+        while True:
+            if suspects and not any(alone for *_, alone in in_flight.values()):
+                isolation = isolation or new_pool(1)
+                submit(isolation, *suspects.popleft(), alone=True)
+            while len(in_flight) < workers:
+                slot += 1
+                owner = f"{owner_prefix}:{slot}"
+                claimed = queue.claim(owner, lease_seconds)
+                if claimed is None:
+                    break
+                job_id, job, _ = claimed
+                job.setdefault("id", str(job_id))
+                submit(pool, job_id, owner, job)
+
+            if not in_flight:
+                wait_for = queue.next_ready_in()
+                if wait_for is None and stop_when_empty:
+                    break
+                time.sleep(min(IDLE_POLL, wait_for if wait_for is not None else IDLE_POLL))
+                continue
+
+            done, _ = wait(in_flight, timeout=IDLE_POLL, return_when=FIRST_COMPLETED)
+            lost = []
+            for future in done:
+                job_id, owner, job, alone = in_flight.pop(future)
+                try:
+                    result = future.result()
+                except BrokenProcessPool:
+                    if not alone:
+                        lost.append((job_id, owner, job))
+                        continue
+                    # It killed a process of its own: this attempt counts, and a job
+                    # that keeps doing so ends up quarantined
+                    result = CRASHED
+                    isolation.shutdown(wait=False)
+                    isolation = None
+                record(job_id, owner, job, result)
+            if lost:
+                # A worker process died (crash, OOM kill) and took every job in the pool with
+                # it. Which one killed it is unknown, so they keep their leases, aren't charged
+                # an attempt and run again one at a time
+                for future, (job_id, owner, job, alone) in list(in_flight.items()):
+                    if alone:
+                        continue
+                    del in_flight[future]
+                    try:
+                        record(job_id, owner, job, future.result())
+                    except BrokenProcessPool:
+                        lost.append((job_id, owner, job))
+                logging.warning("A worker process died; retrying %d job(s) one at a time", len(lost))
+                suspects.extend(lost)
+                pool.shutdown(wait=False, cancel_futures=True)
+                pool = new_pool()
+    finally:
+        stop_renewing.set()
+        pool.shutdown(wait=True, cancel_futures=True)
+        if isolation is not None:
+            isolation.shutdown(wait=True)
+        queue.close()
+    return counts
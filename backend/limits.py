@@ -0,0 +1,187 @@
+"""Per-job resource limits, so one malformed or enormous PDF can't take the
+backend down with it.
+
+    FORGEPDF_JOB_TIMEOUT=600       stop a job after this many seconds
+    FORGEPDF_JOB_MAX_RSS_MB=2048   stop a job once its process uses more memory
+    FORGEPDF_MAX_PAGES=20000       refuse documents with more pages
+    FORGEPDF_MAX_OBJECTS=5000000   refuse documents with more objects
+
+All are off when unset or 0. Page and object counts are checked as soon as
+an operation reports them (progress.count), before the expensive part of
+the work. Time and memory are watched from a thread; when a limit trips
+the job is cancelled, and the operation stops at its next
+progress.check_cancelled() point. It is never interrupted asynchronously,
+so a limit can't fire inside a SQLite transaction or while a cache lock is
+held; an operation stuck in one long library call is left to the caller's
+own hard stop (the app restarts a backend that doesn't answer). Pool
+processes also get an address-space rlimit slightly above the memory
+limit, which turns a sudden huge allocation into a MemoryError instead of
+an OOM kill.
+
+Memory is the process's current RSS, read from /proc. Where there is no
+/proc (macOS), the process's peak RSS from getrusage stands in: it only
+goes over the limit if the running job pushed it there. When neither
+works the memory limit is not enforced, and a warning is logged.
+
+A stopped job returns {"success": false, "limit": "<which>", "message": ...}
+and its process carries on with the next job.
+"""
+import os
+import sys
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+import instrument
+import progress
+import sessions
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def _setting(name, cast=int):
+    try:
+        return cast(os.getenv(name, "0") or 0)
+    except ValueError:
+        logging.warning("Ignoring invalid %s=%r", name, os.getenv(name))
+        return cast(0)
+
+
+TIMEOUT = _setting("FORGEPDF_JOB_TIMEOUT", float)
+MAX_RSS_BYTES = _setting("FORGEPDF_JOB_MAX_RSS_MB") * 1024 * 1024
+MAX_PAGES = _setting("FORGEPDF_MAX_PAGES")
+MAX_OBJECTS = _setting("FORGEPDF_MAX_OBJECTS")
+RSS_CHECK_INTERVAL = 0.25
+# Headroom of the address-space rlimit over the RSS limit: mapped libraries,
+# thread stacks and allocator reserves count towards it without being resident
+ADDRESS_SPACE_HEADROOM = 1024 * 1024 * 1024
+
+
+class LimitExceeded(BaseException):
+    """Raised inside an operation that went over a limit.
+
+    A BaseException, like progress.JobCancelled, so the operations' own
+    error handling doesn't swallow it.
+    """
+
+    def __init__(self, limit, message):
+        super().__init__(message)
+        self.limit = limit
+
+
+def result(error):
+    return {"success": False, "limit": error.limit, "message": str(error)}
+
+
+def limit_address_space():
+    """Pool process initializer: cap virtual memory just above the RSS limit."""
+    if not MAX_RSS_BYTES or resource is None or not hasattr(resource, "RLIMIT_AS"):
+        return
+    try:
+        with open("/proc/self/statm") as f:
+            baseline = int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        baseline = 0
+    cap = baseline + MAX_RSS_BYTES + ADDRESS_SPACE_HEADROOM
+    try:
+        resource.setrlimit(resource.RLIMIT_AS, (cap, resource.getrlimit(resource.RLIMIT_AS)[1]))
+    except (ValueError, OSError):
+        logging.warning("Could not limit the address space to %d bytes", cap, exc_info=True)
+
+
+def _peak_rss():
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+_warned_memory = False
+
+
+def _memory_probe():
+    """The function that reads this process's memory use for the RSS limit, or None if there is none."""
+    global _warned_memory
+    if instrument.current_rss() is not None:
+        return instrument.current_rss
+    # The peak never goes down, so it is only useful while it is under the limit
+    if resource is not None and _peak_rss() <= MAX_RSS_BYTES:
+        return _peak_rss
+    if not _warned_memory:
+        _warned_memory = True
+        logging.warning("FORGEPDF_JOB_MAX_RSS_MB is not enforced: this process's memory use can't be read")
+    return None
+
+
+class _Watch:
+    """Trips the job's limits from a background thread."""
+
+    def __init__(self, job):
+        self.job = job
+        self.tripped = None
+        self.stopped = threading.Event()
+        self._memory = _memory_probe() if MAX_RSS_BYTES else None
+        self._thread = threading.Thread(target=self._run, name="job-limits", daemon=True)
+
+    def trip(self, limit, message):
+        if self.tripped:
+            return
+        self.tripped = LimitExceeded(limit, message)
+        # Raised as JobCancelled at the operation's next check_cancelled(), then turned into the limit by enforce
+        self.job.cancel()
+
+    def _on_event(self, event):
+        if event.get("type") != "counts" or self.stopped.is_set():
+            return
+        if MAX_PAGES and event.get("pages", 0) > MAX_PAGES:
+            self.tripped = LimitExceeded("pages", f"The document has {event['pages']} pages; "
+                                                  f"the limit is {MAX_PAGES}.")
+            raise self.tripped
+        if MAX_OBJECTS and event.get("objects", 0) > MAX_OBJECTS:
+            self.tripped = LimitExceeded("objects", f"The document has {event['objects']} objects; "
+                                                    f"the limit is {MAX_OBJECTS}.")
+            raise self.tripped
+
+    def _run(self):
+        deadline = time.monotonic() + TIMEOUT if TIMEOUT else None
+        while not self.stopped.wait(RSS_CHECK_INTERVAL):
+            if deadline and time.monotonic() >= deadline:
+                self.trip("timeout", f"The operation was stopped after {TIMEOUT:g} seconds.")
+            rss = self._memory() if self._memory else None
+            if rss and rss > MAX_RSS_BYTES:
+                self.trip("memory", f"The operation was stopped after using {rss // 2**20} MB of memory; "
+                                    f"the limit is {MAX_RSS_BYTES // 2**20} MB.")
+
+    def __enter__(self):
+        self.job.watch(self._on_event)
+        if TIMEOUT or self._memory:
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+
+@contextmanager
+def enforce(job):
+    """Apply the configured limits to `job` while the block runs; over a limit, raise LimitExceeded."""
+    watch = _Watch(job)
+    try:
+        with watch:
+            yield
+    except progress.JobCancelled:
+        # Cancelled by a limit rather than by the user
+        if watch.tripped:
+            raise watch.tripped from None
+        raise
+    except MemoryError:
+        raise LimitExceeded("memory", "The operation ran out of memory.") from None
+    finally:
+        if watch.tripped and watch.tripped.limit == "memory":
+            # Whatever the job left in the caches is what pushed the process over
+            sessions.clear()
@@ -0,0 +1,291 @@
+"""On-disk cache of operation outputs, for repeated runs on the same files.
+
+Set FORGEPDF_RESULT_CACHE_MB to enable it. An operation decorated with
+@memoize is then keyed by the content hash of its input files, its other
+arguments (JSON arguments compare by value, so key order and spacing don't
+matter) and the backend version: the source of the operation's module and
+of every backend module it imports (directly or through others), the PDF
+libraries' versions and CACHE_VERSION. On a hit the cached output is
+hardlinked (or copied, across filesystems) to the requested path and the
+original result is returned with "cached": true, its messages naming the
+requested output rather than the one it was first written to.
+
+Entries are evicted least recently used first once they take more than
+the budget. A cached file that was changed through a hardlinked output is
+noticed on the next hit and dropped.
+
+protect_pdf is deliberately not memoized: its key would have to include
+the password, and every protected file should get fresh encryption salts.
+"""
+import os
+import json
+import time
+import shutil
+import sqlite3
+import hashlib
+import inspect
+import logging
+import functools
+import threading
+import types
+import sys
+
+import fitz
+import pikepdf
+import PyPDF2
+
+import progress
+from cache import cache_dir, file_fingerprint
+
+CACHE_VERSION = "2"
+LIMIT_BYTES = int(float(os.getenv("FORGEPDF_RESULT_CACHE_MB", "0")) * 1024 * 1024)
+HASH_CHUNK = 1 << 20
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    result TEXT NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_lru ON entries (last_used);
+CREATE TABLE IF NOT EXISTS hashes (fingerprint TEXT PRIMARY KEY, sha256 TEXT NOT NULL, last_used REAL NOT NULL);
+"""
+
+_db = None
+_db_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0}
+
+
+def _connect():
+    global _db
+    if _db is None:
+        _db = sqlite3.connect(os.path.join(_folder(), "index.sqlite"), timeout=30,
+                              isolation_level=None, check_same_thread=False)
+        _db.execute("PRAGMA journal_mode=WAL")
+        _db.executescript(_SCHEMA)
+    return _db
+
+
+def _folder():
+    return cache_dir(f"results/v{CACHE_VERSION}")
+
+
+def _entry_path(key):
+    return os.path.join(_folder(), key + ".pdf")
+
+
+def stats():
+    return dict(_stats)
+
+
+# --- Keys ---
+
+def content_hash(path):
+    """SHA-256 of a file, remembered by its fingerprint so unchanged files are read once."""
+    fingerprint = file_fingerprint(path)
+    db = _connect()
+    with _db_lock:
+        row = db.execute("SELECT sha256 FROM hashes WHERE fingerprint = ?", (fingerprint,)).fetchone()
+    if row:
+        with _db_lock:
+            db.execute("UPDATE hashes SET last_used = ? WHERE fingerprint = ?", (time.time(), fingerprint))
+        return row[0]
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            digest.update(chunk)
+    with _db_lock:
+        db.execute("INSERT OR REPLACE INTO hashes (fingerprint, sha256, last_used) VALUES (?, ?, ?)",
+                   (fingerprint, digest.hexdigest(), time.time()))
+    return digest.hexdigest()
+
+
+def _canonical(value):
+    """Arguments as they affect the output: JSON strings by value, everything else as given."""
+    if isinstance(value, str) and value.lstrip().startswith(("{", "[")):
+        try:
+            return json.loads(value)
+        except ValueError:
+            pass
+    return value
+
+
+_BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _backend_modules(module, found=None):
+    """`module` and the backend modules it uses, through imported modules or imported names."""
+    found = {} if found is None else found
+    found[module.__name__] = module
+    for value in vars(module).values():
+        if not isinstance(value, types.ModuleType):
+            value = sys.modules.get(getattr(value, "__module__", None) or "")
+        path = getattr(value, "__file__", None)
+        if value is None or value.__name__ in found or not path:
+            continue
+        if os.path.dirname(os.path.abspath(path)) == _BACKEND_DIR:
+            _backend_modules(value, found)
+    return found
+
+
+@functools.lru_cache(maxsize=None)
+def _code_version(fn):
+    # Changes to what an operation builds on (pdfstream, sessions, ...) change its output too
+    digest = hashlib.sha256()
+    for name, module in sorted(_backend_modules(sys.modules[fn.__module__]).items()):
+        with open(module.__file__, "rb") as f:
+            digest.update(f"{name}\0".encode("utf-8") + f.read())
+    return f"{CACHE_VERSION}|{digest.hexdigest()}|{fitz.VersionBind}|{pikepdf.__version__}|{PyPDF2.__version__}"
+
+
+def _key(fn, inputs, options):
+    digest = hashlib.sha256(_code_version(fn).encode("utf-8"))
+    digest.update(f"|{fn.__module__}.{fn.__qualname__}|".encode("utf-8"))
+    for path in inputs:
+        digest.update(content_hash(path).encode("ascii"))
+    digest.update(json.dumps(options, sort_keys=True, separators=(",", ":")).encode("utf-8"))
+    return digest.hexdigest()
+
+
+# --- Store ---
+
+def _place(source, target):
+    """Put a copy of `source` at `target`, hardlinking when possible."""
+    if os.path.exists(target) and os.path.samefile(source, target):
+        return  # rename() onto another link to the same file would leave the temporary behind
+    tmp_path = f"{target}.{os.getpid()}.part"
+    try:
+        try:
+            os.link(source, tmp_path)
+        except OSError:
+            shutil.copyfile(source, tmp_path)
+        os.replace(tmp_path, target)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _relocated(value, old_path, new_path):
+    """`value` with the output path, and its file name, replaced in every string."""
+    if isinstance(value, str):
+        value = value.replace(old_path, new_path)
+        return value.replace(os.path.basename(old_path), os.path.basename(new_path))
+    if isinstance(value, list):
+        return [_relocated(item, old_path, new_path) for item in value]
+    if isinstance(value, dict):
+        return {key: _relocated(item, old_path, new_path) for key, item in value.items()}
+    return value
+
+
+def _lookup(key, output_path):
+    db = _connect()
+    with _db_lock:
+        row = db.execute("SELECT size, mtime_ns, result FROM entries WHERE key = ?", (key,)).fetchone()
+    if row is None:
+        return None
+    path = _entry_path(key)
+    try:
+        st = os.stat(path)
+        if (st.st_size, st.st_mtime_ns) != row[:2]:
+            raise FileNotFoundError(path)  # Changed through a hardlinked output
+        _place(path, output_path)
+    except FileNotFoundError:
+        _forget(key)
+        return None
+    with _db_lock:
+        db.execute("UPDATE entries SET last_used = ? WHERE key = ?", (time.time(), key))
+    stored = json.loads(row[2])
+    return _relocated(stored["result"], stored["output"], output_path)
+
+
+def _store(key, output_path, result):
+    path = _entry_path(key)
+    _place(output_path, path)
+    st = os.stat(path)
+    with _db_lock:
+        _connect().execute(
+            "INSERT OR REPLACE INTO entries (key, size, mtime_ns, result, last_used) VALUES (?, ?, ?, ?, ?)",
+            (key, st.st_size, st.st_mtime_ns, json.dumps({"output": output_path, "result": result}), time.time()),
+        )
+    _evict()
+
+
+def _forget(key):
+    with _db_lock:
+        _connect().execute("DELETE FROM entries WHERE key = ?", (key,))
+    try:
+        os.remove(_entry_path(key))
+    except FileNotFoundError:
+        pass
+
+
+def _evict():
+    """Drop least recently used entries until the cache fits its budget."""
+    db = _connect()
+    with _db_lock:
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        victims = []
+        if total > LIMIT_BYTES:
+            for key, size in db.execute("SELECT key, size FROM entries ORDER BY last_used"):
+                victims.append(key)
+                total -= size
+                if total <= LIMIT_BYTES:
+                    break
+        # Remembered input hashes are tiny; keep the most recent ones
+        db.execute("DELETE FROM hashes WHERE fingerprint NOT IN"
+                   " (SELECT fingerprint FROM hashes ORDER BY last_used DESC LIMIT 10000)")
+    for key in victims:
+        _forget(key)
+
+
+# --- Decorator ---
+
+def memoize(inputs, output):
+    """Cache a single-output operation's file by its inputs and other arguments.
+
+    `inputs` and `output` name the function's parameters holding the input
+    path(s) and the output path; comma-joined input lists are split.
+    """
+    def decorate(fn):
+        signature = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if LIMIT_BYTES <= 0:
+                return fn(*args, **kwargs)
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = dict(bound.arguments)
+            output_path = arguments.pop(output)
+            input_paths = arguments.pop(inputs)
+            if isinstance(input_paths, str):
+                input_paths = input_paths.split(",")
+            try:
+                key = _key(fn, input_paths, {name: _canonical(value) for name, value in arguments.items()})
+                cached = _lookup(key, output_path)
+            except (OSError, sqlite3.Error):
+                # Missing inputs and the like are the operation's to report
+                logging.debug("Result cache lookup failed", exc_info=True)
+                key = None
+            if key is None:
+                return fn(*args, **kwargs)
+            if cached is not None:
+                _stats["hits"] += 1
+                progress.phase("cached")
+                return {**cached, "cached": True}
+            _stats["misses"] += 1
+            if os.path.isfile(output_path) and os.stat(output_path).st_nlink > 1:
+                # Probably a cached output from an earlier hit; writing through the link would change the entry
+                os.remove(output_path)
+            result = fn(*args, **kwargs)
+            if result.get("success") and os.path.isfile(output_path):
+                try:
+                    _store(key, output_path, result)
+                except (OSError, sqlite3.Error):
+                    logging.warning("Could not cache the result of %s", fn.__name__, exc_info=True)
+            return result
+        return wrapper
+    return decorate
@@ -1,26 +1,39 @@
 import sys
 import os
 import json
-from PyPDF2 import PdfMerger
+from contextlib import ExitStack
+import memo
+import pdfstream
+import progress
 
+@memo.memoize(inputs="file_paths_str", output="output_path")
 def merge_pdfs(file_paths_str, output_path):
     try:
-        merger = PdfMerger()
         file_paths = file_paths_str.split(',')
 
         if len(file_paths) < 2:
             return {"success": False, "message": "Please select at least two PDF files to merge."}
 
-        for pdf_path in file_paths:
-            if os.path.exists(pdf_path):
-                merger.append(pdf_path)
-            else:
-                return {"success": False, "message": f"File not found: {pdf_path}"}
+        # Every input stays open until the output is written: page contents are copied from their files then
+        with ExitStack() as stack:
+            progress.phase("append")
+            merged = None
+            for i, pdf_path in enumerate(file_paths):
+                progress.check_cancelled()
+                if not os.path.exists(pdf_path):
+                    return {"success": False, "message": f"File not found: {pdf_path}"}
+                pdf = stack.enter_context(pdfstream.open_pdf(pdf_path))
+                if merged is None:
+                    merged = pdf
+                else:
+                    pdfstream.append_pages(merged, pdf)
+                progress.advance(i + 1, len(file_paths), unit="file")
+            progress.count(files=len(file_paths), pages=len(merged.pages))
+
+            progress.check_cancelled()
+            progress.phase("save")
+            pdfstream.save(merged, output_path)
 
-        with open(output_path, 'wb') as f:
-            merger.write(f)
-        merger.close()
-        
         return {"success": True, "message": f"Successfully merged {len(file_paths)} files into {os.path.basename(output_path)}"}
 
     except Exception as e:
@@ -0,0 +1,291 @@
+"""Throughput metrics for the long-lived backend, in Prometheus text format.
+
+The worker counts jobs, their latency, pages and bytes processed, and
+failures per operation, and reports queue depth and cache statistics.
+They are exposed when either of these is set:
+
+    FORGEPDF_METRICS_PORT=9464     serve http://127.0.0.1:9464/metrics
+    FORGEPDF_METRICS_FILE=/path    rewrite this file after every job and
+                                   every FORGEPDF_METRICS_INTERVAL seconds
+                                   (for node_exporter's textfile collector)
+
+Pages/sec and bytes/sec are rate()s of the page and byte counters.
+
+Every process exporting metrics needs a port and file of its own. With
+FORGEPDF_METRICS_LANE set (the app sets it per worker, forgepdf.py to
+the command) all metrics carry a `lane` label, so the files of several
+processes can be collected side by side. forgepdf.py batch, watch and
+queue count jobs and their latency as results come back from their pools.
+"""
+import os
+import time
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import memo
+import sessions
+
+# Upper bounds of the job latency buckets, in seconds
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+WRITE_INTERVAL = float(os.getenv("FORGEPDF_METRICS_INTERVAL", "15"))
+
+_lock = threading.Lock()
+_lane = os.getenv("FORGEPDF_METRICS_LANE")
+
+
+def _format_labels(names, values):
+    if _lane:
+        names, values = ("lane",) + tuple(names), (_lane,) + tuple(values)
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{escaped}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        _registry.append(self)
+
+    def _header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *label_values, amount=1):
+        with _lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def set_total(self, *label_values, value):
+        """Report a running total kept elsewhere (the caches count their own hits)."""
+        with _lock:
+            self._values[label_values] = value
+
+    def render(self):
+        lines = self._header()
+        for label_values, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, *label_values, value):
+        with _lock:
+            self._values[label_values] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, *label_values, value):
+        with _lock:
+            counts, total, observations = self._values.get(label_values) or ([0] * len(self.buckets), 0.0, 0)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[label_values] = (counts, total + value, observations + 1)
+
+    def render(self):
+        lines = self._header()
+        for label_values, (counts, total, observations) in sorted(self._values.items()):
+            for bound, count in zip(self.buckets, counts):
+                labels = _format_labels(self.labels + ("le",), label_values + (_format_value(float(bound)),))
+                lines.append(f"{self.name}_bucket{labels} {count}")
+            labels = _format_labels(self.labels + ("le",), label_values + ("+Inf",))
+            lines.append(f"{self.name}_bucket{labels} {observations}")
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {observations}")
+        return lines
+
+
+_registry = []
+
+JOBS = Counter("forgepdf_jobs_total", "Backend jobs finished, by operation and status.", ("operation", "status"))
+LATENCY = Histogram("forgepdf_job_duration_seconds", "Wall time of backend jobs.", ("operation",))
+PAGES = Counter("forgepdf_pages_processed_total", "Pages processed by backend jobs.", ("operation",))
+BYTES_IN = Counter("forgepdf_input_bytes_total", "Size of the input files of backend jobs.", ("operation",))
+BYTES_OUT = Counter("forgepdf_output_bytes_total", "Size of the files written by backend jobs.", ("operation",))
+QUEUE_DEPTH = Gauge("forgepdf_queue_depth", "Jobs waiting to start.")
+IN_PROGRESS = Gauge("forgepdf_jobs_in_progress", "Jobs currently running.")
+UPTIME = Gauge("forgepdf_uptime_seconds", "Seconds since the backend started.")
+PREVIEW_CACHE = Counter("forgepdf_preview_cache_requests_total", "Single-page preview requests, by cache result.",
+                        ("result",))
+SESSION_CACHE = Counter("forgepdf_session_cache_requests_total", "Document opens, by session cache result.", ("result",))
+RESULT_CACHE = Counter("forgepdf_result_cache_requests_total", "Memoized operations, by result cache result.",
+                       ("result",))
+SESSION_BYTES = Gauge("forgepdf_session_cache_bytes", "Estimated size of the documents kept open.")
+
+_started = time.time()
+
+
+def _collect():
+    # Imported here: preview imports sessions and the render cache lives there
+    import preview
+
+    UPTIME.set(value=round(time.time() - _started, 3))
+    render_stats = preview.render_cache_stats()
+    PREVIEW_CACHE.set_total("hit", value=render_stats["hits"])
+    PREVIEW_CACHE.set_total("miss", value=render_stats["misses"])
+    result_stats = memo.stats()
+    RESULT_CACHE.set_total("hit", value=result_stats["hits"])
+    RESULT_CACHE.set_total("miss", value=result_stats["misses"])
+    session_stats = sessions.stats()
+    SESSION_CACHE.set_total("hit", value=session_stats["hits"])
+    SESSION_CACHE.set_total("miss", value=session_stats["misses"])
+    SESSION_BYTES.set(value=session_stats["bytes"])
+
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    _collect()
+    with _lock:
+        lines = [line for metric in _registry for line in metric.render()]
+    return "\n".join(lines) + "\n"
+
+
+# --- Per-job accounting ---
+
+def _file_args(args):
+    """Existing files named by a job's arguments (comma-joined lists included)."""
+    paths = []
+    for arg in args:
+        if not isinstance(arg, str) or not arg or arg.lstrip().startswith(("{", "[")):
+            continue
+        for candidate in arg.split(",") if "," in arg else [arg]:
+            if os.path.isfile(candidate):
+                paths.append(candidate)
+    return paths
+
+
+class JobTracker:
+    """Measures one job: watches its progress events for pages and its arguments for files."""
+
+    def __init__(self, operation, args):
+        self.operation = operation
+        self.args = args
+        self.pages_done = 0
+        self.pages_counted = 0
+        self._inputs = {os.path.realpath(p): os.path.getsize(p) for p in _file_args(args)}
+        self._start_wall = time.time()
+        self._start = time.perf_counter()
+
+    def observe(self, event):
+        if event.get("type") == "progress" and event.get("unit") == "page":
+            self.pages_done = max(self.pages_done, event["done"])
+        elif event.get("type") == "counts" and "pages" in event:
+            self.pages_counted = max(self.pages_counted, event["pages"])
+
+    def _output_bytes(self):
+        total = 0
+        for arg in self.args:
+            if not isinstance(arg, str) or not arg:
+                continue
+            if os.path.isfile(arg) and os.path.realpath(arg) not in self._inputs:
+                if os.path.getmtime(arg) >= self._start_wall - 1:
+                    total += os.path.getsize(arg)
+            elif os.path.isdir(arg):
+                # Output folders (pdf_to_image): count what this job just wrote
+                with os.scandir(arg) as entries:
+                    for entry in entries:
+                        if entry.is_file() and entry.stat().st_mtime >= self._start_wall - 1:
+                            total += entry.stat().st_size
+        return total
+
+    def finish(self, result):
+        status = "cancelled" if result.get("cancelled") else "success" if result.get("success") else "failure"
+        JOBS.inc(self.operation, status)
+        LATENCY.observe(self.operation, value=time.perf_counter() - self._start)
+        if status == "success":
+            PAGES.inc(self.operation, amount=self.pages_done or self.pages_counted)
+            BYTES_IN.inc(self.operation, amount=sum(self._inputs.values()))
+            try:
+                BYTES_OUT.inc(self.operation, amount=self._output_bytes())
+            except OSError:
+                logging.warning("Could not measure the output of %s", self.operation, exc_info=True)
+        write_textfile()
+
+
+def observe_result(operation, result):
+    """Count a job that ran in a pool process, from its result line (batch, watch, queue)."""
+    JOBS.inc(operation, "success" if result.get("success") else "failure")
+    if "seconds" in result:
+        LATENCY.observe(operation, value=result["seconds"])
+    write_textfile()
+
+
+# --- Exposition ---
+
+def write_textfile():
+    path = os.getenv("FORGEPDF_METRICS_FILE")
+    if not path:
+        return
+    try:
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(render())
+        os.replace(tmp_path, path)
+    except OSError:
+        logging.exception("Failed to write metrics to %s", path)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # stderr belongs to the app's log; scrapes would flood it
+        pass
+
+
+def start(lane=None):
+    """Start the configured exporters (no-op when neither variable is set).
+
+    `lane` labels the metrics unless FORGEPDF_METRICS_LANE already does.
+    """
+    global _lane
+    _lane = _lane or lane
+    port = os.getenv("FORGEPDF_METRICS_PORT")
+    if port:
+        try:
+            server = ThreadingHTTPServer(("127.0.0.1", int(port)), _MetricsHandler)
+        except (OSError, ValueError):
+            logging.exception("Could not serve metrics on port %s", port)
+        else:
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    if os.getenv("FORGEPDF_METRICS_FILE"):
+        def write_periodically():
+            while True:
+                write_textfile()
+                time.sleep(WRITE_INTERVAL)
+        threading.Thread(target=write_periodically, name="metrics-file", daemon=True).start()
@@ -1,23 +1,25 @@
 import sys
 import os
 import json
-from PyPDF2 import PdfReader, PdfWriter
+import memo
+import pdfstream
+import progress
 
+@memo.memoize(inputs="file_path", output="output_path")
 def organize_pdf(file_path, page_order_str, pages_to_delete_str, output_path):
     try:
-        reader = PdfReader(file_path)
-        writer = PdfWriter()
-
         page_order = [int(p) - 1 for p in page_order_str.split(',')]
         pages_to_delete = {int(p) - 1 for p in pages_to_delete_str.split(',')} if pages_to_delete_str else set()
 
-        for page_num in page_order:
-            if page_num not in pages_to_delete:
-                writer.add_page(reader.pages[page_num])
+        progress.phase("read")
+        with pdfstream.open_pdf(file_path) as pdf:
+            progress.count(pages=len(pdf.pages))
+            pdfstream.keep_pages(pdf, [page_num for page_num in page_order if page_num not in pages_to_delete])
+
+            progress.check_cancelled()
+            progress.phase("write")
+            pdfstream.save(pdf, output_path)
 
-        with open(output_path, 'wb') as f:
-            writer.write(f)
-            
         return {"success": True, "message": f"Successfully organized PDF and saved to {os.path.basename(output_path)}"}
 
     except Exception as e:
@@ -0,0 +1,235 @@
+"""Blank and duplicate page detection for scanned batches.
+
+Every page is rendered in grayscale at a very low resolution and reduced
+with NumPy to three numbers:
+
+    ink    share of the page (minus a margin, where scanner edges and punch
+           holes are) clearly darker than the paper
+    dhash  64-bit difference hash: brighter/darker between neighbouring cells of a 9x8 grid
+    phash  64-bit perceptual hash: signs of the low frequencies of a 32x32 DCT
+
+A page with less ink than `blankInk` is blank. A page whose two hashes are
+both within a few bits of an earlier non-blank page, in the same or an
+earlier file, is a duplicate of it if their 64x48 thumbnails also
+correlate closely: at this resolution different pages of the same layout
+(text pages of a report) can share their hashes. Pages are analysed in a
+process pool, in chunks spread over all files.
+
+The flagged pages come back as `deletePages` per file, in the form
+organize_pdf takes, and clean_pdf removes them through organize_pdf.
+"""
+import os
+import sys
+import json
+import itertools
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import fitz
+import numpy as np
+
+import organize_pdf
+import progress
+import sessions
+
+ANALYSIS_DPI = 24
+# Border left out of the ink measurement, as a share of the shorter side
+MARGIN = 0.06
+# How much darker than the paper (its 95th percentile brightness) a pixel must be to count as ink
+INK_CONTRAST = 48
+DEFAULT_BLANK_INK = 0.0008
+# Sparser pages differ in details (a page number, a date) that don't survive the
+# low resolution, so they are never called duplicates
+MIN_DUPLICATE_INK = 0.01
+DHASH_DISTANCE = 6
+PHASH_DISTANCE = 6
+SIGNATURE_SHAPE = (64, 48)
+# A rescan of a sheet correlates at about 0.98; different pages of one layout
+# (a form, a table) can reach 0.91. Flagged pages get deleted, so err towards keeping
+DUPLICATE_CORRELATION = 0.95
+CHUNK_PAGES = 32
+# Documents this short are analysed in-process; a pool costs more than it saves
+INLINE_PAGES = 16
+
+_DCT_SIZE = 32
+_k = np.arange(_DCT_SIZE)
+_DCT = np.cos(np.pi * (2 * _k[None, :] + 1) * _k[:, None] / (2 * _DCT_SIZE)).astype(np.float32)
+
+_open = (None, None)  # (path, document) last opened by this process
+
+
+def _shrink(image, rows, columns):
+    """Area-average `image` down to rows x columns."""
+    row_starts = np.linspace(0, image.shape[0], rows + 1).astype(int)
+    column_starts = np.linspace(0, image.shape[1], columns + 1).astype(int)
+    sums = np.add.reduceat(np.add.reduceat(image, row_starts[:-1], axis=0), column_starts[:-1], axis=1)
+    return sums / np.outer(np.diff(row_starts), np.diff(column_starts))
+
+
+def _hash(bits):
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), "big")
+
+
+def _page_features(page, dpi):
+    pix = page.get_pixmap(matrix=fitz.Matrix(dpi / 72, dpi / 72), colorspace=fitz.csGRAY)
+    image = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width).astype(np.float32)
+    margin = int(min(image.shape) * MARGIN)
+    core = image[margin:image.shape[0] - margin, margin:image.shape[1] - margin]
+    if core.size == 0:
+        core = image
+    paper = np.percentile(core, 95)
+    ink = int(np.count_nonzero(core < paper - INK_CONTRAST)) / core.size
+
+    grid = _shrink(image, 8, 9)
+    dhash = _hash(grid[:, 1:] > grid[:, :-1])
+    coefficients = (_DCT @ _shrink(image, _DCT_SIZE, _DCT_SIZE) @ _DCT.T)[:8, :8].ravel()[1:]  # Without the DC term
+    phash = _hash(coefficients > np.median(coefficients))
+    signature = _shrink(image, *SIGNATURE_SHAPE).astype(np.uint8)
+    return ink, dhash, phash, signature
+
+
+def _normalized(signature):
+    values = signature.ravel().astype(np.float32)
+    values -= values.mean()
+    return values / (np.linalg.norm(values) or 1.0)
+
+
+def _analyze_chunk(task):
+    """Features of pages start..stop-1 of one file; the document stays open for its next chunk."""
+    global _open
+    path, start, stop, dpi = task
+    if _open[0] != path:
+        if _open[1] is not None:
+            _open[1].close()
+        _open = (path, fitz.open(path))
+    doc = _open[1]
+    return [_page_features(doc.load_page(index), dpi) for index in range(start, stop)]
+
+
+def _chunked_features(tasks, workers):
+    """Analyse chunks in a process pool, in order, keeping only a small window in flight."""
+    window = max(2, (workers or os.cpu_count() or 1) * 2)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque((task, pool.submit(_analyze_chunk, task)) for task in itertools.islice(tasks, window))
+        try:
+            while pending:
+                task, future = pending.popleft()
+                for next_task in itertools.islice(tasks, 1):
+                    pending.append((next_task, pool.submit(_analyze_chunk, next_task)))
+                yield task, future.result()
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+
+def _inline_features(tasks):
+    for task in tasks:
+        path, start, stop, dpi = task
+        with sessions.document(path) as doc:
+            yield task, [_page_features(doc.load_page(index), dpi) for index in range(start, stop)]
+
+
+def analyze_pages(file_paths_str, options_json="{}", workers=None):
+    try:
+        file_paths = [path for path in file_paths_str.split(",") if path]
+        if not file_paths or not all(os.path.exists(path) for path in file_paths):
+            return {"success": False, "message": "One or more PDF files do not exist."}
+        try:
+            options = json.loads(options_json or "{}")
+            blank_ink = float(options.get("blankInk", DEFAULT_BLANK_INK))
+            dpi = int(options.get("dpi", ANALYSIS_DPI))
+            find_blanks = bool(options.get("blanks", True))
+            find_duplicates = bool(options.get("duplicates", True))
+        except (ValueError, TypeError, AttributeError) as e:
+            return {"success": False, "message": f"Invalid options: {e}"}
+
+        counts = []
+        for path in file_paths:
+            with sessions.document(path) as doc:
+                if doc.needs_pass:
+                    return {"success": False, "message": f"{os.path.basename(path)} is password protected."}
+                counts.append(doc.page_count)
+        total = sum(counts)
+        progress.count(files=len(file_paths), pages=total)
+        progress.phase("analyze")
+
+        tasks = ((path, start, min(start + CHUNK_PAGES, count), dpi)
+                 for path, count in zip(file_paths, counts) for start in range(0, count, CHUNK_PAGES))
+        if total <= INLINE_PAGES or workers == 1:
+            chunks = _inline_features(tasks)
+        else:
+            chunks = _chunked_features(tasks, workers)
+
+        files = {path: {"file": path, "pageCount": count, "blankPages": [], "duplicatePages": [], "pages": []}
+                 for path, count in zip(file_paths, counts)}
+        # Hashes of the pages later pages are compared against, and where those pages are
+        kept_dhash = np.zeros(total, dtype=np.uint64)
+        kept_phash = np.zeros(total, dtype=np.uint64)
+        kept_at = []
+        kept_signatures = []
+        done = 0
+        for (path, start, _, _), features in chunks:
+            progress.check_cancelled()
+            entry = files[path]
+            for number, (ink, dhash, phash, signature) in enumerate(features, start + 1):
+                entry["pages"].append({"page": number, "ink": round(ink, 5),
+                                       "dhash": f"{dhash:016x}", "phash": f"{phash:016x}"})
+                if ink < blank_ink:
+                    if find_blanks:
+                        entry["blankPages"].append(number)
+                    continue
+                if ink < MIN_DUPLICATE_INK:
+                    continue
+                signature = _normalized(signature)
+                if find_duplicates and kept_at:
+                    count = len(kept_at)
+                    close = (np.bitwise_count(kept_dhash[:count] ^ np.uint64(dhash)) <= DHASH_DISTANCE) & \
+                            (np.bitwise_count(kept_phash[:count] ^ np.uint64(phash)) <= PHASH_DISTANCE)
+                    original = next((int(i) for i in np.flatnonzero(close)
+                                     if float(kept_signatures[i] @ signature) >= DUPLICATE_CORRELATION), None)
+                    if original is not None:
+                        original_path, original_page = kept_at[original]
+                        entry["duplicatePages"].append({"page": number, "of": {"file": original_path, "page": original_page}})
+                        continue
+                kept_dhash[len(kept_at)], kept_phash[len(kept_at)] = dhash, phash
+                kept_at.append((path, number))
+                kept_signatures.append(signature)
+            done += len(features)
+            progress.advance(done, total)
+        chunks.close()
+
+        for entry in files.values():
+            entry["deletePages"] = sorted(entry["blankPages"] + [d["page"] for d in entry["duplicatePages"]])
+        blanks = sum(len(entry["blankPages"]) for entry in files.values())
+        duplicates = sum(len(entry["duplicatePages"]) for entry in files.values())
+        return {
+            "success": True,
+            "files": list(files.values()),
+            "message": f"Found {blanks} blank and {duplicates} duplicate page(s) in {total} pages.",
+        }
+    except Exception as e:
+        return {"success": False, "message": f"An unexpected error occurred: {str(e)}"}
+
+
+def clean_pdf(file_path, output_path, options_json="{}"):
+    """Write `file_path` without its blank and duplicate pages, using organize_pdf."""
+    analysis = analyze_pages(file_path, options_json)
+    if not analysis["success"]:
+        return analysis
+    entry = analysis["files"][0]
+    if len(entry["deletePages"]) == entry["pageCount"]:
+        return {"success": False, "message": "Every page is blank or a duplicate; nothing would be left."}
+    page_order = ",".join(str(page) for page in range(1, entry["pageCount"] + 1))
+    result = organize_pdf.organize_pdf(file_path, page_order, ",".join(map(str, entry["deletePages"])), output_path)
+    if result.get("success"):
+        result["message"] = f"Removed {len(entry['blankPages'])} blank and {len(entry['duplicatePages'])} " \
+                            f"duplicate page(s); saved to {os.path.basename(output_path)}"
+    return {**result, "deletedPages": entry["deletePages"]}
+
+
+if __name__ == "__main__":
+    # The first argument is a comma-joined list of PDFs
+    file_paths_str = sys.argv[1]
+    options_json = sys.argv[2] if len(sys.argv) > 2 else "{}"
+    result = analyze_pages(file_paths_str, options_json)
+    print(json.dumps(result))
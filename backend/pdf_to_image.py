@@ -2,7 +2,8 @@
 import sys
 import os
 import json
-import fitz
+import sessions
+import progress
 
 def pdf_to_image(file_path, output_dir):
     try:
@@ -11,13 +12,18 @@ def pdf_to_image(file_path, output_dir):
         if not os.path.exists(output_dir):
             os.makedirs(output_dir)
 
-        doc = fitz.open(file_path)
         saved = 0
-        for i, page in enumerate(doc):
-            pix = page.get_pixmap(dpi=150) # Using 150 dpi for a good balance of quality and size
-            image_path = os.path.join(output_dir, f"page_{i + 1}.png")
-            pix.save(image_path)
-            saved += 1
+        with sessions.document(file_path) as doc:
+            total = len(doc)
+            progress.count(pages=total, objects=doc.xref_length() - 1)
+            progress.phase("render")
+            for i in range(total):
+                progress.check_cancelled()
+                pix = sessions.render(doc, i, 150) # Using 150 dpi for a good balance of quality and size
+                image_path = os.path.join(output_dir, f"page_{i + 1}.png")
+                pix.save(image_path)
+                saved += 1
+                progress.advance(saved, total)
         
         if saved == 0:
             return {"success": False, "message": "No pages were converted."}
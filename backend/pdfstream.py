@@ -0,0 +1,262 @@
+"""Page-level edits of arbitrarily large PDFs with bounded memory.
+
+Inputs are opened with pikepdf in stream mode: qpdf parses the xref and
+object dictionaries, and stream data is read from the file only while
+it is copied to the output. Pages appended from another document keep
+their stream data in that document's file too, read when the output is
+written, so the source must stay open until then. Memory use therefore
+depends on the number of objects, not on the size of the files.
+
+Stream mode rather than mmap: pages of a mapped file count towards the
+process's resident size for as long as the mapping is alive, so mapping
+a multi-gigabyte input grows RSS to the size of the file.
+
+qpdf writes every object reachable from the catalog, so removing a page
+from the page tree is not enough: outlines, named destinations, links,
+form fields and the structure tree can still reference it, and with it
+its content. keep_pages prunes those references before the document is
+saved.
+"""
+import os
+
+import pikepdf
+from pikepdf import Array, Dictionary, Name
+
+import progress
+
+
+def open_pdf(path):
+    return pikepdf.open(path, access_mode=pikepdf.AccessMode.stream)
+
+
+def save(pdf, output_path, **kwargs):
+    """Write `pdf` next to `output_path` and move it into place once complete."""
+    part_path = output_path + ".part"
+
+    def report(percent):
+        progress.advance(percent, 100, unit="percent")
+
+    try:
+        pdf.save(part_path, progress=report, **kwargs)
+    except BaseException:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        raise
+    os.replace(part_path, output_path)
+
+
+def keep_pages(pdf, indexes):
+    """Make the document's pages `indexes` (0-based, in that order); a repeated page is copied."""
+    pages = list(pdf.pages)
+    chosen = [pages[i] for i in indexes]
+    del pdf.pages[:]
+    pdf.pages.extend(chosen)
+    kept = {page.obj.objgen for page in pdf.pages}
+    dropped = [page for page in pages if page.obj.objgen not in kept]
+    if dropped:
+        _drop_references(pdf, dropped)
+
+
+def append_pages(pdf, other):
+    """Append every page of `other` to `pdf`, with its outline as top-level items after the existing ones."""
+    offset = len(pdf.pages)
+    pdf.pages.extend(other.pages)
+    index = {page.obj.objgen: i for i, page in enumerate(other.pages)}
+    dests, tree = _named_destinations(other)
+
+    def page_of(destination):
+        if isinstance(destination, (pikepdf.String, Name)):
+            name = str(destination)
+            if tree is not None and name in tree:
+                destination = tree[name]
+            elif isinstance(dests, Dictionary):
+                destination = dests.get("/" + name.lstrip("/"))
+        return index.get(_target(destination))
+
+    def copy(item):
+        page = page_of(item.destination)
+        if page is None:
+            page = page_of(_action_target(item.action))
+        copied = pikepdf.OutlineItem(item.title, offset + page if page is not None else None)
+        copied.children.extend(copy(child) for child in item.children)
+        return copied
+
+    with other.open_outline() as source, pdf.open_outline() as outline:
+        outline.root.extend(copy(item) for item in source.root)
+
+
+# --- References to dropped pages ---
+
+def _named_destinations(pdf):
+    """(catalog /Dests dictionary or None, /Names /Dests name tree or None)."""
+    names = pdf.Root.get("/Names")
+    tree = names.get("/Dests") if isinstance(names, Dictionary) else None
+    return pdf.Root.get("/Dests"), pikepdf.NameTree(tree) if isinstance(tree, Dictionary) else None
+
+
+def _target(destination):
+    """objgen of the page an explicit destination (or a dictionary holding one in /D) points at."""
+    if isinstance(destination, Dictionary):
+        destination = destination.get("/D")
+    if isinstance(destination, Array) and len(destination) and isinstance(destination[0], Dictionary):
+        return destination[0].objgen
+    return None
+
+
+def _action_target(action):
+    if isinstance(action, Dictionary) and action.get("/S") == Name.GoTo:
+        return action.get("/D")
+    return None
+
+
+def _goes_to_dropped(destination, dropped, dropped_names):
+    """Whether a destination, explicit or named, leads to a dropped page."""
+    if isinstance(destination, (pikepdf.String, Name)):
+        return str(destination).lstrip("/") in dropped_names
+    return _target(destination) in dropped
+
+
+def _prune_destinations(pdf, dropped):
+    """Remove named destinations of dropped pages; returns their names."""
+    dropped_names = set()
+    dests, tree = _named_destinations(pdf)
+    if isinstance(dests, Dictionary):
+        for key in list(dests.keys()):
+            if _target(dests[key]) in dropped:
+                del dests[key]
+                dropped_names.add(key.lstrip("/"))
+    if tree is not None:
+        for key in [key for key, value in tree.items() if _target(value) in dropped]:
+            del tree[key]
+            dropped_names.add(key)
+    return dropped_names
+
+
+def _prune_outline(items, dropped, dropped_names):
+    """Remove outline items that lead to dropped pages, keeping those with surviving children as headings."""
+    for item in list(items):
+        _prune_outline(item.children, dropped, dropped_names)
+        if _goes_to_dropped(item.destination, dropped, dropped_names) or \
+                _goes_to_dropped(_action_target(item.action), dropped, dropped_names):
+            if item.children:
+                item.destination = None
+                item.action = None
+            else:
+                items.remove(item)
+
+
+def _prune_links(pdf, dropped, dropped_names):
+    """Remove link annotations on the remaining pages that lead to dropped pages."""
+    for page in pdf.pages:
+        annots = page.obj.get("/Annots")
+        if not isinstance(annots, Array):
+            continue
+        keep = [annot for annot in annots
+                if not (isinstance(annot, Dictionary) and annot.get("/Subtype") == Name.Link and
+                        (_goes_to_dropped(annot.get("/Dest"), dropped, dropped_names) or
+                         _goes_to_dropped(_action_target(annot.get("/A")), dropped, dropped_names)))]
+        if len(keep) != len(annots):
+            page.obj.Annots = Array(keep)
+
+
+def _prune_field(field, annots):
+    """Whether a form field still has a widget on a remaining page; drops the kids that don't."""
+    if field.get("/Subtype") == Name.Widget:
+        return field.objgen in annots
+    kids = field.get("/Kids")
+    if not isinstance(kids, Array):
+        return True
+    keep = [kid for kid in kids if isinstance(kid, Dictionary) and _prune_field(kid, annots)]
+    if len(keep) != len(kids):
+        field.Kids = Array(keep)
+    return bool(keep)
+
+
+def _prune_structure(element, dropped, dropped_annots):
+    """Remove the parts of a structure element that belong to dropped pages; False if nothing is left."""
+    kids = element.get("/K")
+    if kids is None:
+        return True
+    single = not isinstance(kids, Array)
+    items = [kids] if single else list(kids)
+    keep = []
+    for kid in items:
+        if isinstance(kid, Dictionary):
+            page = kid.get("/Pg")
+            if isinstance(page, Dictionary) and page.objgen in dropped:
+                continue
+            obj = kid.get("/Obj")
+            if kid.get("/Type") == Name.OBJR and isinstance(obj, Dictionary) and obj.objgen in dropped_annots:
+                continue
+            if kid.get("/Type") not in (Name.MCR, Name.OBJR) and not _prune_structure(kid, dropped, dropped_annots):
+                continue
+        keep.append(kid)
+    if len(keep) != len(items):
+        element.K = keep[0] if single and keep else Array(keep)
+    return bool(keep)
+
+
+def _null_references(pdf, dropped):
+    """Replace what is left of references to dropped pages outside the page tree with null."""
+    stack = [value for key, value in pdf.Root.items() if key != "/Pages"]
+    stack += [page.obj.get("/Annots") for page in pdf.pages]
+    seen = set()
+    while stack:
+        obj = stack.pop()
+        if not isinstance(obj, (Dictionary, Array, pikepdf.Stream)):
+            continue
+        if obj.is_indirect:
+            if obj.objgen in seen:
+                continue
+            seen.add(obj.objgen)
+        if isinstance(obj, Array):
+            entries = list(enumerate(obj))
+        else:
+            if obj.get("/Type") in (Name.Page, Name.Pages):
+                continue
+            entries = list(obj.items())
+        for key, value in entries:
+            if isinstance(value, Dictionary) and value.is_indirect and value.objgen in dropped:
+                obj[key] = None
+            else:
+                stack.append(value)
+
+
+def _annotations(pages):
+    return {annot.objgen for page in pages for annot in page.obj.get("/Annots", ())
+            if isinstance(annot, Dictionary)}
+
+
+def _drop_references(pdf, pages):
+    """Prune everything outside the page tree that still leads to the dropped `pages`."""
+    dropped = {page.obj.objgen for page in pages}
+    dropped_names = _prune_destinations(pdf, dropped)
+    if "/Outlines" in pdf.Root:
+        with pdf.open_outline() as outline:
+            _prune_outline(outline.root, dropped, dropped_names)
+    open_action = pdf.Root.get("/OpenAction")
+    if _goes_to_dropped(open_action, dropped, dropped_names) or \
+            _goes_to_dropped(_action_target(open_action), dropped, dropped_names):
+        del pdf.Root.OpenAction
+    _prune_links(pdf, dropped, dropped_names)
+
+    form = pdf.Root.get("/AcroForm")
+    if isinstance(form, Dictionary) and isinstance(form.get("/Fields"), Array):
+        annots = _annotations(pdf.pages)
+        form.Fields = Array([field for field in form.Fields
+                             if isinstance(field, Dictionary) and _prune_field(field, annots)])
+
+    structure = pdf.Root.get("/StructTreeRoot")
+    if isinstance(structure, Dictionary):
+        _prune_structure(structure, dropped, _annotations(pages))
+        parents = structure.get("/ParentTree")
+        if isinstance(parents, Dictionary):
+            keys = {page.obj.get("/StructParents") for page in pages}
+            keys |= {annot.get("/StructParent") for page in pages for annot in page.obj.get("/Annots", ())
+                     if isinstance(annot, Dictionary)}
+            tree = pikepdf.NumberTree(parents)
+            for key in keys:
+                if key is not None and int(key) in tree:
+                    del tree[int(key)]
+
+    _null_references(pdf, dropped)
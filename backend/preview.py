@@ -1,42 +1,138 @@
 import sys
 import os
-import fitz  # PyMuPDF
 import json
+import logging
+import threading
+from collections import OrderedDict
+
+import sessions
+import progress
+from cache import file_fingerprint
+
+PREVIEW_DPI = 150
+# Pages on each side of the current one that are rendered ahead of time
+PREFETCH_PAGES = int(os.getenv("FORGEPDF_PREFETCH_PAGES", "2"))
+RENDER_CACHE_LIMIT = 64
+
+_render_cache = OrderedDict()  # (fingerprint, page, dpi) -> (png path, page count)
+_render_stats = {"hits": 0, "misses": 0}
+_cache_lock = threading.Lock()
+
+# Neighbouring pages still to render, nearest first. PyMuPDF isn't thread-safe, so
+# they are rendered on the worker's request loop while it has nothing else to do
+_prefetch_queue = []
+_prefetch_enabled = False
+
+
+def _cached_render(fingerprint, page_num, dpi):
+    key = (fingerprint, page_num, dpi)
+    with _cache_lock:
+        entry = _render_cache.get(key)
+        if entry and os.path.exists(entry[0]):
+            _render_cache.move_to_end(key)
+            return entry
+    return None
+
+
+def _render_page(file_path, fingerprint, page_num, dpi, output_dir):
+    """Render one page to a PNG in the render cache and return (path, page count)."""
+    with sessions.document(file_path) as doc:
+        total_pages = len(doc)
+        if not 0 <= page_num < total_pages:
+            raise ValueError(f"Invalid page number: {page_num + 1}. The document has {total_pages} pages.")
+        pix = sessions.render(doc, page_num, dpi)
+    output_path = os.path.join(output_dir, f"preview_{fingerprint[:16]}_{page_num}_{dpi}.png")
+    pix.save(output_path)
+
+    with _cache_lock:
+        _render_cache[(fingerprint, page_num, dpi)] = (output_path, total_pages)
+        while len(_render_cache) > RENDER_CACHE_LIMIT:
+            old_path, _ = _render_cache.popitem(last=False)[1]
+            try:
+                os.remove(old_path)
+            except OSError:
+                pass
+    return output_path, total_pages
+
+
+def _schedule_prefetch(file_path, fingerprint, page_num, total_pages, output_dir):
+    """Queue the neighbours of `page_num`, replacing whatever was still pending."""
+    if not _prefetch_enabled:
+        return
+    tasks = []
+    for distance in range(1, PREFETCH_PAGES + 1):
+        for neighbour in (page_num + distance, page_num - distance):
+            if 0 <= neighbour < total_pages and not _cached_render(fingerprint, neighbour, PREVIEW_DPI):
+                tasks.append((file_path, fingerprint, neighbour, PREVIEW_DPI, output_dir))
+    # Anything still queued belongs to a page the user has moved away from
+    _prefetch_queue[:] = tasks
+
+
+def prefetch_one():
+    """Render the next prefetched page, if any; returns whether there was one.
+
+    Called by the worker between requests, one page at a time, so a request
+    that arrives meanwhile waits for at most one page render.
+    """
+    if not _prefetch_queue:
+        return False
+    file_path, fingerprint, page_num, dpi, output_dir = _prefetch_queue.pop(0)
+    try:
+        if file_fingerprint(file_path) == fingerprint and not _cached_render(fingerprint, page_num, dpi):
+            _render_page(file_path, fingerprint, page_num, dpi, output_dir)
+    except Exception:
+        logging.exception("Failed to prefetch page %d of %s", page_num + 1, file_path)
+    return True
+
+
+def enable_prefetch():
+    """Queue neighbouring pages of each preview for prefetch_one (for the long-lived backend)."""
+    global _prefetch_enabled
+    _prefetch_enabled = PREFETCH_PAGES > 0
+
+
+def render_cache_stats():
+    with _cache_lock:
+        return {"entries": len(_render_cache), **_render_stats}
+
 
 def get_preview(file_path, page_num_str, output_dir):
     try:
         # Check if the file exists and is a valid PDF
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"The file '{os.path.basename(file_path)}' was not found.")
-        
-        doc = fitz.open(file_path)
+
         page_num = int(page_num_str)
-        total_pages = len(doc)
 
         # Generate thumbnails for all pages
         if page_num == -1:
-            file_paths = []
-            for i in range(total_pages):
-                page = doc.load_page(i)
-                # Use a lower DPI for thumbnails to improve performance
-                pix = page.get_pixmap(dpi=96)
-                output_path = os.path.join(output_dir, f"preview_{i}.png")
-                pix.save(output_path)
-                file_paths.append(output_path)
-            doc.close()
+            # The document stays open in the session cache for follow-up operations
+            with sessions.document(file_path) as doc:
+                total_pages = len(doc)
+                progress.count(pages=total_pages, objects=doc.xref_length() - 1)
+                file_paths = []
+                for i in range(total_pages):
+                    progress.check_cancelled()
+                    # Use a lower DPI for thumbnails to improve performance
+                    pix = sessions.render(doc, i, 96)
+                    output_path = os.path.join(output_dir, f"preview_{i}.png")
+                    pix.save(output_path)
+                    file_paths.append(output_path)
+                    progress.advance(i + 1, total_pages)
             return {"success": True, "filePaths": file_paths, "pageCount": total_pages}
-        
-        # Generate a single high-quality preview
+
+        # Generate a single high-quality preview, unless it was already prefetched. Pages go to the
+        # app as PNG files: the renderer can't map the backend's memory, so unencoded pixels would
+        # be copied through IPC, and a PNG is a fraction of their size
         else:
-            if not 0 <= page_num < total_pages:
-                raise ValueError(f"Invalid page number: {page_num + 1}. The document has {total_pages} pages.")
-            
-            page = doc.load_page(page_num)
-            # Use a higher DPI for single page previews
-            pix = page.get_pixmap(dpi=150)
-            output_path = os.path.join(output_dir, "preview_page.png")
-            pix.save(output_path)
-            doc.close()
+            fingerprint = file_fingerprint(file_path)
+            cached = _cached_render(fingerprint, page_num, PREVIEW_DPI)
+            with _cache_lock:
+                _render_stats["hits" if cached else "misses"] += 1
+            output_path, total_pages = cached or _render_page(
+                file_path, fingerprint, page_num, PREVIEW_DPI, output_dir
+            )
+            _schedule_prefetch(file_path, fingerprint, page_num, total_pages, output_dir)
             return {"success": True, "filePath": output_path, "pageCount": total_pages}
 
     except Exception as e:
@@ -53,4 +149,4 @@ if __name__ == "__main__":
         page_num = sys.argv[2]
         output_dir = sys.argv[3]
         result = get_preview(file_path, page_num, output_dir)
-        print(json.dumps(result))
\ No newline at end of file
+        print(json.dumps(result))
@@ -0,0 +1,111 @@
+import os
+import sys
+import json
+import time
+import threading
+import contextvars
+
+# Progress events are rate-limited per job; phase changes always go out
+MIN_PROGRESS_INTERVAL = 0.1
+
+
+class JobCancelled(BaseException):
+    """Raised inside an operation when its job was cancelled.
+
+    Derives from BaseException (like KeyboardInterrupt) so the operations'
+    own `except Exception` handlers don't turn it into an ordinary error.
+    """
+
+
+class Job:
+    """Event sink and cancellation flag for one running operation."""
+
+    def __init__(self, emit):
+        self._emit = emit
+        self._listeners = []
+        self._cancelled = threading.Event()
+        self._last_progress = 0.0
+
+    def emit(self, event_type, **fields):
+        event = {"type": event_type, "time": time.time(), **fields}
+        self._emit(event)
+        for listener in self._listeners:
+            listener(event)
+
+    def watch(self, listener):
+        """Also pass every event of this job to `listener` (e.g. a diagnostics recorder)."""
+        self._listeners.append(listener)
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def phase(self, name):
+        self.emit("phase", phase=name)
+
+    def count(self, **counts):
+        self.emit("counts", **counts)
+
+    def advance(self, done, total=None, unit="page"):
+        now = time.monotonic()
+        if total is not None and done >= total or now - self._last_progress >= MIN_PROGRESS_INTERVAL:
+            self._last_progress = now
+            self.emit("progress", done=done, total=total, unit=unit)
+
+
+class _NullJob(Job):
+    def __init__(self):
+        super().__init__(lambda event: None)
+
+
+def _stderr_job():
+    """CLI runs report events on stderr (stdout carries the JSON result) when asked to."""
+    lock = threading.Lock()
+
+    def emit(event):
+        with lock:
+            sys.stderr.write(json.dumps(event) + "\n")
+            sys.stderr.flush()
+    return Job(emit)
+
+
+_current = contextvars.ContextVar(
+    "forgepdf_job", default=_stderr_job() if os.getenv("FORGEPDF_EVENTS") == "1" else _NullJob()
+)
+
+
+def current():
+    return _current.get()
+
+
+def run(job, fn, *args, **kwargs):
+    """Call fn with `job` as the current job for every progress call it makes."""
+    token = _current.set(job)
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        _current.reset(token)
+
+
+def phase(name):
+    """Announce that the current operation entered a new phase (e.g. "open", "save")."""
+    _current.get().phase(name)
+
+
+def count(**counts):
+    """Report sizes of what the current operation works on, e.g. count(pages=12, objects=480)."""
+    _current.get().count(**counts)
+
+
+def advance(done, total=None, unit="page"):
+    """Report that `done` of `total` units are finished."""
+    _current.get().advance(done, total, unit)
+
+
+def check_cancelled():
+    """Raise JobCancelled if the current job was cancelled. Call between units of work."""
+    if _current.get().cancelled:
+        raise JobCancelled()
@@ -1,8 +1,14 @@
 import sys, json, pikepdf
+import pdfstream
+import progress
 def protect_pdf(in_path, out_path, password):
     try:
-        with pikepdf.Pdf.open(in_path) as pdf:
-            pdf.save(out_path, encryption=pikepdf.Encryption(owner=password, user=password, R=6))
+        progress.phase("open")
+        with pdfstream.open_pdf(in_path) as pdf:
+            progress.count(pages=len(pdf.pages), objects=len(pdf.objects))
+            progress.check_cancelled()
+            progress.phase("encrypt")
+            pdfstream.save(pdf, out_path, encryption=pikepdf.Encryption(owner=password, user=password, R=6))
         return {"success": True, "message": "PDF successfully protected."}
     except Exception as e: return {"success": False, "message": f"Error: {e}"}
 if __name__ == "__main__": print(json.dumps(protect_pdf(sys.argv[1], sys.argv[2], sys.argv[3])))
@@ -1,29 +1,32 @@
 import sys
 import os
 import json
-from PyPDF2 import PdfReader, PdfWriter
+import memo
+import pdfstream
+import progress
 
+@memo.memoize(inputs="file_path", output="output_path")
 def rotate_pdf(file_path, rotations_json_str, output_path):
     try:
         # Load the JSON string into a Python dictionary
         # The keys will be page numbers (as strings), and values will be rotation angles
         rotations = json.loads(rotations_json_str)
         
-        reader = PdfReader(file_path)
-        writer = PdfWriter()
+        progress.phase("read")
+        with pdfstream.open_pdf(file_path) as pdf:
+            progress.count(pages=len(pdf.pages))
+            for i, page in enumerate(pdf.pages):
+                page_num_str = str(i + 1)
+                # Check if this page needs rotation
+                if page_num_str in rotations:
+                    angle = int(rotations[page_num_str])
+                    # Add to any existing rotation
+                    page.rotate(angle, relative=True)
 
-        for i, page in enumerate(reader.pages):
-            page_num_str = str(i + 1)
-            # Check if this page needs rotation
-            if page_num_str in rotations:
-                angle = int(rotations[page_num_str])
-                # The rotate() method adds to any existing rotation
-                page.rotate(angle)
-            writer.add_page(page)
+            progress.check_cancelled()
+            progress.phase("write")
+            pdfstream.save(pdf, output_path)
 
-        with open(output_path, 'wb') as f:
-            writer.write(f)
-            
         return {"success": True, "message": f"Successfully rotated pages and saved to {os.path.basename(output_path)}"}
 
     except Exception as e:
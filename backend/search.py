@@ -0,0 +1,217 @@
+import os
+import re
+import sys
+import json
+import zlib
+import sqlite3
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+
+import fitz
+
+from cache import cache_dir
+from text_index import iter_page_spans
+
+_TOKEN_RE = re.compile(r"\w+\*?", re.UNICODE)
+_COMMIT_EVERY = 200  # documents per transaction while indexing
+
+
+def _default_db():
+    return os.path.join(cache_dir("search"), "library.sqlite")
+
+
+def _connect(db_path):
+    db = sqlite3.connect(db_path or _default_db())
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    db.executescript("""
+        CREATE TABLE IF NOT EXISTS documents (
+            id INTEGER PRIMARY KEY,
+            path TEXT UNIQUE NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            size INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS pages (
+            id INTEGER PRIMARY KEY,
+            doc_id INTEGER NOT NULL REFERENCES documents(id),
+            page INTEGER NOT NULL,
+            text TEXT NOT NULL,
+            spans BLOB NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS pages_doc ON pages(doc_id);
+        CREATE VIRTUAL TABLE IF NOT EXISTS page_text USING fts5(
+            text, content='pages', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+        );
+        CREATE TRIGGER IF NOT EXISTS pages_ai AFTER INSERT ON pages BEGIN
+            INSERT INTO page_text(rowid, text) VALUES (new.id, new.text);
+        END;
+        CREATE TRIGGER IF NOT EXISTS pages_ad AFTER DELETE ON pages BEGIN
+            INSERT INTO page_text(page_text, rowid, text) VALUES ('delete', old.id, old.text);
+        END;
+    """)
+    return db
+
+
+def _collect_pdfs(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                for name in sorted(names):
+                    if name.lower().endswith(".pdf"):
+                        yield os.path.abspath(os.path.join(root, name))
+        elif path.lower().endswith(".pdf") and os.path.isfile(path):
+            yield os.path.abspath(path)
+
+
+def _extract_document(path):
+    """Worker: pull page text and compact span boxes out of one PDF."""
+    pages = []
+    try:
+        with fitz.open(path) as doc:
+            for page_index, page in enumerate(doc):
+                spans = [
+                    [text, round(x0, 1), round(y0, 1), round(x1, 1), round(y1, 1)]
+                    for text, (x0, y0, x1, y1), _, _, _ in iter_page_spans(page)
+                    if text.strip()
+                ]
+                text = "\n".join(span[0] for span in spans)
+                pages.append((page_index + 1, text, zlib.compress(json.dumps(spans).encode("utf-8"))))
+        return path, pages, None
+    except Exception as e:
+        return path, [], str(e)
+
+
+def _remove_document(db, doc_id):
+    db.execute("DELETE FROM pages WHERE doc_id = ?", (doc_id,))
+    db.execute("DELETE FROM documents WHERE id = ?", (doc_id,))
+
+
+def index_library(paths, db_path=None, workers=None):
+    """Index (or re-index) every PDF under `paths`. Unchanged files are skipped by size and mtime."""
+    try:
+        db = _connect(db_path)
+        known = {path: (doc_id, mtime, size) for doc_id, path, mtime, size
+                 in db.execute("SELECT id, path, mtime_ns, size FROM documents")}
+
+        stale, seen = [], set()
+        for path in _collect_pdfs(paths):
+            seen.add(path)
+            st = os.stat(path)
+            entry = known.get(path)
+            if entry is None or entry[1:] != (st.st_mtime_ns, st.st_size):
+                stale.append((path, st.st_mtime_ns, st.st_size))
+
+        # Drop documents that were deleted from disk since the last run
+        removed = 0
+        with db:
+            for path, (doc_id, _, _) in known.items():
+                if path not in seen and not os.path.exists(path):
+                    _remove_document(db, doc_id)
+                    removed += 1
+
+        stat_by_path = {path: (mtime, size) for path, mtime, size in stale}
+        indexed, failed = 0, []
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(_extract_document, [p for p, _, _ in stale], chunksize=8)
+            db.execute("BEGIN")
+            for count, (path, pages, error) in enumerate(results, 1):
+                if error:
+                    failed.append({"file": path, "message": error})
+                    continue
+                if path in known:
+                    _remove_document(db, known[path][0])
+                mtime, size = stat_by_path[path]
+                doc_id = db.execute(
+                    "INSERT INTO documents (path, mtime_ns, size) VALUES (?, ?, ?)", (path, mtime, size)
+                ).lastrowid
+                db.executemany(
+                    "INSERT INTO pages (doc_id, page, text, spans) VALUES (?, ?, ?, ?)",
+                    [(doc_id, page, text, spans) for page, text, spans in pages],
+                )
+                indexed += 1
+                if count % _COMMIT_EVERY == 0:
+                    db.execute("COMMIT")
+                    db.execute("BEGIN")
+            db.execute("COMMIT")
+        db.close()
+        return {
+            "success": True,
+            "message": f"Indexed {indexed} documents ({len(seen) - len(stale)} unchanged, {removed} removed).",
+            "indexed": indexed,
+            "removed": removed,
+            "failed": failed,
+        }
+    except Exception as e:
+        return {"success": False, "message": f"Error indexing documents: {e}"}
+
+
+def _fts_query(query):
+    """Turn free text into an FTS5 query: every word must match, `word*` is a prefix search."""
+    terms = []
+    for token in _TOKEN_RE.findall(query):
+        word = token.rstrip("*").replace('"', "")
+        if word:
+            terms.append(f'"{word}"' + ("*" if token.endswith("*") else ""))
+    return " ".join(terms)
+
+
+def _fold(text):
+    """Lower-case and strip diacritics, mirroring the FTS tokenizer."""
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+
+def _hit_boxes(spans, words):
+    """Approximate the bbox of each word occurrence inside the stored spans."""
+    boxes = []
+    for text, x0, y0, x1, y1 in spans:
+        lowered = _fold(text)
+        char_width = (x1 - x0) / len(text) if text else 0
+        for word in words:
+            start = lowered.find(word)
+            while start != -1:
+                end = start + len(word)
+                boxes.append([round(x0 + start * char_width, 1), y0, round(x0 + end * char_width, 1), y1])
+                start = lowered.find(word, end)
+    return boxes
+
+
+def search(query, db_path=None, limit=50):
+    """Search the library index. Each hit carries the file, the page (1-based) and highlight boxes."""
+    try:
+        fts = _fts_query(query)
+        if not fts:
+            return {"success": False, "message": "Please enter a search term."}
+        words = [_fold(t.rstrip("*")) for t in _TOKEN_RE.findall(query)]
+        db = _connect(db_path)
+        rows = db.execute(
+            "SELECT d.path, p.page, p.spans, snippet(page_text, 0, '[', ']', '…', 12) "
+            "FROM page_text JOIN pages p ON p.id = page_text.rowid JOIN documents d ON d.id = p.doc_id "
+            "WHERE page_text MATCH ? ORDER BY bm25(page_text) LIMIT ?",
+            (fts, int(limit)),
+        ).fetchall()
+        db.close()
+        hits = [
+            {
+                "file": path,
+                "page": page,
+                "bboxes": _hit_boxes(json.loads(zlib.decompress(spans)), words),
+                "snippet": snippet,
+            }
+            for path, page, spans, snippet in rows
+        ]
+        return {"success": True, "hits": hits}
+    except Exception as e:
+        return {"success": False, "message": f"Error searching documents: {e}"}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print(json.dumps({"success": False, "message": "Insufficient arguments"}))
+    elif sys.argv[1] == "index":
+        print(json.dumps(index_library(sys.argv[2:])))
+    elif sys.argv[1] == "query":
+        limit = int(sys.argv[3]) if len(sys.argv) > 3 else 50
+        print(json.dumps(search(sys.argv[2], limit=limit)))
+    else:
+        print(json.dumps({"success": False, "message": "Invalid operation"}))
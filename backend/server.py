@@ -0,0 +1,438 @@
+"""HTTP service exposing the backend operations, for server deployments.
+
+    python server.py [--host 127.0.0.1] [--port 8765] [--workers N] [--queue 64]
+
+Files are uploaded first, then referenced by id in jobs. Jobs use the
+same fields as the batch manifest (see forgepdf.py), with file ids in
+place of input paths; output locations are chosen by the server. Uploads
+are recognised by their content (PDF, PNG, JPEG or TIFF), so no file name
+is needed.
+
+    PUT    /files                  raw request body -> 201 {"id": "...", "size": n}
+    POST   /jobs                   {"op": "compress", "input": "<file id>"} -> 202 {"id": "...", "state": "queued"}
+    GET    /jobs/<id>              state: queued | running | done | failed, plus the operation's result
+    GET    /jobs/<id>/result       the output PDF, a zip for operations that write a folder, or the
+                                   JSON result for those that only report (compare, analyze of "inputs")
+    DELETE /jobs/<id>, /files/<id>
+    GET    /health, /metrics
+
+Uploads and downloads are streamed to and from temp files in chunks, so
+request size doesn't translate into memory use. Jobs wait in a bounded
+queue in front of a process pool; when it is full, POST /jobs answers
+503 with Retry-After and clients should back off. Finished jobs and
+uploads are deleted after FORGEPDF_SERVER_TTL seconds, except uploads
+that queued or running jobs still use.
+
+If a pool process dies (a crash in native code, an OOM kill), the pool
+is replaced and the jobs it was running are run again, each in a process
+of its own; only the job that kills that one fails.
+
+The server has no authentication and binds to localhost by default; put
+it behind a proxy that handles access control before exposing it.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import shutil
+import signal
+import asyncio
+import zipfile
+import logging
+import argparse
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import forgepdf
+import metrics
+
+CHUNK_SIZE = 256 * 1024
+MAX_UPLOAD_BYTES = int(os.getenv("FORGEPDF_SERVER_MAX_UPLOAD_MB", "512")) * 1024 * 1024
+TTL_SECONDS = float(os.getenv("FORGEPDF_SERVER_TTL", "3600"))
+MAX_HEADER_BYTES = 16 * 1024
+
+# Job fields that name uploaded files
+_INPUT_FIELDS = ("input", "inputs", "images")
+# Uploads are stored under the extension their content calls for: operations pick inputs by it
+_SIGNATURES = ((b"%PDF-", ".pdf"), (b"\x89PNG\r\n\x1a\n", ".png"), (b"\xff\xd8\xff", ".jpg"),
+               (b"II*\x00", ".tif"), (b"MM\x00*", ".tif"))
+_REASONS = {200: "OK", 201: "Created", 202: "Accepted", 204: "No Content", 400: "Bad Request",
+            404: "Not Found", 405: "Method Not Allowed", 409: "Conflict", 411: "Length Required",
+            413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class HttpError(Exception):
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+def _run_and_package(job):
+    """Pool side: run the job, then zip folder outputs so they download as one file."""
+    result = forgepdf.run_job(job, details=True)
+    out_dir = job.get("outputDir")
+    if result["success"] and out_dir:
+        archive = out_dir.rstrip(os.sep) + ".zip"
+        with zipfile.ZipFile(archive, "w", zipfile.ZIP_STORED) as zf:  # Output is PNG/PDF: already compressed
+            for name in sorted(os.listdir(out_dir)):
+                zf.write(os.path.join(out_dir, name), name)
+        shutil.rmtree(out_dir, ignore_errors=True)
+        result["download"] = archive
+    elif result["success"] and job.get("output"):
+        result["download"] = job["output"]
+    return result
+
+
+class Service:
+    def __init__(self, root, workers=None, queue_limit=64):
+        self.root = root
+        self.files = {}  # id -> {"path", "size", "created"}
+        self.jobs = {}  # id -> {"op", "state", "result", "dir", "files", "created", "finished"}
+        self.queue = asyncio.Queue(maxsize=queue_limit)
+        self.workers = workers or os.cpu_count() or 1
+        self.pool = self._new_pool()
+        self.running = 0
+        os.makedirs(os.path.join(root, "files"), exist_ok=True)
+        os.makedirs(os.path.join(root, "jobs"), exist_ok=True)
+
+    def _new_pool(self, workers=None):
+        return ProcessPoolExecutor(max_workers=workers or self.workers, initializer=forgepdf.init_worker)
+
+    def _replace_pool(self, broken):
+        # Every dispatcher whose job was in the broken pool gets here; the first one replaces it
+        if self.pool is broken:
+            logging.warning("A worker process died; restarting the pool")
+            broken.shutdown(wait=False, cancel_futures=True)
+            self.pool = self._new_pool()
+
+    async def _run_alone(self, job):
+        """Run a job that was in flight when a pool process died in a process of its own."""
+        pool = self._new_pool(1)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(pool, _run_and_package, job)
+        except BrokenProcessPool:
+            return {"success": False, "message": "The process running this job died (a crash or an out-of-memory kill)."}
+        finally:
+            pool.shutdown(wait=False)
+
+    # --- Files ---
+
+    async def upload(self, reader, length):
+        if length is None:
+            raise HttpError(411, "Uploads need a Content-Length.")
+        if length > MAX_UPLOAD_BYTES:
+            raise HttpError(413, f"Uploads are limited to {MAX_UPLOAD_BYTES // (1024 * 1024)} MB.")
+        file_id = uuid.uuid4().hex
+        head = await reader.read(min(CHUNK_SIZE, length)) if length else b""
+        while len(head) < min(8, length):
+            more = await reader.read(min(CHUNK_SIZE, length - len(head)))
+            if not more:
+                raise HttpError(400, "The upload ended early.")
+            head += more
+        extension = next((ext for signature, ext in _SIGNATURES if head.startswith(signature)), "")
+        path = os.path.join(self.root, "files", file_id + extension)
+        remaining = length - len(head)
+        try:
+            with open(path, "wb") as f:
+                f.write(head)
+                while remaining:
+                    chunk = await reader.read(min(CHUNK_SIZE, remaining))
+                    if not chunk:
+                        raise HttpError(400, "The upload ended early.")
+                    f.write(chunk)
+                    remaining -= len(chunk)
+        except BaseException:
+            os.remove(path)
+            raise
+        self.files[file_id] = {"path": path, "size": length, "created": time.time()}
+        return {"id": file_id, "size": length}
+
+    def files_in_use(self):
+        return {file_id for entry in self.jobs.values() if entry["state"] in ("queued", "running")
+                for file_id in entry["files"]}
+
+    def delete_file(self, file_id):
+        if file_id not in self.files:
+            raise HttpError(404, "No such file.")
+        if file_id in self.files_in_use():
+            raise HttpError(409, "The file is used by a queued or running job.")
+        os.remove(self.files.pop(file_id)["path"])
+
+    # --- Jobs ---
+
+    def submit(self, spec):
+        if not isinstance(spec, dict) or spec.get("op") not in forgepdf.OPERATIONS:
+            raise HttpError(400, f"Unknown operation. Available: {', '.join(forgepdf.OPERATIONS)}")
+        job_id = uuid.uuid4().hex
+        job_dir = os.path.join(self.root, "jobs", job_id)
+        job = {key: value for key, value in spec.items() if key not in ("output", "outputDir")}
+        file_ids = set()
+        for field in _INPUT_FIELDS:
+            if field in job:
+                ids = job[field] if isinstance(job[field], list) else [job[field]]
+                missing = [i for i in ids if i not in self.files]
+                if missing:
+                    raise HttpError(400, f"Unknown file id(s) in '{field}': {', '.join(map(str, missing))}")
+                file_ids.update(ids)
+                paths = [self.files[i]["path"] for i in ids]
+                job[field] = paths if isinstance(job[field], list) else paths[0]
+        # Operations that write a folder of images, those that only report, and the rest, which write one PDF
+        if job["op"] == "preview" or (job["op"] == "convert" and "images" not in job):
+            job["outputDir"] = os.path.join(job_dir, "output")
+        elif job["op"] == "compare" or (job["op"] == "analyze" and "input" not in job):
+            pass
+        else:
+            job["output"] = os.path.join(job_dir, "output.pdf")
+        job["id"] = job_id
+
+        try:
+            self.queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise HttpError(503, "The job queue is full; retry later.", {"Retry-After": "1"})
+        os.makedirs(job_dir)
+        self.jobs[job_id] = {"op": job["op"], "state": "queued", "result": None, "dir": job_dir,
+                             "files": file_ids, "created": time.time(), "finished": None}
+        metrics.QUEUE_DEPTH.set(value=self.queue.qsize())
+        return {"id": job_id, "state": "queued"}
+
+    def job(self, job_id):
+        entry = self.jobs.get(job_id)
+        if entry is None:
+            raise HttpError(404, "No such job.")
+        return entry
+
+    def describe(self, job_id):
+        entry = self.job(job_id)
+        result = dict(entry["result"] or {})
+        result.pop("download", None)
+        return {"id": job_id, "op": entry["op"], "state": entry["state"], "result": result or None}
+
+    def delete_job(self, job_id):
+        entry = self.jobs.pop(job_id, None)
+        if entry is None:
+            raise HttpError(404, "No such job.")
+        if entry["state"] in ("done", "failed"):
+            shutil.rmtree(entry["dir"], ignore_errors=True)
+        else:
+            entry["discard"] = True  # Removed by its dispatcher once it finishes
+
+    async def dispatch(self):
+        """One of `workers` loops feeding queued jobs to the process pool."""
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self.queue.get()
+            metrics.QUEUE_DEPTH.set(value=self.queue.qsize())
+            entry = self.jobs.get(job["id"])
+            if entry is None:  # Deleted while queued
+                shutil.rmtree(os.path.join(self.root, "jobs", job["id"]), ignore_errors=True)
+                continue
+            entry["state"] = "running"
+            self.running += 1
+            metrics.IN_PROGRESS.set(value=self.running)
+            start = time.perf_counter()
+            pool = self.pool
+            try:
+                try:
+                    result = await loop.run_in_executor(pool, _run_and_package, job)
+                except BrokenProcessPool:
+                    # The job may be innocent: the process that died could have been running another one
+                    self._replace_pool(pool)
+                    result = await self._run_alone(job)
+            except Exception as e:
+                logging.exception("Job %s crashed", job["id"])
+                result = {"success": False, "message": f"An unexpected error occurred: {e}"}
+            finally:
+                self.running -= 1
+                metrics.IN_PROGRESS.set(value=self.running)
+            metrics.JOBS.inc(job["op"], "success" if result["success"] else "failure")
+            metrics.LATENCY.observe(job["op"], value=time.perf_counter() - start)
+            entry.update(state="done" if result["success"] else "failed", result=result, finished=time.time())
+            if entry.get("discard"):
+                shutil.rmtree(entry["dir"], ignore_errors=True)
+
+    async def expire(self):
+        """Delete finished jobs and uploads older than the TTL."""
+        while True:
+            await asyncio.sleep(min(60, TTL_SECONDS))
+            cutoff = time.time() - TTL_SECONDS
+            for job_id, entry in list(self.jobs.items()):
+                if entry["state"] in ("done", "failed") and entry["finished"] < cutoff:
+                    self.delete_job(job_id)
+            in_use = self.files_in_use()
+            for file_id, entry in list(self.files.items()):
+                if entry["created"] < cutoff and file_id not in in_use:
+                    self.delete_file(file_id)
+
+    def health(self):
+        return {"success": True, "queued": self.queue.qsize(), "running": self.running,
+                "workers": self.workers, "jobs": len(self.jobs), "files": len(self.files)}
+
+
+# --- HTTP ---
+
+async def _read_request(reader):
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError:
+        return None  # Client closed the connection
+    except asyncio.LimitOverrunError:
+        raise HttpError(400, "Request headers are too large.")
+    lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, target, version = lines[0].split(" ", 2)
+    except ValueError:
+        raise HttpError(400, "Malformed request line.")
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        raise HttpError(411, "Chunked uploads are not supported; send a Content-Length.")
+    length = int(headers["content-length"]) if "content-length" in headers else None
+    return method.upper(), target.split("?", 1)[0], version, headers, length
+
+
+async def _read_json(reader, length):
+    if not length:
+        raise HttpError(400, "Expected a JSON body.")
+    if length > 1024 * 1024:
+        raise HttpError(413, "JSON bodies are limited to 1 MB.")
+    try:
+        return json.loads(await reader.readexactly(length))
+    except ValueError as e:
+        raise HttpError(400, f"Invalid JSON: {e}")
+
+
+async def _send(writer, status, body=b"", content_type="application/json", headers=None, keep_alive=True):
+    lines = [f"HTTP/1.1 {status} {_REASONS.get(status, '')}",
+             f"Content-Length: {len(body)}",
+             f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+    if body:
+        lines.append(f"Content-Type: {content_type}")
+    lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+    await writer.drain()
+
+
+async def _send_json(writer, status, payload, **kwargs):
+    await _send(writer, status, json.dumps(payload).encode("utf-8"), **kwargs)
+
+
+async def _send_file(writer, path, content_type, filename, keep_alive=True):
+    size = os.path.getsize(path)
+    writer.write((
+        f"HTTP/1.1 200 OK\r\nContent-Length: {size}\r\nContent-Type: {content_type}\r\n"
+        f"Content-Disposition: attachment; filename=\"{filename}\"\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    ).encode("latin-1"))
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            writer.write(chunk)
+            await writer.drain()
+
+
+async def _route(service, method, path, reader, writer, length, keep_alive):
+    parts = [p for p in path.split("/") if p]
+    if parts == ["health"] and method == "GET":
+        return await _send_json(writer, 200, service.health(), keep_alive=keep_alive)
+    if parts == ["metrics"] and method == "GET":
+        return await _send(writer, 200, metrics.render().encode("utf-8"),
+                           "text/plain; version=0.0.4; charset=utf-8", keep_alive=keep_alive)
+    if parts == ["files"] and method in ("PUT", "POST"):
+        return await _send_json(writer, 201, await service.upload(reader, length), keep_alive=keep_alive)
+    if len(parts) == 2 and parts[0] == "files" and method == "DELETE":
+        service.delete_file(parts[1])
+        return await _send(writer, 204, keep_alive=keep_alive)
+    if parts == ["jobs"] and method == "POST":
+        spec = await _read_json(reader, length)
+        return await _send_json(writer, 202, service.submit(spec), keep_alive=keep_alive)
+    if len(parts) == 2 and parts[0] == "jobs":
+        if method == "GET":
+            return await _send_json(writer, 200, service.describe(parts[1]), keep_alive=keep_alive)
+        if method == "DELETE":
+            service.delete_job(parts[1])
+            return await _send(writer, 204, keep_alive=keep_alive)
+    if len(parts) == 3 and parts[0] == "jobs" and parts[2] == "result" and method == "GET":
+        entry = service.job(parts[1])
+        if entry["state"] != "done":
+            raise HttpError(409, f"The job is {entry['state']}.")
+        download = entry["result"].get("download")
+        if download is None:
+            # Nothing was written: the result is the report
+            return await _send_json(writer, 200, service.describe(parts[1])["result"], keep_alive=keep_alive)
+        zipped = download.endswith(".zip")
+        return await _send_file(writer, download, "application/zip" if zipped else "application/pdf",
+                                f"{entry['op']}_{parts[1][:8]}{'.zip' if zipped else '.pdf'}", keep_alive)
+    raise HttpError(404 if method in ("GET", "POST", "PUT", "DELETE") else 405, "Not found.")
+
+
+async def _handle_connection(service, reader, writer):
+    try:
+        while True:
+            try:
+                request = await _read_request(reader)
+                if request is None:
+                    break
+                method, path, version, headers, length = request
+                keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+                await _route(service, method, path, reader, writer, length, keep_alive)
+                if not keep_alive:
+                    break
+            except HttpError as e:
+                # The body may be unread, so the connection can't be reused
+                await _send_json(writer, e.status, {"success": False, "message": str(e)},
+                                 headers=e.headers, keep_alive=False)
+                break
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    except Exception:
+        logging.exception("Request failed")
+        try:
+            await _send_json(writer, 500, {"success": False, "message": "Internal server error."}, keep_alive=False)
+        except ConnectionError:
+            pass
+    finally:
+        writer.close()
+
+
+async def serve(host, port, workers=None, queue_limit=64):
+    root = tempfile.mkdtemp(prefix="forgepdf_server_")
+    service = Service(root, workers, queue_limit)
+    tasks = [asyncio.create_task(service.dispatch()) for _ in range(service.workers)]
+    tasks.append(asyncio.create_task(service.expire()))
+    server = await asyncio.start_server(
+        lambda r, w: _handle_connection(service, r, w), host, port, limit=MAX_HEADER_BYTES)
+    logging.info("Serving on http://%s:%d with %d worker(s)", host, port, service.workers)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        for task in tasks:
+            task.cancel()
+        service.pool.shutdown(cancel_futures=True)
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve ForgePDF operations over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, help="worker processes (default: one per CPU)")
+    parser.add_argument("--queue", type=int, default=64, help="jobs allowed to wait before POST /jobs gets 503")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    # Stop on SIGTERM like on Ctrl+C, so temp files get removed
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, args.queue))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+import os
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import fitz
+from PyPDF2 import PdfReader
+
+# Upper bound for documents kept open between operations. The cost of an
+# entry is estimated from the file size, since neither library reports
+# its real footprint.
+CACHE_LIMIT_BYTES = int(os.getenv("FORGEPDF_SESSION_CACHE_MB", "512")) * 1024 * 1024
+# Number of recently rendered pages whose display lists are kept
+DISPLAY_LIST_LIMIT = int(os.getenv("FORGEPDF_DISPLAY_LIST_PAGES", "32"))
+
+
+class _Session:
+    def __init__(self, handle, cost):
+        self.handle = handle
+        self.cost = cost
+        self.lock = threading.RLock()
+        self.users = 0
+
+
+_sessions = OrderedDict()  # (kind, realpath, size, mtime_ns) -> _Session
+_lock = threading.Lock()
+_display_lists = OrderedDict()  # (id(doc), page_index) -> fitz.DisplayList
+_stats = {"hits": 0, "misses": 0, "display_list_hits": 0, "display_list_misses": 0}
+
+
+def _close(kind, session):
+    try:
+        if kind == "fitz":
+            # Display lists reference the document's resources; drop them first
+            for key in [k for k in _display_lists if k[0] == id(session.handle)]:
+                del _display_lists[key]
+            session.handle.close()
+        else:
+            session.handle.stream.close()
+    except Exception:
+        logging.exception("Failed to close cached document")
+
+
+def _evict(limit):
+    """Close least recently used, idle sessions until the cache fits in `limit`."""
+    total = sum(s.cost for s in _sessions.values())
+    for key in list(_sessions):
+        if total <= limit:
+            break
+        session = _sessions[key]
+        if session.users:
+            continue
+        del _sessions[key]
+        total -= session.cost
+        _close(key[0], session)
+
+
+@contextmanager
+def _borrow(kind, path, opener, cost_factor):
+    st = os.stat(path)
+    realpath = os.path.realpath(path)
+    key = (kind, realpath, st.st_size, st.st_mtime_ns)
+    with _lock:
+        session = _sessions.get(key)
+        if session is None:
+            _stats["misses"] += 1
+            # Any entry for an older version of the same file is stale now
+            for old in [k for k in _sessions if k[:2] == key[:2] and not _sessions[k].users]:
+                _close(old[0], _sessions.pop(old))
+            session = _Session(opener(path), st.st_size * cost_factor)
+            _sessions[key] = session
+        else:
+            _stats["hits"] += 1
+            _sessions.move_to_end(key)
+        session.users += 1
+    try:
+        with session.lock:
+            yield session.handle
+    finally:
+        with _lock:
+            session.users -= 1
+            _evict(CACHE_LIMIT_BYTES)
+
+
+def document(path):
+    """Borrow the shared, read-only PyMuPDF document for `path`.
+
+    Callers must not modify or close it. Use fitz.open directly for
+    operations that edit the document.
+    """
+    return _borrow("fitz", path, fitz.open, 1)
+
+
+def _open_reader(path):
+    # Given a path PyPDF2 reads the whole file into memory; given a file it reads what it needs
+    return PdfReader(open(path, "rb"))
+
+
+def reader(path):
+    """Borrow the shared PyPDF2 reader for `path` (parsed objects stay cached in it)."""
+    return _borrow("pypdf", path, _open_reader, 1)
+
+
+def display_list(doc, page_index):
+    """Return the cached display list of a page of a borrowed document.
+
+    The content stream is interpreted once; later renders at any
+    resolution or clip replay the list.
+    """
+    key = (id(doc), page_index)
+    with _lock:
+        dl = _display_lists.get(key)
+        if dl is not None:
+            _stats["display_list_hits"] += 1
+            _display_lists.move_to_end(key)
+            return dl
+        _stats["display_list_misses"] += 1
+    dl = doc.load_page(page_index).get_displaylist()
+    with _lock:
+        _display_lists[key] = dl
+        while len(_display_lists) > DISPLAY_LIST_LIMIT:
+            _display_lists.popitem(last=False)
+    return dl
+
+
+def render(doc, page_index, dpi, clip=None, colorspace=None):
+    """Rasterise a page of a borrowed document from its cached display list."""
+    zoom = dpi / 72
+    pix = display_list(doc, page_index).get_pixmap(
+        matrix=fitz.Matrix(zoom, zoom), colorspace=colorspace or fitz.csRGB, clip=clip
+    )
+    pix.set_dpi(dpi, dpi)
+    return pix
+
+
+def stats():
+    with _lock:
+        return {
+            "open": len(_sessions),
+            "bytes": sum(s.cost for s in _sessions.values()),
+            "display_lists": len(_display_lists),
+            **_stats,
+        }
+
+
+def clear():
+    """Close every idle session."""
+    with _lock:
+        _evict(0)
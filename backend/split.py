@@ -1,13 +1,13 @@
 import sys
 import os
 import json
-from PyPDF2 import PdfReader, PdfWriter
+import memo
+import pdfstream
+import progress
 
+@memo.memoize(inputs="file_path", output="output_path")
 def split_pdf(file_path, page_ranges_str, output_path):
     try:
-        reader = PdfReader(file_path)
-        writer = PdfWriter()
-
         # Parse page ranges (e.g., "1,3,5")
         pages_to_include = set()
         pages = page_ranges_str.split(',')
@@ -16,17 +16,19 @@ def split_pdf(file_path, page_ranges_str, output_path):
             if p: # Ensure not an empty string
                 pages_to_include.add(int(p) - 1) # Convert to 0-based index
 
-        # Add specified pages to the writer
-        for i in sorted(list(pages_to_include)):
-            if 0 <= i < len(reader.pages):
-                writer.add_page(reader.pages[i])
+        # Keep only the specified pages; the rest of the file is never read
+        progress.phase("read")
+        with pdfstream.open_pdf(file_path) as pdf:
+            progress.count(pages=len(pdf.pages))
+            selected = [i for i in sorted(pages_to_include) if 0 <= i < len(pdf.pages)]
+            if not selected:
+                return {"success": False, "message": "No valid pages were selected. Please check your page range."}
+            pdfstream.keep_pages(pdf, selected)
 
-        if len(writer.pages) == 0:
-            return {"success": False, "message": "No valid pages were selected. Please check your page range."}
+            progress.check_cancelled()
+            progress.phase("write")
+            pdfstream.save(pdf, output_path)
 
-        with open(output_path, 'wb') as f:
-            writer.write(f)
-        
         return {"success": True, "message": f"Successfully split PDF and saved to {os.path.basename(output_path)}"}
 
     except FileNotFoundError:
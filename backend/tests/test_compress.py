@@ -0,0 +1,57 @@
+"""compress must never drop a font a page still selects."""
+import fitz
+import pikepdf
+from pikepdf import Array, Dictionary
+
+import compress
+
+
+def _embedded_fonts(path):
+    """Two embedded fonts, /LatoA and /LatoB, in one indirect font dictionary, on two pages."""
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_font(fontname="LatoA", fontbuffer=fitz.Font("tiro").buffer)
+    page.insert_font(fontname="LatoB", fontbuffer=fitz.Font("helv").buffer)
+    doc.new_page()
+    doc.save(path)
+    pdf = pikepdf.open(path, allow_overwriting_input=True)
+    first = pdf.pages[0].obj
+    fonts = pdf.make_indirect(Dictionary(LatoA=first.Resources.Font.LatoA, LatoB=first.Resources.Font.LatoB))
+    return pdf, fonts
+
+
+def _fonts_after_compress(pdf, path, tmp_path):
+    pdf.save(path)
+    pdf.close()
+    out_path = str(tmp_path / "out.pdf")
+    assert compress.compress_pdf(path, out_path)["success"]
+    with fitz.open(out_path) as doc:
+        return [sorted(font[4] for font in page.get_fonts()) for page in doc]
+
+
+def test_font_dictionary_reached_directly_and_through_shared_resources(tmp_path):
+    # Page 1 names the font dictionary itself; page 2 reaches it through an indirect resources dictionary
+    path = str(tmp_path / "in.pdf")
+    pdf, fonts = _embedded_fonts(path)
+    first, second = (page.obj for page in pdf.pages)
+    first.Resources = Dictionary(Font=fonts)
+    second.Resources = pdf.make_indirect(Dictionary(Font=fonts))
+    first.Contents = pdf.make_stream(b"BT /LatoA 12 Tf 72 720 Td (a) Tj ET")
+    second.Contents = pdf.make_stream(b"BT /LatoB 12 Tf 72 720 Td (b) Tj ET")
+
+    first_fonts, second_fonts = _fonts_after_compress(pdf, path, tmp_path)
+    assert "LatoA" in first_fonts
+    assert "LatoB" in second_fonts
+
+
+def test_font_selected_across_content_streams(tmp_path):
+    # The Tf operator's operands end one content stream and the operator starts the next
+    path = str(tmp_path / "in.pdf")
+    pdf, fonts = _embedded_fonts(path)
+    first = pdf.pages[0].obj
+    first.Resources = Dictionary(Font=fonts)
+    first.Contents = Array([pdf.make_stream(b"BT /LatoA 12"), pdf.make_stream(b"Tf 72 720 Td (a) Tj ET")])
+    del pdf.pages[1]
+
+    assert _fonts_after_compress(pdf, path, tmp_path) == [["LatoA"]]
+
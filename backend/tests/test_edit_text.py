@@ -0,0 +1,48 @@
+"""Replacing text across worker processes must give the same document as doing it in one."""
+import json
+
+import fitz
+
+import edit_text
+
+PAGES = 4
+
+
+def _document(path):
+    """Pages with a line of text, a link over it, a link elsewhere and a note."""
+    doc = fitz.open()
+    for _ in range(PAGES):
+        doc.new_page()
+    for number, page in enumerate(doc):
+        page.insert_text((72, 100), f"payment due on page {number + 1}", fontsize=12)
+        page.insert_link({"kind": fitz.LINK_GOTO, "from": fitz.Rect(70, 88, 250, 104), "page": 0})
+        page.insert_link({"kind": fitz.LINK_GOTO, "from": fitz.Rect(70, 300, 150, 320), "page": 0})
+        page.add_text_annot((400, 400), "note")
+    doc.save(path)
+
+
+def _summary(path):
+    with fitz.open(path) as doc:
+        return [
+            (page.get_text("text"),
+             [(annot.type[1], tuple(annot.rect)) for annot in page.annots()],
+             [(link["kind"], tuple(link["from"]), link.get("page")) for link in page.get_links()])
+            for page in doc
+        ]
+
+
+def test_parallel_replacement_matches_serial(tmp_path, monkeypatch):
+    monkeypatch.setattr(edit_text, "PARALLEL_MIN_PAGES", 2)
+    path = str(tmp_path / "in.pdf")
+    _document(path)
+    replacements = json.dumps([
+        {"page": number, "bbox": [70, 88, 250, 104], "new_text": f"settled on page {number}", "origin": [72, 100]}
+        for number in range(1, PAGES + 1)
+    ])
+
+    serial, parallel = str(tmp_path / "serial.pdf"), str(tmp_path / "parallel.pdf")
+    assert edit_text.replace_text_in_pdf(path, replacements, serial, workers=1)["success"]
+    assert edit_text.replace_text_in_pdf(path, replacements, parallel, workers=2)["success"]
+
+    assert _summary(parallel) == _summary(serial)
+    assert "settled on page 3" in _summary(parallel)[2][0]
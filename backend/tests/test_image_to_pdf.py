@@ -0,0 +1,60 @@
+"""Images that are decoded rather than copied keep their orientation and bit depth."""
+import struct
+import zlib
+
+import fitz
+
+import image_to_pdf
+
+
+def _png_chunk(kind, data):
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+
+def _bilevel_tiff(path, width, height):
+    """An uncompressed 1-bit TIFF (WhiteIsZero), black on the left half."""
+    data = (b"\xff" * (width // 16) + b"\x00" * (width // 16)) * height
+    tags = [(256, width), (257, height), (258, 1), (259, 1), (262, 0),
+            (273, 8 + 2 + 12 * 9 + 4), (277, 1), (278, height), (279, len(data))]
+    ifd = struct.pack("<H", len(tags)) + b"".join(struct.pack("<HHII", tag, 4, 1, value) for tag, value in tags)
+    with open(path, "wb") as f:
+        f.write(b"II*\x00" + struct.pack("<I", 8) + ifd + struct.pack("<I", 0) + data)
+
+
+def test_decoded_png_keeps_exif_orientation(tmp_path):
+    # An alpha channel keeps the PNG off the copy path; orientation 6 shows it turned on its side
+    pix = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 40, 20), 1)
+    pix.clear_with(200)
+    png = pix.tobytes("png")
+    exif = b"MM\x00*" + struct.pack(">IH", 8, 1) + struct.pack(">HHIHH", 0x0112, 3, 1, 6, 0) + b"\x00" * 4
+    ihdr_end = 8 + 25
+    path = tmp_path / "turned.png"
+    path.write_bytes(png[:ihdr_end] + _png_chunk(b"eXIf", exif) + png[ihdr_end:])
+
+    out = str(tmp_path / "out.pdf")
+    assert image_to_pdf.image_to_pdf(str(path), out, workers=1)["success"]
+    with fitz.open(out) as doc:
+        assert doc[0].rect.width < doc[0].rect.height
+
+
+def test_bilevel_tiff_stays_one_bit(tmp_path):
+    path = str(tmp_path / "scan.tif")
+    _bilevel_tiff(path, 64, 32)
+
+    out = str(tmp_path / "out.pdf")
+    assert image_to_pdf.image_to_pdf(path, out, workers=1)["success"]
+    with fitz.open(out) as doc:
+        xref = doc[0].get_images()[0][0]
+        assert doc.xref_get_key(xref, "BitsPerComponent") == ("int", "1")
+        pix = doc[0].get_pixmap(colorspace=fitz.csGRAY)
+        assert pix.pixel(2, 2)[0] < 64 and pix.pixel(pix.width - 3, 2)[0] > 192
+
+
+def test_truncated_jpeg_is_reported(tmp_path):
+    pix = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 16, 16), 0)
+    path = tmp_path / "cut.jpg"
+    path.write_bytes(pix.tobytes("jpeg")[:30])
+
+    result = image_to_pdf.image_to_pdf(str(path), str(tmp_path / "out.pdf"), workers=1)
+    assert not result["success"]
+    assert "cut.jpg" in result["message"]
@@ -0,0 +1,25 @@
+"""The `bench large` checks: a >4 GiB PDF is processed under a memory ceiling.
+
+Skipped unless FORGEPDF_LARGE_TESTS is set to the corpus scale (1 = 4.5 GiB).
+"""
+import os
+
+import pytest
+
+from bench import corpus
+from bench.__main__ import _run_case
+from bench.cases import LARGE_CASES
+
+SCALE = os.getenv("FORGEPDF_LARGE_TESTS")
+MAX_RSS_BYTES = 512 * 1024 * 1024
+
+pytestmark = pytest.mark.skipif(not SCALE, reason="set FORGEPDF_LARGE_TESTS to run the large-file checks")
+
+
+@pytest.mark.parametrize("name", sorted(LARGE_CASES))
+def test_large_case_stays_under_memory_ceiling(name):
+    kinds, _ = LARGE_CASES[name]
+    result = _run_case(name, [corpus.corpus_path(kind, float(SCALE)) for kind in kinds], timeout=1800)
+
+    assert result["success"], result["message"]
+    assert result["peak_rss_bytes"] is None or result["peak_rss_bytes"] <= MAX_RSS_BYTES
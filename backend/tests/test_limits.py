@@ -0,0 +1,46 @@
+"""Limits stop a job at its cancellation points, and the memory limit works without /proc."""
+import time
+
+import pytest
+
+import instrument
+import limits
+import progress
+
+
+def _enforced(fn):
+    job = progress.Job(lambda event: None)
+    with pytest.raises(limits.LimitExceeded) as stopped:
+        with limits.enforce(job):
+            progress.run(job, fn)
+    return stopped.value
+
+
+def test_timeout_stops_at_a_cancellation_point(monkeypatch):
+    monkeypatch.setattr(limits, "TIMEOUT", 0.3)
+    steps = []
+
+    def operation():
+        while True:
+            # A step in progress is always finished before the limit is raised
+            steps.append("begin")
+            time.sleep(0.05)
+            steps.append("end")
+            progress.check_cancelled()
+
+    assert _enforced(operation).limit == "timeout"
+    assert steps[-1] == "end"
+
+
+def test_memory_limit_falls_back_to_peak_rss(monkeypatch):
+    monkeypatch.setattr(instrument, "current_rss", lambda: None)
+    monkeypatch.setattr(limits, "MAX_RSS_BYTES", limits._peak_rss() + 64 * 2**20)
+
+    def operation():
+        blocks = []
+        while True:
+            blocks.append(bytearray(16 * 2**20))
+            time.sleep(0.02)
+            progress.check_cancelled()
+
+    assert _enforced(operation).limit == "memory"
@@ -0,0 +1,88 @@
+"""Pages removed by split and organize must not survive in the output."""
+import pikepdf
+import pytest
+from pikepdf import Array, Dictionary, Name, String
+
+import organize_pdf
+import split
+
+SECRETS = (b"SECRETPAGE3", b"SECRETPAGE4", b"SECRETPAGE5", b"SECRETAPPEARANCE")
+
+
+@pytest.fixture
+def document(tmp_path):
+    """Five pages, each page referenced from outside the page tree in a different way."""
+    path = tmp_path / "in.pdf"
+    pdf = pikepdf.new()
+    font = pdf.make_indirect(Dictionary(Type=Name.Font, Subtype=Name.Type1, BaseFont=Name.Helvetica))
+    for number in range(1, 6):
+        pdf.add_blank_page()
+        page = pdf.pages[-1].obj
+        page.Contents = pdf.make_stream(f"BT /F1 12 Tf 72 720 Td (SECRETPAGE{number}) Tj ET".encode())
+        page.Resources = Dictionary(Font=Dictionary(F1=font))
+    pages = [page.obj for page in pdf.pages]
+
+    with pdf.open_outline() as outline:
+        outline.root.extend([pikepdf.OutlineItem("Page 3", 2), pikepdf.OutlineItem("Page 5", 4)])
+    pdf.Root.Names = Dictionary(Dests=Dictionary(Names=Array([
+        String("first"), Array([pages[0], Name.Fit]), String("fourth"), Array([pages[3], Name.Fit])])))
+    pdf.Root.OpenAction = Array([pages[4], Name.Fit])
+    pages[0].Annots = Array([pdf.make_indirect(Dictionary(
+        Type=Name.Annot, Subtype=Name.Link, Rect=[0, 0, 10, 10], Dest=Array([pages[2], Name.Fit])))])
+
+    appearance = pdf.make_stream(b"BT (SECRETAPPEARANCE) Tj ET", Type=Name.XObject, Subtype=Name.Form,
+                                 BBox=[0, 0, 10, 10])
+    widget = pdf.make_indirect(Dictionary(Type=Name.Annot, Subtype=Name.Widget, FT=Name.Tx, T=String("field"),
+                                          Rect=[0, 0, 10, 10], P=pages[3], AP=Dictionary(N=appearance)))
+    pages[3].Annots = Array([widget])
+    pdf.Root.AcroForm = Dictionary(Fields=Array([widget]))
+
+    tree = pdf.make_indirect(Dictionary(Type=Name.StructTreeRoot))
+    body = pdf.make_indirect(Dictionary(Type=Name.StructElem, S=Name.Document, P=tree))
+    paragraphs = []
+    for index, page in enumerate(pages):
+        paragraphs.append(pdf.make_indirect(Dictionary(Type=Name.StructElem, S=Name.P, P=body, Pg=page, K=0)))
+        page.StructParents = index
+    body.K = Array(paragraphs)
+    tree.K = Array([body])
+    tree.ParentTree = Dictionary(Nums=Array([x for index, p in enumerate(paragraphs) for x in (index, Array([p]))]))
+    pdf.Root.StructTreeRoot = tree
+    pdf.save(path)
+    return str(path)
+
+
+def _contents(path):
+    """Page objects and secret markers anywhere in the file."""
+    with pikepdf.open(path) as pdf:
+        page_objects = sum(1 for obj in pdf.objects if isinstance(obj, Dictionary) and obj.get("/Type") == Name.Page)
+        found = {secret for obj in pdf.objects if isinstance(obj, pikepdf.Stream)
+                 for secret in SECRETS if secret in obj.read_bytes()}
+        return page_objects, len(pdf.pages), found
+
+
+def test_split_drops_unselected_pages(document, tmp_path):
+    output = str(tmp_path / "split.pdf")
+    assert split.split_pdf(document, "1", output)["success"]
+    assert _contents(output) == (1, 1, set())
+    with pikepdf.open(output) as pdf:
+        assert not pdf.pages[0].obj.Annots
+        assert list(pikepdf.NameTree(pdf.Root.Names.Dests).keys()) == ["first"]
+        assert "/OpenAction" not in pdf.Root
+        with pdf.open_outline() as outline:
+            assert not outline.root
+
+
+def test_organize_drops_deleted_pages(document, tmp_path):
+    output = str(tmp_path / "organized.pdf")
+    assert organize_pdf.organize_pdf(document, "1,2,3,4,5", "3,4,5", output)["success"]
+    assert _contents(output) == (2, 2, set())
+    with pikepdf.open(output) as pdf:
+        assert not pdf.Root.AcroForm.Fields
+        assert len(pdf.Root.StructTreeRoot.K[0].K) == 2
+        assert sorted(pikepdf.NumberTree(pdf.Root.StructTreeRoot.ParentTree).keys()) == [0, 1]
+
+
+def test_reordering_keeps_everything(document, tmp_path):
+    output = str(tmp_path / "reordered.pdf")
+    assert organize_pdf.organize_pdf(document, "5,4,3,2,1", "", output)["success"]
+    assert _contents(output) == (5, 5, set(SECRETS))
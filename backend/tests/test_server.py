@@ -0,0 +1,35 @@
+"""Uploads through the HTTP service reach the operations as usable files."""
+import asyncio
+
+import fitz
+
+import server
+
+
+async def _convert(root, images):
+    service = server.Service(root, workers=1)
+    dispatcher = asyncio.create_task(service.dispatch())
+    try:
+        ids = []
+        for data in images:
+            reader = asyncio.StreamReader()
+            reader.feed_data(data)
+            reader.feed_eof()
+            ids.append((await service.upload(reader, len(data)))["id"])
+        job_id = service.submit({"op": "convert", "images": ids})["id"]
+        while service.job(job_id)["state"] in ("queued", "running"):
+            await asyncio.sleep(0.05)
+        return service.job(job_id)
+    finally:
+        dispatcher.cancel()
+        service.pool.shutdown()
+
+
+def test_convert_uploaded_images(tmp_path):
+    pix = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 40, 30), False)
+    pix.clear_with(200)
+    entry = asyncio.run(_convert(str(tmp_path), [pix.tobytes("png"), pix.tobytes("jpg")]))
+
+    assert entry["state"] == "done", entry["result"]
+    with fitz.open(entry["result"]["download"]) as doc:
+        assert doc.page_count == 2
@@ -0,0 +1,30 @@
+"""The text index must re-extract a page whose resources changed, not only its own objects."""
+import pikepdf
+from pikepdf import Dictionary, Name
+
+import text_index
+
+
+def _form_page(path, word):
+    """One page whose text is drawn by a Form XObject; the page itself only says `Do`."""
+    pdf = pikepdf.new()
+    font = Dictionary(Type=Name.Font, Subtype=Name.Type1, BaseFont=Name.Helvetica)
+    form = pdf.make_stream(b"BT /F1 24 Tf 72 720 Td (" + word + b") Tj ET", Type=Name.XObject, Subtype=Name.Form,
+                           BBox=[0, 0, 612, 792], Resources=Dictionary(Font=Dictionary(F1=font)))
+    pdf.add_blank_page(page_size=(612, 792))
+    page = pdf.pages[0].obj
+    page.Resources = Dictionary(XObject=Dictionary(Fm0=form))
+    page.Contents = pdf.make_stream(b"q /Fm0 Do Q")
+    pdf.save(path)
+
+
+def test_page_reextracted_when_form_xobject_changes(tmp_path, monkeypatch):
+    monkeypatch.setenv("FORGEPDF_CACHE_DIR", str(tmp_path / "cache"))
+    path = str(tmp_path / "in.pdf")
+    _form_page(path, b"alpha")
+    with text_index.open_index(path) as index:
+        assert [span["text"] for span in index.spans()] == ["alpha"]
+
+    _form_page(path, b"omega")
+    with text_index.open_index(path) as index:
+        assert [span["text"] for span in index.spans()] == ["omega"]
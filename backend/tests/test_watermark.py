@@ -0,0 +1,29 @@
+"""Watermark text is drawn at the requested angle, centred on each page."""
+import json
+import math
+
+import fitz
+import pytest
+
+import watermark
+
+
+@pytest.mark.parametrize("orientation, angle", [("diagonal", 45), ("horizontal", 0), ("vertical", 90)])
+def test_watermark_rotated_about_page_center(tmp_path, orientation, angle):
+    path, out = str(tmp_path / "in.pdf"), str(tmp_path / "out.pdf")
+    with fitz.open() as doc:
+        doc.new_page()
+        doc.save(path)
+
+    options = {"text": "CONFIDENTIAL", "orientation": orientation, "size": "large"}
+    result = watermark.add_watermark(path, out, json.dumps(options))
+    assert result["success"], result["message"]
+
+    with fitz.open(out) as doc:
+        page = doc[0]
+        (line,) = [line for block in page.get_text("dict")["blocks"] for line in block["lines"]]
+        # Text direction in page space, where y grows downwards
+        assert line["dir"] == pytest.approx((math.cos(math.radians(angle)), -math.sin(math.radians(angle))), abs=1e-3)
+        bbox = fitz.Rect(line["bbox"])
+        center = (bbox.tl + bbox.br) / 2
+        assert abs(center.x - page.rect.width / 2) < 15 and abs(center.y - page.rect.height / 2) < 15
@@ -0,0 +1,192 @@
+import os
+import re
+import sqlite3
+import hashlib
+import sessions
+from cache import cache_dir, path_key, file_fingerprint
+
+SCHEMA_VERSION = "2"
+_XREF_RE = re.compile(r"(\d+)\s+\d+\s+R")
+
+
+def iter_page_spans(page):
+    """Yield every text span on a page as (text, bbox, font, size, color)."""
+    for block in page.get_text("dict")["blocks"]:
+        if "lines" not in block:  # Image block
+            continue
+        for line in block["lines"]:
+            for span in line["spans"]:
+                yield span["text"], span["bbox"], span["font"], span["size"], span["color"]
+
+
+def _resources(doc, xref):
+    """The page's /Resources entry, inherited from the page tree if the page has none."""
+    while xref:
+        kind, value = doc.xref_get_key(xref, "Resources")
+        if kind != "null":
+            return value
+        kind, value = doc.xref_get_key(xref, "Parent")
+        xref = int(value.split()[0]) if kind == "xref" else 0
+    return ""
+
+
+def _resource_digest(doc, resources, memo):
+    """Hash every object a resources entry reaches: fonts, images, Form XObjects and their streams.
+
+    Page and page tree objects reached through back references are not followed.
+    Digests are memoized per entry, since many pages share one resources tree.
+    """
+    if resources not in memo:
+        digest = hashlib.sha1(resources.encode("utf-8"))
+        seen, todo = set(), [int(x) for x in _XREF_RE.findall(resources)]
+        while todo:
+            xref = todo.pop()
+            if xref in seen or doc.xref_get_key(xref, "Type")[1] in ("/Page", "/Pages"):
+                continue
+            seen.add(xref)
+            source = doc.xref_object(xref, compressed=True)
+            todo.extend(int(x) for x in _XREF_RE.findall(source))
+            digest.update(b"%d " % xref + source.encode("utf-8"))
+            if doc.xref_is_stream(xref):
+                digest.update(doc.xref_stream_raw(xref) or b"")
+        memo[resources] = digest.digest()
+    return memo[resources]
+
+
+def _page_digest(doc, page_index, memo):
+    """Hash a page's dictionary, content streams and resources tree without loading it."""
+    xref = doc.page_xref(page_index)
+    digest = hashlib.sha1(doc.xref_object(xref, compressed=True).encode("utf-8"))
+    kind, value = doc.xref_get_key(xref, "Contents")
+    if kind in ("xref", "array"):
+        for contents_xref in _XREF_RE.findall(value):
+            digest.update(doc.xref_stream_raw(int(contents_xref)) or b"")
+    digest.update(_resource_digest(doc, _resources(doc, xref), memo))
+    return digest.hexdigest()
+
+
+class TextIndex:
+    """Per-document span index stored in SQLite, refreshed page by page.
+
+    The index lives in the cache directory, keyed by the document's path, and
+    remembers the file fingerprint it was built from. When the file changes
+    only pages whose dictionary, content streams or resources (fonts, Form
+    XObjects) differ are re-extracted.
+    """
+
+    def __init__(self, pdf_path):
+        self.pdf_path = pdf_path
+        db_path = os.path.join(cache_dir("text_index"), path_key(pdf_path) + ".sqlite")
+        self.db = sqlite3.connect(db_path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS pages (page INTEGER PRIMARY KEY, digest TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS fonts (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL);
+            CREATE TABLE IF NOT EXISTS spans (
+                page INTEGER NOT NULL,
+                x0 REAL, y0 REAL, x1 REAL, y1 REAL,
+                font INTEGER, size REAL, color INTEGER,
+                text TEXT
+            );
+            CREATE INDEX IF NOT EXISTS spans_page ON spans(page);
+        """)
+        if self._meta("schema") != SCHEMA_VERSION:
+            with self.db:
+                self.db.executescript("DELETE FROM spans; DELETE FROM pages; DELETE FROM fonts; DELETE FROM meta;")
+                self._set_meta("schema", SCHEMA_VERSION)
+
+    def _meta(self, key):
+        row = self.db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key, value):
+        self.db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def _font_id(self, name, font_ids):
+        if name not in font_ids:
+            self.db.execute("INSERT OR IGNORE INTO fonts (name) VALUES (?)", (name,))
+            font_ids[name] = self.db.execute("SELECT id FROM fonts WHERE name = ?", (name,)).fetchone()[0]
+        return font_ids[name]
+
+    def refresh(self):
+        """Bring the index up to date with the file. Returns the number of re-extracted pages."""
+        fingerprint = file_fingerprint(self.pdf_path)
+        if self._meta("fingerprint") == fingerprint:
+            return 0
+
+        known = dict(self.db.execute("SELECT page, digest FROM pages"))
+        font_ids = dict((name, fid) for fid, name in self.db.execute("SELECT id, name FROM fonts"))
+        updated, memo = 0, {}
+        with sessions.document(self.pdf_path) as doc, self.db:
+            page_count = len(doc)
+            for page_index in range(page_count):
+                page_no = page_index + 1
+                digest = _page_digest(doc, page_index, memo)
+                if known.get(page_no) == digest:
+                    continue
+                rows = [
+                    (page_no, *bbox, self._font_id(font, font_ids), size, color, text)
+                    for text, bbox, font, size, color in iter_page_spans(doc[page_index])
+                ]
+                self.db.execute("DELETE FROM spans WHERE page = ?", (page_no,))
+                self.db.executemany("INSERT INTO spans VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+                self.db.execute("INSERT OR REPLACE INTO pages (page, digest) VALUES (?, ?)", (page_no, digest))
+                updated += 1
+            self.db.execute("DELETE FROM spans WHERE page > ?", (page_count,))
+            self.db.execute("DELETE FROM pages WHERE page > ?", (page_count,))
+            self._set_meta("fingerprint", fingerprint)
+            self._set_meta("page_count", str(page_count))
+        return updated
+
+    @property
+    def page_count(self):
+        return int(self._meta("page_count") or 0)
+
+    def spans(self, page=None, region=None):
+        """Return indexed spans, optionally limited to one page (1-based) and a region [x0, y0, x1, y1]."""
+        sql = ("SELECT s.page, s.text, s.x0, s.y0, s.x1, s.y1, f.name, s.size, s.color "
+               "FROM spans s JOIN fonts f ON f.id = s.font")
+        clauses, params = [], []
+        if page is not None:
+            clauses.append("s.page = ?")
+            params.append(page)
+        if region is not None:
+            x0, y0, x1, y1 = region
+            clauses.append("s.x1 >= ? AND s.x0 <= ? AND s.y1 >= ? AND s.y0 <= ?")
+            params.extend([x0, x1, y0, y1])
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY s.page, s.rowid"
+        return [
+            {
+                "page": page_no,
+                "text": text,
+                "bbox": [x0, y0, x1, y1],
+                "font": font,
+                "size": size,
+                "color": color,
+            }
+            for page_no, text, x0, y0, x1, y1, font, size, color in self.db.execute(sql, params)
+        ]
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_index(pdf_path):
+    """Open the cached index for a document and refresh any changed pages."""
+    index = TextIndex(pdf_path)
+    try:
+        index.refresh()
+    except Exception:
+        index.close()
+        raise
+    return index
+
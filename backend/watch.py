@@ -0,0 +1,375 @@
+"""Hot-folder automation: PDFs dropped into a folder are processed into another.
+
+    python forgepdf.py watch in/ out/ --steps compress,watermark,protect --password s3cret
+
+A file is picked up once its writer has closed it (when inotify can tell)
+and it has stopped changing for --settle seconds, so half-copied files
+are left alone. It is then hashed; content that was
+processed before, under any name, is skipped. The steps run in order in
+a process pool with a bounded number of files in flight. Files waiting
+for a worker are just paths in a queue, so a burst of thousands of files
+costs no extra processes.
+
+Changes are noticed through inotify on Linux and by polling elsewhere
+(or with --poll). Every processed file is recorded in
+`<out>/.forgepdf_processed.jsonl`, which is also the deduplication ledger.
+Results keep the dropped file's name unless a result of that name exists
+already; then they are numbered ("report (2).pdf").
+
+When a pool process dies (a crash in native code, an OOM kill), the pool
+is replaced and the files it was working on are processed again one at
+a time in a separate process; only a file that kills that one is
+recorded as failed.
+"""
+import os
+import sys
+import json
+import time
+import errno
+import signal
+import select
+import struct
+import ctypes
+import ctypes.util
+import hashlib
+import logging
+import tempfile
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import compress
+import limits
+import metrics
+import progress
+import protect
+import sessions
+import watermark
+
+LEDGER_NAME = ".forgepdf_processed.jsonl"
+STEPS = ("compress", "watermark", "protect")
+CRASHED = {"success": False, "message": "The process handling this file died (a crash or an out-of-memory kill)."}
+POLL_INTERVAL = 1.0
+HASH_CHUNK = 1 << 20
+
+# inotify(7) flags
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_MODIFY = 0x00000002
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+def _is_candidate(name):
+    return name.lower().endswith(".pdf") and not name.startswith(".")
+
+
+# --- Change sources ---
+
+class _InotifySource:
+    """Files created, written or moved into a folder, via inotify.
+
+    Reports (name, still_open): a file is still open for writing from its
+    first create/modify event until the writer closes it.
+    """
+
+    def __init__(self, folder):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_MODIFY
+        if libc.inotify_add_watch(self._fd, os.fsencode(folder), mask) < 0:
+            err = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(err, f"inotify_add_watch failed for {folder}")
+
+    def changes(self, timeout):
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except OSError as e:
+            if e.errno == errno.EAGAIN:
+                return []
+            raise
+        changes, offset = [], 0
+        while offset < len(data):
+            _, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            if name:
+                changes.append((os.fsdecode(name), not mask & (IN_CLOSE_WRITE | IN_MOVED_TO)))
+        return changes
+
+    def close(self):
+        os.close(self._fd)
+
+
+class _PollingSource:
+    """Files whose size or mtime changed since the last scan.
+
+    Polling can't tell whether a writer still has a file open, so only the
+    settle time guards against picking up half-written files.
+    """
+
+    def __init__(self, folder):
+        self._folder = folder
+        self._seen = {}
+
+    def changes(self, timeout):
+        time.sleep(timeout)
+        changed, current = [], {}
+        with os.scandir(self._folder) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    st = entry.stat()
+                    current[entry.name] = (st.st_size, st.st_mtime_ns)
+                    if self._seen.get(entry.name) != current[entry.name]:
+                        changed.append((entry.name, False))
+        self._seen = current
+        return changed
+
+    def close(self):
+        pass
+
+
+def _open_source(folder, poll):
+    if not poll and sys.platform.startswith("linux"):
+        try:
+            return _InotifySource(folder)
+        except (OSError, AttributeError):
+            logging.warning("inotify is unavailable; polling %s instead", folder, exc_info=True)
+    return _PollingSource(folder)
+
+
+# --- Processing ---
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _init_worker():
+    # Each dropped file is read once; keeping documents open only costs memory
+    sessions.CACHE_LIMIT_BYTES = 0
+    limits.limit_address_space()
+    # Ctrl+C stops the watcher, which lets files in progress finish
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _output_path(output_dir, name, taken):
+    """Where the result for `name` goes: numbered ("a (2).pdf") if that name is written or reserved already."""
+    stem, ext = os.path.splitext(name)
+    candidate, number = name, 1
+    while os.path.normcase(candidate) in taken or os.path.exists(os.path.join(output_dir, candidate)):
+        number += 1
+        candidate = f"{stem} ({number}){ext}"
+    return os.path.join(output_dir, candidate)
+
+
+def process_file(source, output_path, steps, options):
+    """Run `steps` on `source` in order, writing only the final result to `output_path`."""
+    start = time.perf_counter()
+    work_dir = tempfile.mkdtemp(prefix=".forgepdf_", dir=os.path.dirname(output_path))
+    current = source
+    try:
+        # The limits apply to the file as a whole, all steps together
+        task = progress.Job(lambda event: None)
+        with limits.enforce(task):
+            for number, step in enumerate(steps):
+                target = os.path.join(work_dir, f"{number}_{step}.pdf")
+                if step == "compress":
+                    result = progress.run(task, compress.compress_pdf, current, target)
+                elif step == "watermark":
+                    result = progress.run(task, watermark.add_watermark, current, target,
+                                          json.dumps(options.get("watermark", {})))
+                else:
+                    result = progress.run(task, protect.protect_pdf, current, target, options["password"])
+                if not result.get("success"):
+                    return {"success": False, "message": f"{step}: {result.get('message')}"}
+                current = target
+        os.replace(current, output_path)
+        return {"success": True, "message": f"Processed {' + '.join(steps)}",
+                "seconds": round(time.perf_counter() - start, 3)}
+    except limits.LimitExceeded as e:
+        return limits.result(e)
+    except Exception as e:
+        return {"success": False, "message": f"An unexpected error occurred: {e}"}
+    finally:
+        for name in os.listdir(work_dir):
+            os.remove(os.path.join(work_dir, name))
+        os.rmdir(work_dir)
+
+
+def _ends_with_newline(path):
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+class _Ledger:
+    """Append-only record of processed content hashes."""
+
+    def __init__(self, path):
+        self.path = path
+        self.hashes = set()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # A torn last line from a crash
+                    if entry.get("success"):
+                        self.hashes.add(entry["sha256"])
+        self._file = open(path, "a", encoding="utf-8")
+        if self._file.tell() and not _ends_with_newline(path):
+            self._file.write("\n")  # Don't glue the next entry onto a torn line
+
+    def record(self, entry):
+        if entry["success"]:
+            self.hashes.add(entry["sha256"])
+        self._file.write(json.dumps(entry) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def watch(input_dir, output_dir, steps=STEPS, options=None, workers=None, settle=2.0,
+          poll=False, max_in_flight=None, stop=None):
+    """Process files dropped into `input_dir` until interrupted (or `stop()` returns True)."""
+    options = options or {}
+    steps = [step for step in STEPS if step in steps]  # Protect has to come last
+    if "protect" in steps and not options.get("password"):
+        raise ValueError("The protect step needs a password.")
+    os.makedirs(output_dir, exist_ok=True)
+    max_in_flight = max_in_flight or max(2, (workers or os.cpu_count() or 1) * 2)
+
+    ledger = _Ledger(os.path.join(output_dir, LEDGER_NAME))
+    source = _open_source(input_dir, poll)
+    settling = {}  # name -> (size, mtime_ns, time it last changed)
+    writing = set()  # names a writer still has open (inotify only)
+    waiting = deque()  # (path, sha256) ready for a worker
+    suspects = deque()  # (path, sha256) in flight when a pool process died, to run alone
+    queued = set()  # hashes waiting or in flight, so copies dropped together run once
+    outputs = {}  # sha256 waiting or in flight -> its output path, kept from other files until written
+    in_flight = {}  # future -> (path, sha256, whether it runs alone)
+
+    # Files that were already there when the watcher started
+    for name in os.listdir(input_dir):
+        if _is_candidate(name):
+            settling[name] = (None, None, time.monotonic())
+
+    def new_pool(size=workers):
+        return ProcessPoolExecutor(max_workers=size, initializer=_init_worker)
+
+    def submit(executor, path, digest, alone=False):
+        in_flight[executor.submit(process_file, path, outputs[digest], steps, options)] = (path, digest, alone)
+
+    def finish(path, digest, result):
+        queued.discard(digest)
+        output_path = outputs.pop(digest)
+        ledger.record({"source": path, "sha256": digest, "output": output_path if result["success"] else None,
+                       "time": time.time(), **result})
+        metrics.observe_result("watch", result)
+        if not result["success"]:
+            logging.error("Failed to process %s: %s", path, result["message"])
+
+    logging.info("Watching %s -> %s (%s)", input_dir, output_dir, ", ".join(steps))
+    pool = new_pool()
+    isolation = None  # single-process pool for suspects
+    try:
+        while not (stop and stop()):
+            timeout = min(POLL_INTERVAL, settle) if settling else POLL_INTERVAL
+            for name, still_open in source.changes(timeout):
+                if _is_candidate(name):
+                    settling[name] = (None, None, time.monotonic())
+                    (writing.add if still_open else writing.discard)(name)
+
+            # Debounce: a file is ready once its size and mtime held still for `settle` seconds
+            now = time.monotonic()
+            for name, (size, mtime, changed_at) in list(settling.items()):
+                path = os.path.join(input_dir, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    del settling[name]
+                    writing.discard(name)
+                    continue
+                if (st.st_size, st.st_mtime_ns) != (size, mtime):
+                    settling[name] = (st.st_size, st.st_mtime_ns, now)
+                elif now - changed_at >= settle and st.st_size > 0 and name not in writing:
+                    del settling[name]
+                    try:
+                        digest = file_hash(path)
+                    except OSError as e:
+                        # Deleted, renamed or made unreadable since the stat; it is picked up again if it changes
+                        logging.warning("Skipping %s: %s", name, e)
+                        writing.discard(name)
+                        continue
+                    if digest in ledger.hashes or digest in queued:
+                        logging.info("Skipping %s: same content was already processed", name)
+                        continue
+                    queued.add(digest)
+                    # A later file of the same name (different content) must not replace an earlier result
+                    taken = {os.path.normcase(os.path.basename(output)) for output in outputs.values()}
+                    outputs[digest] = _output_path(output_dir, name, taken)
+                    waiting.append((path, digest))
+
+            if suspects and not any(alone for _, _, alone in in_flight.values()):
+                isolation = isolation or new_pool(1)
+                submit(isolation, *suspects.popleft(), alone=True)
+            while waiting and len(in_flight) < max_in_flight:
+                submit(pool, *waiting.popleft())
+
+            if in_flight:
+                done, _ = wait(in_flight, timeout=0, return_when=FIRST_COMPLETED)
+                lost = []
+                for future in done:
+                    path, digest, alone = in_flight.pop(future)
+                    try:
+                        finish(path, digest, future.result())
+                    except BrokenProcessPool:
+                        if not alone:
+                            lost.append((path, digest))
+                            continue
+                        finish(path, digest, CRASHED)
+                        isolation.shutdown(wait=False)
+                        isolation = None
+                if lost:
+                    # Every file in flight in the pool went down with it; which one killed it is unknown
+                    for future, (path, digest, alone) in list(in_flight.items()):
+                        if alone:
+                            continue
+                        del in_flight[future]
+                        try:
+                            finish(path, digest, future.result())
+                        except BrokenProcessPool:
+                            lost.append((path, digest))
+                    logging.warning("A worker process died; retrying %d file(s) one at a time", len(lost))
+                    suspects.extend(lost)
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    pool = new_pool()
+    except KeyboardInterrupt:
+        logging.info("Stopping; waiting for %d file(s) in progress", len(in_flight))
+    finally:
+        for future, (path, digest, _) in in_flight.items():
+            try:
+                result = future.result()
+            except BrokenProcessPool:
+                result = CRASHED
+            finish(path, digest, result)
+        pool.shutdown(wait=True)
+        if isolation is not None:
+            isolation.shutdown(wait=True)
+        source.close()
+        ledger.close()
@@ -1,8 +1,10 @@
 import sys
 import json
 import fitz  # PyMuPDF
-import math
+import memo
+import progress
 
+@memo.memoize(inputs="input_path", output="output_path")
 def add_watermark(input_path, output_path, options_json):
     try:
         options = json.loads(options_json)
@@ -15,7 +17,11 @@ def add_watermark(input_path, output_path, options_json):
         angle = rotations.get(orientation, 45)
 
         with fitz.open(input_path) as doc:
-            for page in doc:
+            progress.phase("watermark")
+            total = len(doc)
+            progress.count(pages=total, objects=doc.xref_length() - 1)
+            for page_index, page in enumerate(doc):
+                progress.check_cancelled()
                 # --- Universal Compatibility Method ---
 
                 # 1. Use TextWriter, which is a fundamental object
@@ -25,30 +31,22 @@ def add_watermark(input_path, output_path, options_json):
                 # 2. Define the font
                 font = fitz.Font("helv")
 
-                # 3. Manually calculate the page center
-                page_rect = page.rect
-                center_x = page_rect.width / 2
-                center_y = page_rect.height / 2
+                # 3. Find the page center, which the text is rotated around
+                center = fitz.Point(page.rect.width / 2, page.rect.height / 2)
 
-                # 4. Create the rotation matrix from scratch
-                angle_rad = math.radians(angle)
-                cos_a = math.cos(angle_rad)
-                sin_a = math.sin(angle_rad)
-                # This matrix will rotate the text around the page's center
-                mat = fitz.Matrix(cos_a, sin_a, -sin_a, cos_a, center_x, center_y)
-
-                # 5. Calculate the starting position of the text to make it centered
-                # We start from a point of (0,0) relative to the rotation center
+                # 4. Place the text so that it is centered on that point
                 text_width = font.text_length(text, fontsize=font_size)
-                start_pos = fitz.Point(-text_width / 2, font_size / 4)
-
-                # 6. Add the text at the calculated starting position using only basic arguments
+                start_pos = fitz.Point(center.x - text_width / 2, center.y + font_size / 4)
                 tw.append(start_pos, text, font=font, fontsize=font_size)
 
-                # 7. Write the text to the page, applying the final transformation matrix
-                # This is the key step for older library versions
-                tw.write_text(page, transform=mat)
+                # 5. Write the text to the page, rotated about the center.
+                # morph=(fixpoint, matrix) is supported by every PyMuPDF version
+                # we ship with, unlike the old `transform` keyword.
+                tw.write_text(page, morph=(center, fitz.Matrix(angle)))
+                progress.advance(page_index + 1, total)
 
+            progress.check_cancelled()
+            progress.phase("save")
             doc.save(output_path)
         return {"success": True, "message": "Watermark added successfully."}
         
@@ -0,0 +1,213 @@
+"""Long-lived backend process for the Electron app.
+
+Reads one JSON request per line on stdin and answers with one JSON line on
+stdout. A request names the backend script the app would otherwise spawn,
+with the same arguments:
+
+    {"id": 7, "script": "preview.py", "args": ["/path/file.pdf", "-1", "/tmp/out"]}
+    {"id": 7, "result": {"success": true, ...}}
+
+A request may add "instrument": true (or "cprofile"/"pyinstrument") to get
+timings and memory use back in the result's "diagnostics"; see instrument.py.
+
+While a request runs the worker also writes event lines for it: "started",
+"phase", "progress", a periodic "heartbeat", then "done" or "error"
+just before the reply. `{"cancel": 7}` asks a queued or running request
+to stop; the operation notices at its next cancellation point.
+
+    {"id": 7, "event": {"type": "progress", "done": 3, "total": 40, "unit": "page", ...}}
+
+Keeping one process alive lets operations share open documents through
+the session cache instead of re-parsing the file on every call. Requests
+run one at a time, so the app keeps a second worker for quick interactive
+calls (see laneFor in main.js) that must not wait behind long operations. Requests
+that go over the limits in limits.py (time, memory, pages, objects) are
+stopped and answered with a "limit" field; the worker keeps running.
+"""
+import os
+import sys
+import json
+import queue
+import logging
+import threading
+
+import compare
+import compress
+import edit_text
+import image_to_pdf
+import inspect_pdf
+import instrument
+import limits
+import merge
+import metrics
+import organize_pdf
+import page_analysis
+import pdf_to_image
+import preview
+import progress
+import protect
+import rotate
+import search
+import split
+import watermark
+
+
+def _edit_text(args):
+    if args[0] == "extract":
+        page = int(args[2]) if len(args) > 2 and args[2] else None
+        region = [float(v) for v in args[3].split(',')] if len(args) > 3 else None
+        return edit_text.extract_text_with_positions(args[1], page, region)
+    if args[0] == "replace":
+        return edit_text.replace_text_in_pdf(*args[1:4])
+    if args[0] == "findreplace":
+        return edit_text.find_and_replace(args[1])
+    return {"success": False, "message": "Invalid operation"}
+
+
+def _search(args):
+    if args[0] == "index":
+        return search.index_library(args[1:])
+    if args[0] == "query":
+        return search.search(args[1], limit=int(args[2]) if len(args) > 2 else 50)
+    return {"success": False, "message": "Invalid operation"}
+
+
+# Script name -> handler taking the script's command-line arguments
+SCRIPTS = {
+    "compare.py": lambda args: compare.compare_pdfs(*args),
+    "compress.py": lambda args: compress.compress_pdf(*args),
+    "edit_text.py": _edit_text,
+    "image_to_pdf.py": lambda args: image_to_pdf.image_to_pdf(*args),
+    "inspect_pdf.py": lambda args: inspect_pdf.inspect_pdf(*args),
+    "merge.py": lambda args: merge.merge_pdfs(*args),
+    "organize_pdf.py": lambda args: organize_pdf.organize_pdf(*args),
+    "page_analysis.py": lambda args: page_analysis.analyze_pages(*args),
+    "pdf_to_image.py": lambda args: pdf_to_image.pdf_to_image(*args),
+    "preview.py": lambda args: preview.get_preview(*args),
+    # The app passes [file, password, output]
+    "protect.py": lambda args: protect.protect_pdf(args[0], args[2], args[1]),
+    "rotate.py": lambda args: rotate.rotate_pdf(*args),
+    "search.py": _search,
+    "split.py": lambda args: split.split_pdf(*args),
+    "watermark.py": lambda args: watermark.add_watermark(*args),
+}
+
+
+HEARTBEAT_SECONDS = float(os.getenv("FORGEPDF_HEARTBEAT_SECONDS", "5"))
+
+_output_lock = threading.Lock()
+
+
+def _send(message):
+    with _output_lock:
+        sys.stdout.write(json.dumps(message) + "\n")
+        sys.stdout.flush()
+
+
+def handle(request, job=None):
+    handler = SCRIPTS.get(request.get("script"))
+    if handler is None:
+        return {"success": False, "message": f"Unknown backend script: {request.get('script')}"}
+    job = job or progress.Job(lambda event: None)
+    mode = instrument.requested(request.get("instrument"))
+    try:
+        with limits.enforce(job):
+            if mode:
+                return instrument.run(job, handler, request.get("args", []), name=request.get("script"), mode=mode)
+            return progress.run(job, handler, request.get("args", []))
+    except progress.JobCancelled:
+        return {"success": False, "cancelled": True, "message": "Operation cancelled."}
+    except limits.LimitExceeded as e:
+        logging.warning("%s stopped: %s", request.get("script"), e)
+        return limits.result(e)
+    except Exception as e:
+        logging.exception("Backend operation failed")
+        return {"success": False, "message": f"An unexpected error occurred: {str(e)}"}
+
+
+def _run_request(request, job):
+    request_id = request.get("id")
+    stop_heartbeat = threading.Event()
+
+    def heartbeat():
+        while not stop_heartbeat.wait(HEARTBEAT_SECONDS):
+            job.emit("heartbeat")
+
+    tracker = metrics.JobTracker(request.get("script"), request.get("args", []))
+    job.watch(tracker.observe)
+    job.emit("started", script=request.get("script"))
+    beat = threading.Thread(target=heartbeat, name=f"heartbeat-{request_id}", daemon=True)
+    beat.start()
+    try:
+        if job.cancelled:
+            result = {"success": False, "cancelled": True, "message": "Operation cancelled."}
+        else:
+            result = handle(request, job)
+    finally:
+        stop_heartbeat.set()
+        beat.join()
+    if result.get("success"):
+        job.emit("done", message=result.get("message"))
+    else:
+        job.emit("error", message=result.get("message"), cancelled=bool(result.get("cancelled")))
+    tracker.finish(result)
+    _send({"id": request_id, "result": result})
+
+
+def main():
+    preview.enable_prefetch()
+    metrics.start()
+    requests = queue.Queue()
+    jobs = {}  # request id -> Job, for queued and running requests
+    jobs_lock = threading.Lock()
+
+    def read_requests():
+        # Runs on its own thread so cancellations arrive while a job is busy
+        for line in sys.stdin:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                request = json.loads(line)
+            except ValueError:
+                logging.error("Ignoring malformed request: %s", line[:200])
+                continue
+            if "cancel" in request:
+                with jobs_lock:
+                    job = jobs.get(request["cancel"])
+                if job:
+                    job.cancel()
+                continue
+            request_id = request.get("id")
+            job = progress.Job(lambda event, request_id=request_id: _send({"id": request_id, "event": event}))
+            with jobs_lock:
+                jobs[request_id] = job
+            requests.put(request)
+            metrics.QUEUE_DEPTH.set(value=requests.qsize())
+        requests.put(None)
+
+    threading.Thread(target=read_requests, name="stdin-reader", daemon=True).start()
+    while True:
+        try:
+            request = requests.get_nowait()
+        except queue.Empty:
+            # Idle: render prefetched pages one at a time, so a request waits for at most one page
+            if preview.prefetch_one():
+                continue
+            request = requests.get()
+        if request is None:
+            break
+        metrics.QUEUE_DEPTH.set(value=requests.qsize())
+        with jobs_lock:
+            job = jobs[request.get("id")]
+        metrics.IN_PROGRESS.set(value=1)
+        try:
+            _run_request(request, job)
+        finally:
+            metrics.IN_PROGRESS.set(value=0)
+            with jobs_lock:
+                jobs.pop(request.get("id"), None)
+
+
+if __name__ == "__main__":
+    main()
@@ -19,17 +19,45 @@ document.addEventListener('DOMContentLoaded', () => {
      * @param {string} title - The title for the loading message.
      */
     function showLoading(title) {
+        activeJobId = null;
+        loadingOpen = true;
         Swal.fire({
             title,
             html: 'Processing your file, please wait...',
             timerProgressBar: true,
             allowOutsideClick: false,
+            showCancelButton: true,
+            cancelButtonText: 'Cancel',
             didOpen: () => {
                 Swal.showLoading();
             }
+        }).then(({ dismiss }) => {
+            loadingOpen = false;
+            if (dismiss === Swal.DismissReason.cancel && activeJobId !== null) {
+                window.electronAPI.cancelJob(activeJobId);
+            }
         });
     }
 
+    // The backend job behind the loading popup, learned from its 'started' event
+    let activeJobId = null;
+    let loadingOpen = false;
+
+    window.electronAPI.onBackendEvent((jobEvent) => {
+        if (!loadingOpen) return;
+        if (jobEvent.type === 'started') {
+            activeJobId = jobEvent.id;
+        } else if (jobEvent.id !== activeJobId) {
+            return;
+        } else if (jobEvent.type === 'progress' && jobEvent.total) {
+            const html = jobEvent.unit === 'percent'
+                ? `Writing... ${jobEvent.done}%`
+                : `Processing ${jobEvent.unit} ${jobEvent.done} of ${jobEvent.total}...`;
+            Swal.update({ html });
+            Swal.showLoading();
+        }
+    });
+
     /**
      * Handles the response from the main process, showing success or error popups.
      * @param {object} result - The result object from the backend {success: boolean, message: string}.
@@ -37,7 +65,10 @@ document.addEventListener('DOMContentLoaded', () => {
      */
     function handleResponse(result, handlerToReset) {
         Swal.close(); // Close the loading popup first
-        if (result && result.success) {
+        if (result && result.cancelled) {
+            Toast.fire({ icon: 'info', title: 'Cancelled', text: result.message });
+            if (handlerToReset) handlerToReset.reset();
+        } else if (result && result.success) {
             Toast.fire({ icon: 'success', title: 'Success!', text: result.message });
             if (handlerToReset) handlerToReset.reset();
         } else {
@@ -317,6 +348,16 @@ document.addEventListener('DOMContentLoaded', () => {
             this.elements.container.style.display = 'flex';
             this.elements.content.classList.add('loading');
             try {
+                // The structure comes back instantly even for huge files; thumbnails follow
+                const info = await window.electronAPI.inspectPdf(this.state.currentFile);
+                if (info.success && info.needsPassword) {
+                    handleResponse({ success: false, message: "This PDF is password protected." });
+                    this.reset();
+                    return;
+                }
+                if (info.success) {
+                    this.elements.filename.textContent = `${file.name} (${info.pageCount} page${info.pageCount === 1 ? '' : 's'})`;
+                }
                 const result = await window.electronAPI.getPdfPreview(this.state.currentFile, -1);
                 if (result.success) {
                     result.filePaths.forEach((path, i) => {
@@ -361,6 +402,10 @@ document.addEventListener('DOMContentLoaded', () => {
             if (newMode === 'organize') {
                 this.elements.modeInfo.textContent = "Drag & drop or click pages to reorder. Use 'X' to mark for deletion.";
                 deleteBtns.forEach(btn => btn.style.display = 'flex');
+                this.elements.modeControls.classList.add('visible');
+                this.elements.modeControls.innerHTML = `
+                    <button id="find-unwanted-btn" class="btn btn-sm">Mark blank & duplicate pages</button>`;
+                document.getElementById('find-unwanted-btn').addEventListener('click', () => this.markUnwantedPages());
                 this.elements.saveBtn.innerHTML = '<i data-lucide="save"></i><span>Save Changes</span>';
             } else if (newMode === 'split') {
                 this.elements.modeInfo.textContent = "Click pages to select them for extraction.";
@@ -383,6 +428,20 @@ document.addEventListener('DOMContentLoaded', () => {
             }
             lucide.createIcons();
         },
+        async markUnwantedPages() {
+            showLoading('Looking for blank and duplicate pages...');
+            const result = await window.electronAPI.analyzePages([this.state.currentFile]);
+            if (!result || !result.success) return handleResponse(result);
+            const flagged = new Set(result.files[0].deletePages);
+            this.state.pages.forEach(p => {
+                if (flagged.has(p.originalIndex)) {
+                    p.isDeleted = true;
+                    p.element.classList.add('marked-for-deletion');
+                }
+            });
+            // Nothing is deleted until the user reviews the marks and saves
+            handleResponse({ success: true, message: `${result.message} They are marked for deletion.` });
+        },
         applyRotationPreview() {
             const angle = parseInt(document.getElementById('rotate-angle-select').value, 10);
             this.state.pages.forEach(p => {
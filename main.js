@@ -24,44 +24,182 @@ function getScriptPath(scriptName) {
     return path.join(process.resourcesPath, 'backend', scriptName);
 }
 
+// --- Long-lived Python backends ---
+// Operations go through backend/worker.py processes, so documents they have
+// already opened stay cached between calls. A worker runs one request at a
+// time, so quick interactive calls (previews, text extraction, inspection,
+// search queries) get a worker of their own and never wait behind a long
+// compress, conversion or OCR in the other one.
+
+const backends = { interactive: null, batch: null };
+let nextRequestId = 1;
+
 /**
- * Runs a Python script with given arguments and returns a Promise with the JSON output.
+ * Picks the worker a request runs in.
+ * @returns {'interactive'|'batch'}
+ */
+function laneFor(scriptName, args) {
+    if (scriptName === 'preview.py' || scriptName === 'inspect_pdf.py') return 'interactive';
+    if (scriptName === 'edit_text.py' && args[0] === 'extract') return 'interactive';
+    if (scriptName === 'search.py' && args[0] === 'query') return 'interactive';
+    return 'batch';
+}
+
+// The backend sends a heartbeat every few seconds while it works. If it goes
+// silent for this long with requests outstanding, it is presumed hung and restarted.
+const BACKEND_STALL_TIMEOUT_MS = 2 * 60 * 1000;
+
+// The backend stops a job that runs longer than this (FORGEPDF_JOB_TIMEOUT, in
+// seconds). One that hasn't stopped a grace period later is stuck in native code
+// where the backend can't interrupt it, so the backend process is killed.
+const JOB_TIMEOUT_MS = (Number(process.env.FORGEPDF_JOB_TIMEOUT) || 30 * 60) * 1000;
+const JOB_KILL_GRACE_MS = 30 * 1000;
+
+/**
+ * Metrics settings for a lane's worker. Each lane exports on a port and file of its
+ * own (the batch lane on the next port, and with ".batch" in the file name), and
+ * labels its metrics with the lane so textfile collectors can merge the two files.
+ * @param {'interactive'|'batch'} lane
+ * @returns {object} Environment variables to add.
+ */
+function metricsEnv(lane) {
+    const env = { FORGEPDF_METRICS_LANE: lane };
+    if (lane === 'batch') {
+        if (process.env.FORGEPDF_METRICS_PORT) {
+            env.FORGEPDF_METRICS_PORT = String(Number(process.env.FORGEPDF_METRICS_PORT) + 1);
+        }
+        if (process.env.FORGEPDF_METRICS_FILE) {
+            env.FORGEPDF_METRICS_FILE = process.env.FORGEPDF_METRICS_FILE.replace(/(\.prom)?$/, '.batch$1');
+        }
+    }
+    return env;
+}
+
+/**
+ * Starts the Python backend worker for a lane if it is not running.
+ * @param {'interactive'|'batch'} lane
+ * @returns {{process: ChildProcess, pending: Map, buffer: string}} The backend state.
+ */
+function getBackend(lane) {
+    if (backends[lane]) return backends[lane];
+
+    const pythonProcess = spawn(getPythonPath(), [getScriptPath('worker.py')], {
+        env: {
+            ...process.env,
+            ...metricsEnv(lane),
+            FORGEPDF_JOB_TIMEOUT: String(JOB_TIMEOUT_MS / 1000),
+            PYTHONIOENCODING: 'utf-8',
+        },
+    });
+    const state = { process: pythonProcess, pending: new Map(), buffer: '', lastActivity: Date.now() };
+
+    pythonProcess.stdout.on('data', (data) => {
+        state.lastActivity = Date.now();
+        state.buffer += data.toString();
+        let newline;
+        while ((newline = state.buffer.indexOf('\n')) !== -1) {
+            const line = state.buffer.slice(0, newline);
+            state.buffer = state.buffer.slice(newline + 1);
+            if (!line.trim()) continue;
+            let reply;
+            try {
+                reply = JSON.parse(line);
+            } catch (e) {
+                console.error(`Failed to parse Python backend output: ${e.message}`);
+                continue;
+            }
+            const request = state.pending.get(reply.id);
+            if (!request) continue;
+            if (reply.event) {
+                if (reply.event.type === 'started') startJobTimer(state, reply.id, request);
+                if (request.onEvent) request.onEvent({ id: reply.id, ...reply.event });
+            } else {
+                clearTimeout(request.timer);
+                state.pending.delete(reply.id);
+                request.resolve(reply.result);
+            }
+        }
+    });
+
+    pythonProcess.stderr.on('data', (data) => {
+        console.error(`Python backend: ${data.toString()}`);
+    });
+
+    const watchdog = setInterval(() => {
+        if (state.pending.size > 0 && Date.now() - state.lastActivity > BACKEND_STALL_TIMEOUT_MS) {
+            console.error('Python backend stopped responding; restarting it.');
+            fail('The operation timed out: the Python backend stopped responding.');
+            pythonProcess.kill();
+        }
+    }, 5000);
+
+    const fail = (message) => {
+        clearInterval(watchdog);
+        if (backends[lane] === state) backends[lane] = null;
+        for (const request of state.pending.values()) {
+            clearTimeout(request.timer);
+            request.reject({ success: false, message });
+        }
+        state.pending.clear();
+    };
+    pythonProcess.on('error', (err) => fail(`Failed to start Python backend: ${err.message}`));
+    pythonProcess.on('close', (code) => fail(`Python backend exited with code ${code}`));
+
+    backends[lane] = state;
+    return state;
+}
+
+/**
+ * Kills the backend if the job is still running once the backend should have stopped it itself.
+ */
+function startJobTimer(state, id, request) {
+    request.timer = setTimeout(() => {
+        if (!state.pending.has(id)) return;
+        console.error(`Job ${id} did not stop after its timeout; restarting the Python backend.`);
+        state.pending.delete(id);
+        request.reject({ success: false, limit: 'timeout', message: 'The operation took too long and was stopped.' });
+        state.process.kill('SIGKILL');
+    }, JOB_TIMEOUT_MS + JOB_KILL_GRACE_MS);
+}
+
+/**
+ * Runs a backend script's operation with given arguments and returns a Promise with its JSON result.
  * @param {string} scriptName The name of the script in the 'backend' folder.
  * @param {string[]} args An array of command-line arguments for the script.
- * @returns {Promise<object>} A promise that resolves with the parsed JSON output from the script.
+ * @param {function} [onEvent] Called with each job event (started, phase, progress, heartbeat, done, error).
+ * @returns {Promise<object>} A promise that resolves with the operation's result object.
  */
-function runPythonScript(scriptName, args) {
+function runPythonScript(scriptName, args, onEvent) {
     return new Promise((resolve, reject) => {
-        const pythonPath = getPythonPath();
-        const scriptPath = getScriptPath(scriptName);
-        const pythonProcess = spawn(pythonPath, [scriptPath, ...args]);
-
-        let result = '';
-        let error = '';
-
-        pythonProcess.stdout.on('data', (data) => {
-            result += data.toString();
-        });
-
-        pythonProcess.stderr.on('data', (data) => {
-            error += data.toString();
-        });
-
-        pythonProcess.on('close', (code) => {
-            if (code === 0) {
-                try {
-                    resolve(JSON.parse(result));
-                } catch (e) {
-                    reject({ success: false, message: `Failed to parse Python script output: ${e.message}` });
-                }
-            } else {
-                console.error(`Python script ${scriptName} exited with code ${code}. Stderr: ${error}`);
-                reject({ success: false, message: `Python script error: ${error}` });
-            }
-        });
+        const state = getBackend(laneFor(scriptName, args));
+        const id = nextRequestId++;
+        if (state.pending.size === 0) state.lastActivity = Date.now();
+        state.pending.set(id, { resolve, reject, onEvent });
+        state.process.stdin.write(JSON.stringify({ id, script: scriptName, args }) + '\n');
     });
 }
 
+/**
+ * Asks the backend to stop a queued or running job. The job's promise resolves with `cancelled: true`.
+ * @param {number} id The job id from its 'started' event.
+ */
+function cancelPythonScript(id) {
+    for (const state of Object.values(backends)) {
+        if (state && state.pending.has(id)) {
+            state.process.stdin.write(JSON.stringify({ cancel: id }) + '\n');
+        }
+    }
+}
+
+/**
+ * Returns an event callback that forwards backend job events to the window that started the job.
+ */
+function forwardEventsTo(event) {
+    return (jobEvent) => {
+        if (!event.sender.isDestroyed()) event.sender.send('backend-event', jobEvent);
+    };
+}
+
 const createWindow = () => {
     const win = new BrowserWindow({
         width: 1200,
@@ -89,6 +227,12 @@ app.whenReady().then(() => {
     });
 });
 
+app.on('will-quit', () => {
+    for (const state of Object.values(backends)) {
+        if (state) state.process.kill();
+    }
+});
+
 app.on('window-all-closed', () => {
     if (process.platform !== 'darwin') {
         app.quit();
@@ -103,50 +247,77 @@ ipcMain.handle('get-pdf-preview', async (event, filePath, pageNum) => {
         if (!fs.existsSync(previewDir)) {
             fs.mkdirSync(previewDir, { recursive: true });
         }
-        return await runPythonScript('preview.py', [filePath, pageNum, previewDir]);
+        return await runPythonScript('preview.py', [filePath, pageNum, previewDir], forwardEventsTo(event));
     } catch (error) {
         return { success: false, message: error.message };
     }
 });
 
+// Page count, sizes, encryption and the like from the document structure alone (nothing is rendered)
+ipcMain.handle('inspect-pdf', async (event, filePath) => {
+    return runPythonScript('inspect_pdf.py', [filePath]);
+});
+
+ipcMain.handle('analyze-pages', async (event, filePaths, options = {}) => {
+    return runPythonScript('page_analysis.py', [filePaths.join(','), JSON.stringify(options)], forwardEventsTo(event));
+});
+
+ipcMain.handle('compare-pdfs', async (event, firstPath, secondPath, options = {}) => {
+    // Diff images of changed pages go to a fresh folder per comparison
+    const diffDir = fs.mkdtempSync(path.join(app.getPath('temp'), 'pdf_compare_'));
+    return runPythonScript('compare.py', [firstPath, secondPath, diffDir, JSON.stringify(options)], forwardEventsTo(event));
+});
+
 ipcMain.handle('merge-pdfs', async (event, filePaths) => {
     const defaultPath = path.join(os.homedir(), 'Downloads', 'merged_document.pdf');
     const { filePath } = await dialog.showSaveDialog({ defaultPath });
     if (!filePath) return { success: false, message: 'Save cancelled.' };
-    return runPythonScript('merge.py', [filePaths.join(','), filePath]);
+    return runPythonScript('merge.py', [filePaths.join(','), filePath], forwardEventsTo(event));
 });
 
 ipcMain.handle('compress-pdf', async (event, filePath) => {
     const defaultPath = path.join(os.homedir(), 'Downloads', `compressed_${path.basename(filePath)}`);
     const { filePath: savePath } = await dialog.showSaveDialog({ defaultPath });
     if (!savePath) return { success: false, message: 'Save cancelled.' };
-    return runPythonScript('compress.py', [filePath, savePath]);
+    return runPythonScript('compress.py', [filePath, savePath], forwardEventsTo(event));
 });
 
 ipcMain.handle('protect-pdf', async (event, filePath, password) => {
     const defaultPath = path.join(os.homedir(), 'Downloads', `protected_${path.basename(filePath)}`);
     const { filePath: savePath } = await dialog.showSaveDialog({ defaultPath });
     if (!savePath) return { success: false, message: 'Save cancelled.' };
-    return runPythonScript('protect.py', [filePath, password, savePath]);
+    return runPythonScript('protect.py', [filePath, password, savePath], forwardEventsTo(event));
 });
 
 ipcMain.handle('organize-pdf', async (event, filePath, pageOrder, pagesToDelete) => {
     const defaultPath = path.join(os.homedir(), 'Downloads', `organized_${path.basename(filePath)}`);
     const { filePath: savePath } = await dialog.showSaveDialog({ defaultPath });
     if (!savePath) return { success: false, message: 'Save cancelled.' };
-    return runPythonScript('organize_pdf.py', [filePath, pageOrder.join(','), pagesToDelete.join(','), savePath]);
+    return runPythonScript('organize_pdf.py', [filePath, pageOrder.join(','), pagesToDelete.join(','), savePath], forwardEventsTo(event));
 });
 
 ipcMain.handle('split-pdf', async (event, filePath, ranges) => {
     const defaultPath = path.join(os.homedir(), 'Downloads', `split_${path.basename(filePath)}`);
     const { filePath: savePath } = await dialog.showSaveDialog({ defaultPath });
     if (!savePath) return { success: false, message: 'Save cancelled.' };
-    return runPythonScript('split.py', [filePath, ranges, savePath]);
+    return runPythonScript('split.py', [filePath, ranges, savePath], forwardEventsTo(event));
 });
 
 ipcMain.handle('rotate-pdf', async (event, filePath, rotationsJson) => {
     const defaultPath = path.join(os.homedir(), 'Downloads', `rotated_${path.basename(filePath)}`);
     const { filePath: savePath } = await dialog.showSaveDialog({ defaultPath });
     if (!savePath) return { success: false, message: 'Save cancelled.' };
-    return runPythonScript('rotate.py', [filePath, rotationsJson, savePath]);
-});
\ No newline at end of file
+    return runPythonScript('rotate.py', [filePath, rotationsJson, savePath], forwardEventsTo(event));
+});
+
+ipcMain.handle('index-library', async (event, folderPaths) => {
+    return runPythonScript('search.py', ['index', ...folderPaths], forwardEventsTo(event));
+});
+
+ipcMain.handle('search-library', async (event, query) => {
+    return runPythonScript('search.py', ['query', query]);
+});
+
+ipcMain.handle('cancel-job', async (event, id) => {
+    cancelPythonScript(id);
+});
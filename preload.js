@@ -7,10 +7,21 @@ contextBridge.exposeInMainWorld('electronAPI', {
     protectPDF: (filePath, password) => ipcRenderer.invoke('protect-pdf', filePath, password),
 
     // APIs for the Edit & Organize workspace
+    inspectPdf: (filePath) => ipcRenderer.invoke('inspect-pdf', filePath),
+    comparePdfs: (firstPath, secondPath, options) => ipcRenderer.invoke('compare-pdfs', firstPath, secondPath, options),
     getPdfPreview: (filePath, pageNum) => ipcRenderer.invoke('get-pdf-preview', filePath, pageNum),
     organizePDF: (filePath, pageOrder, pagesToDelete) => ipcRenderer.invoke('organize-pdf', filePath, pageOrder, pagesToDelete),
+    analyzePages: (filePaths, options) => ipcRenderer.invoke('analyze-pages', filePaths, options),
     splitPDF: (filePath, ranges) => ipcRenderer.invoke('split-pdf', filePath, ranges),
     rotatePDF: (filePath, rotationsJson) => ipcRenderer.invoke('rotate-pdf', filePath, rotationsJson),
+
+    // Long-running job events (started, phase, progress, heartbeat, done, error) and cancellation
+    onBackendEvent: (callback) => ipcRenderer.on('backend-event', (event, jobEvent) => callback(jobEvent)),
+    cancelJob: (id) => ipcRenderer.invoke('cancel-job', id),
+
+    // Library search
+    indexLibrary: (folderPaths) => ipcRenderer.invoke('index-library', folderPaths),
+    searchLibrary: (query) => ipcRenderer.invoke('search-library', query),
     
     // REMOVED pdfToImage and imageToPdf
 });
\ No newline at end of file